@@ -0,0 +1,152 @@
+# app_log.py
+"""
+Журнал приложения на стандартном logging.
+
+Модули берут логгер через get_logger(__name__) и пишут
+log.info("Процесс %s обнаружен", name): строка собирается, только если
+уровень включен. Вызывающий поток лишь кладет запись в очередь, в консоль
+и в файл (с ротацией) пишет фоновый поток QueueListener. Одинаковые
+предупреждения и ошибки (WARNING и выше - например, повторные ошибки
+доступа к окну) чаще, чем раз в dedup_interval секунд, подавляются, а в
+следующем пропущенном сообщении пишется, сколько повторов было подавлено.
+INFO и DEBUG не подавляются: повтор события звонка - тоже событие.
+"""
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+LOG_FORMAT = '%(asctime)s %(levelname)-7s [%(name)s] %(message)s'
+CONSOLE_FORMAT = '%(message)s'
+LOG_FILE = 'sip_helper.log'
+MAX_BYTES = 1024 * 1024
+BACKUP_COUNT = 5
+DEDUP_INTERVAL = 30.0
+DEDUP_LEVEL = logging.WARNING
+
+_listener = None
+
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+
+def default_log_dir():
+    """Каталог журналов: LOCALAPPDATA на Windows, иначе ~/.cache."""
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        base = os.environ['LOCALAPPDATA']
+    else:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'SIP-Helper', 'logs')
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Пропускает одинаковые записи (логгер, уровень, шаблон, аргументы) уровня
+    min_level и выше не чаще раза в interval секунд; записи ниже min_level
+    проходят всегда. Сравниваются шаблон и строки аргументов, без сборки
+    сообщения: исключения с одинаковым текстом считаются повтором.
+    """
+
+    def __init__(self, interval=DEDUP_INTERVAL, clock=time.monotonic, max_keys=1000, min_level=DEDUP_LEVEL):
+        super().__init__()
+        self.interval = interval
+        self.min_level = min_level
+        self.clock = clock
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._seen = {}  # ключ -> [время последней пропущенной записи, подавлено]
+        self.suppressed = 0
+
+    def _key(self, record):
+        args = record.args
+        if isinstance(args, tuple):
+            args = tuple(str(arg) for arg in args)
+        else:
+            args = str(args)
+        return (record.name, record.levelno, str(record.msg), args)
+
+    def filter(self, record):
+        if record.levelno < self.min_level:
+            return True
+        key = self._key(record)
+        now = self.clock()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen[0] < self.interval:
+                seen[1] += 1
+                self.suppressed += 1
+                return False
+            if len(self._seen) >= self.max_keys:
+                self._seen.clear()
+            suppressed = seen[1] if seen is not None else 0
+            self._seen[key] = [now, 0]
+        if suppressed:
+            record.msg = f"{record.msg} (повторов подавлено: {suppressed})"
+        return True
+
+
+def setup(level=logging.INFO, log_dir=None, console=True, max_bytes=MAX_BYTES,
+          backup_count=BACKUP_COUNT, dedup_interval=DEDUP_INTERVAL):
+    """
+    Настраивает корневой логгер: очередь -> фоновая запись в консоль и файл.
+    level - число или имя уровня ('DEBUG', 'INFO', ...). Повторный вызов
+    перенастраивает журнал.
+    """
+    global _listener
+    shutdown()
+
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+
+    handlers = []
+    log_dir = log_dir or default_log_dir()
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, LOG_FILE), maxBytes=max_bytes,
+            backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(file_handler)
+    except OSError as e:
+        if sys.stderr is not None:
+            sys.stderr.write(f"⚠️ Не удалось открыть файл журнала в {log_dir}: {e}\n")
+    # В оконной сборке консоли нет (sys.stderr is None)
+    if console and sys.stderr is not None:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if dedup_interval:
+        queue_handler.addFilter(RateLimitFilter(dedup_interval))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown():
+    """Дописывает очередь и останавливает фоновую запись."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown)
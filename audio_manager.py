@@ -1,10 +1,23 @@
 # audio_manager.py
-import json
+import time
+import threading
+from collections import deque
 from comtypes import CoCreateInstance, COMMETHOD, GUID, IUnknown, CoInitialize, CoUninitialize
 from ctypes import POINTER
 from ctypes.wintypes import LPCWSTR, DWORD
+import psutil
 from pycaw.pycaw import AudioUtilities, EDataFlow
-from pycaw import constants as const
+from pycaw.utils import AudioSession
+from pycaw.api.mmdeviceapi import IMMEndpoint
+from pycaw.api.audiopolicy import IAudioSessionControl2
+from pycaw.callbacks import MMNotificationClient, AudioSessionNotification, AudioSessionEvents
+import config_store
+from device_registry import DeviceRegistry, DeviceInfo
+from session_registry import SessionIndex, SessionEntry
+from app_log import get_logger
+import metrics
+
+log = get_logger(__name__)
 
 # Определяем необходимые GUID константы
 CLSID_MMDeviceEnumerator = GUID('{BCDE0395-E52F-467C-8E3D-C4579291692E}')
@@ -29,35 +42,566 @@ class IPolicyConfig(IUnknown):
                   (['in'], DWORD, 'role'))
     ]
 
-def set_default_audio_device_by_id(device_id, device_name):
+# Роли устройства по умолчанию (ERole)
+ROLE_CONSOLE = 0
+ROLE_MULTIMEDIA = 1
+ROLE_COMMUNICATIONS = 2
+ROLES = {ROLE_CONSOLE: "Console", ROLE_MULTIMEDIA: "Multimedia", ROLE_COMMUNICATIONS: "Communications"}
+# Имена этапов для metrics: запись устройства по умолчанию для каждой роли
+ROLE_STAGES = {role: f"set_default_endpoint_{name.lower()}" for role, name in ROLES.items()}
+
+DATA_FLOWS = ["eRender", "eCapture"]
+DEVICE_STATE_MASK_ALL = 0x0000000F
+# PKEY_Device_FriendlyName
+FRIENDLY_NAME_FMTID = '{A45C254E-DF1C-4EFD-8020-67D146A850E0}'
+FRIENDLY_NAME_PID = 14
+
+class AudioRequest:
     """
-    Устанавливает аудиоустройство по умолчанию через Windows COM API по его ID.
+    Запрос к потоку COM. Ждать результат - wait(), либо передать on_done:
+    он будет вызван с самим запросом в потоке AudioWorker после выполнения.
     """
-    print(f"\n[AUDIO] Попытка установить устройство: '{device_name}' (ID: {device_id})")
-    try:
+
+    def __init__(self, on_done=None):
+        self.result = None
+        self.error = None
+        self.on_done = on_done
+        self.requested_at = time.perf_counter()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def latency(self):
+        """Время от постановки в очередь до выполнения, сек."""
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.requested_at
+
+    def finish(self, result, error=None):
+        self.result = result
+        self.error = error
+        self.finished_at = time.perf_counter()
+        self._done.set()
+        if self.on_done is not None:
+            try:
+                self.on_done(self)
+            except Exception as e:
+                log.error("❌ Ошибка обработчика завершения: %s", e)
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.result
+
+class SwitchRequest(AudioRequest):
+    """Запрос на переключение устройства по умолчанию."""
+
+    def __init__(self, device_id, device_name, roles=None, on_done=None, device_type=None, context=None):
+        super().__init__(on_done)
+        self.device_id = device_id
+        self.device_name = device_name
+        self.roles = tuple(ROLES if roles is None else roles)
+        self.device_type = device_type  # 'headset' / 'speakers', если запрос из конфига
+        self.context = context  # Произвольные данные вызывающего (например, статус для GUI)
+        self.superseded = False  # Заменен более новым запросом до выполнения
+
+class AudioWorker(threading.Thread):
+    """
+    Поток, владеющий COM: CoInitialize выполняется один раз, IPolicyConfig и
+    перечислитель устройств живут все время работы. Запросы на переключение
+    складываются в очередь, и из нескольких подряд для каждой роли применяется
+    только последний. Текущее устройство по умолчанию отслеживается по ролям,
+    и запись, которая ничего не меняет, пропускается.
+    """
+
+    def __init__(self):
+        super().__init__(name="AudioWorker", daemon=True)
+        self._cond = threading.Condition()
+        self._pending_switches = []  # Ожидающие запросы, применится последний
+        self._calls = deque()  # Произвольные функции, которым нужен COM
+        self._stopping = False
+        self.policy_config = None
+        self.enumerator = None
+        self.notification_client = None
+        self.current_defaults = {}  # Роль -> ID текущего устройства по умолчанию
+        self.skipped_writes = 0
+        self.session_index = SessionIndex(lambda pid: psutil.Process(pid).name())
+        self.session_manager = None
+        self.session_client = None
+        self.muted_sessions = {}  # Имя процесса -> key сессий, заглушенных нами
+
+    def switch(self, device_id, device_name, roles=None, **kwargs):
+        """Ставит переключение в очередь и сразу возвращает SwitchRequest."""
+        return self.submit(SwitchRequest(device_id, device_name, roles, **kwargs))
+
+    def submit(self, request):
+        """Ставит готовый SwitchRequest в очередь."""
+        with self._cond:
+            self._pending_switches.append(request)
+            self._cond.notify()
+        return request
+
+    def post(self, func, *args, on_done=None):
+        """
+        Ставит func(*args) в очередь потока COM и сразу возвращает AudioRequest.
+        Вызовы выполняются раньше ожидающих переключений устройств.
+        """
+        request = AudioRequest(on_done)
+        with self._cond:
+            self._calls.append((request, func, args))
+            self._cond.notify()
+        return request
+
+    def call(self, func, *args):
+        """Выполняет func(*args) в потоке COM и возвращает результат (или поднимает ошибку)."""
+        request = self.post(func, *args)
+        request.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+    def run(self):
         CoInitialize()
-        policy_config = CoCreateInstance(
-            CLSID_PolicyConfig,
-            IPolicyConfig,
-            1  # CLSCTX_INPROC_SERVER
-        )
-        
-        # Устанавливаем устройство для всех ролей, с логированием каждой попытки
-        roles = {0: "Console", 1: "Multimedia", 2: "Communications"}
-        for role_id, role_name in roles.items():
+        try:
+            while True:
+                with self._cond:
+                    while not (self._stopping or self._pending_switches or self._calls):
+                        self._cond.wait()
+                    if self._stopping:
+                        break
+                    calls = list(self._calls)
+                    self._calls.clear()
+                    switches = self._pending_switches
+                    self._pending_switches = []
+
+                for request, func, args in calls:
+                    try:
+                        request.finish(func(*args))
+                    except Exception as e:
+                        request.finish(None, e)
+
+                if switches:
+                    self._apply_switches(switches)
+        finally:
+            self.unregister_endpoint_notifications()
+            self.reset_sessions(reload=False)
+            self.policy_config = None
+            self.enumerator = None
+            CoUninitialize()
+            self._fail_pending()
+
+    def _fail_pending(self):
+        with self._cond:
+            for request in self._pending_switches:
+                request.finish(False)
+            for request, _, _ in self._calls:
+                request.finish(None, RuntimeError("Поток COM остановлен"))
+            self._pending_switches = []
+            self._calls.clear()
+
+    def get_policy_config(self):
+        if self.policy_config is None:
+            self.policy_config = CoCreateInstance(
+                CLSID_PolicyConfig,
+                IPolicyConfig,
+                1  # CLSCTX_INPROC_SERVER
+            )
+        return self.policy_config
+
+    def get_enumerator(self):
+        if self.enumerator is None:
+            self.enumerator = AudioUtilities.GetDeviceEnumerator()
+        return self.enumerator
+
+    def _describe(self, dev):
+        device = AudioUtilities.CreateDevice(dev)
+        flow = dev.QueryInterface(IMMEndpoint).GetDataFlow()
+        return DeviceInfo(device.id, device.FriendlyName, DATA_FLOWS[flow], device.state.value)
+
+    def enumerate_devices(self):
+        """Полное перечисление всех устройств (один раз при запуске)."""
+        devices = []
+        try:
+            collection = self.get_enumerator().EnumAudioEndpoints(
+                EDataFlow.eAll.value, DEVICE_STATE_MASK_ALL)
+            for i in range(collection.GetCount()):
+                devices.append(self._describe(collection.Item(i)))
+        except Exception:
+            self.enumerator = None
+            raise
+        return devices
+
+    def describe_device(self, device_id):
+        """Свойства одного устройства по ID (для уведомлений о новом устройстве)."""
+        try:
+            return self._describe(self.get_enumerator().GetDevice(device_id))
+        except Exception as e:
+            log.warning("⚠️ Не удалось прочитать устройство %s: %s", device_id, e)
+            return None
+
+    def register_endpoint_notifications(self, client):
+        self.get_enumerator().RegisterEndpointNotificationCallback(client)
+        self.notification_client = client
+
+    def unregister_endpoint_notifications(self):
+        if self.notification_client is None:
+            return
+        try:
+            self.get_enumerator().UnregisterEndpointNotificationCallback(self.notification_client)
+        except Exception as e:
+            log.warning("⚠️ Ошибка отписки от уведомлений устройств: %s", e)
+        self.notification_client = None
+
+    def get_default_device_id(self, role):
+        """Читает ID текущего устройства воспроизведения по умолчанию для роли."""
+        try:
+            device = self.get_enumerator().GetDefaultAudioEndpoint(EDataFlow.eRender.value, role)
+            self.current_defaults[role] = device.GetId()
+        except Exception:
+            # Устройства по умолчанию может не быть - тогда считаем, что оно неизвестно
+            self.current_defaults.pop(role, None)
+        return self.current_defaults.get(role)
+
+    def get_session_index(self):
+        """
+        Индекс аудиосессий устройства по умолчанию. При первом обращении
+        подписывается на новые сессии и один раз перечисляет существующие.
+        """
+        if self.session_index.loaded:
+            return self.session_index
+        manager = AudioUtilities.GetAudioSessionManager()
+        if manager is None:
+            return self.session_index
+        # Сначала подписка, чтобы не потерять сессии, созданные во время перечисления
+        client = SessionNotificationClient(self)
+        manager.RegisterSessionNotification(client)
+        self.session_manager = manager
+        self.session_client = client
+
+        entries = []
+        sessions = manager.GetSessionEnumerator()
+        for i in range(sessions.GetCount()):
+            ctl = sessions.GetSession(i)
+            if ctl is None:
+                continue
+            entry = self._session_entry(AudioSession(ctl.QueryInterface(IAudioSessionControl2)))
+            if entry is not None:
+                entries.append(entry)
+        self.session_index.load(entries)
+        log.info("Аудиосессий в индексе: %d", len(self.session_index))
+        return self.session_index
+
+    def _session_entry(self, session):
+        """SessionEntry для сессии с подпиской на ее завершение (None для системных звуков)."""
+        try:
+            pid = session.ProcessId
+            if pid == 0:
+                return None
+            name = self.session_index.name_of(pid)
+            if name is None:
+                return None
+            key = session.InstanceIdentifier
+            session.register_notification(SessionExpiryEvents(self, key))
+            return SessionEntry(key, pid, name, session.SimpleAudioVolume, session)
+        except Exception as e:
+            log.warning("⚠️ Не удалось прочитать аудиосессию: %s", e)
+            return None
+
+    def add_session(self, session):
+        """Новая сессия из уведомления IAudioSessionNotification."""
+        if not self.session_index.loaded:
+            return
+        entry = self._session_entry(session)
+        if entry is None:
+            return
+        old = self.session_index.add(entry)
+        if old is not None:
+            self._release_session(old)
+        log.debug("Новая аудиосессия %s (PID %s)", entry.name, entry.pid)
+
+    def expire_session(self, key):
+        """Сессия завершена или отключена: убираем ее из индекса."""
+        entry = self.session_index.remove(key)
+        if entry is None:
+            return
+        self._release_session(entry)
+        muted = self.muted_sessions.get(entry.name)
+        if muted is not None:
+            muted.discard(key)
+
+    def _release_session(self, entry):
+        # Отписка только из этого потока: из обработчика уведомления она приводит к взаимоблокировке
+        try:
+            entry.session.unregister_notification()
+        except Exception:
+            pass
+
+    def reset_sessions(self, reload=True):
+        """
+        Сбрасывает индекс (сменилось устройство по умолчанию, у него свои сессии).
+        reload - сразу построить индекс заново, чтобы не делать этого во время звонка.
+        Процессы, заглушенные нами (телефон звонит), остаются заглушенными:
+        их сессии в новом индексе глушатся и запоминаются, чтобы unmute их
+        нашел. Без reload звук им сначала возвращается.
+        """
+        muted_names = [name for name, keys in self.muted_sessions.items() if keys]
+        if not reload:
+            for name in muted_names:
+                self._set_process_mute(name, False)
+            muted_names = []
+        if self.session_manager is not None and self.session_client is not None:
             try:
-                policy_config.SetDefaultEndpoint(device_id, role_id)
-                print(f"[AUDIO]   ✅ Успешно для роли '{role_name}'")
-            except Exception as role_e:
-                print(f"[AUDIO]   ❌ Ошибка для роли '{role_name}': {role_e}")
-        
-        print(f"[AUDIO] ✅ Успешно завершена установка '{device_name}'.")
-        return True
-    except Exception as e:
-        print(f"[AUDIO] ❌ КРИТИЧЕСКАЯ ОШИБКА при установке устройства: {e}")
-        return False
-    finally:
-        CoUninitialize()
+                self.session_manager.UnregisterSessionNotification(self.session_client)
+            except Exception as e:
+                log.warning("⚠️ Ошибка отписки от уведомлений сессий: %s", e)
+        self.session_manager = None
+        self.session_client = None
+        for entry in self.session_index.clear():
+            self._release_session(entry)
+        self.muted_sessions = {}
+        if reload:
+            try:
+                self.get_session_index()
+                for name in muted_names:
+                    self._remute_process(name)
+            except Exception as e:
+                log.warning("⚠️ Не удалось перечислить аудиосессии: %s", e)
+
+    def _remute_process(self, name):
+        """После смены устройства: сессии процесса, заглушенного нами, снова наши"""
+        muted = self.muted_sessions.setdefault(name, set())
+        for entry in self.session_index.by_name(name):
+            try:
+                if not entry.volume.GetMute():
+                    entry.volume.SetMute(1, None)
+                muted.add(entry.key)
+            except Exception as e:
+                log.warning("⚠️ Аудиосессия %s (PID %s) недоступна: %s", name, entry.pid, e)
+                self.expire_session(entry.key)
+        log.info("🔇 Смена устройства: %s остается заглушенным (сессий %d)", name, len(muted))
+
+    def set_process_mute(self, process_name, mute):
+        """
+        Глушит (mute=True) все аудиосессии процесса или возвращает звук тем,
+        что были заглушены здесь. Сессию, которую заглушили до нас, не трогаем.
+        Сессии ищутся в индексе по имени, без перебора всех сессий.
+        Возвращает True, если было что заглушить или включить.
+        """
+        with metrics.timed('process_mute' if mute else 'process_unmute'):
+            return self._set_process_mute(process_name, mute)
+
+    def _set_process_mute(self, process_name, mute):
+        name = process_name.lower()
+        index = self.get_session_index()
+        if not mute:
+            keys = self.muted_sessions.pop(name, set())
+            for key in keys:
+                entry = index.get(key)
+                if entry is None:
+                    continue  # Сессия завершилась (например, телефон перезапущен)
+                try:
+                    entry.volume.SetMute(0, None)
+                except Exception as e:
+                    log.warning("⚠️ Не удалось включить звук %s: %s", process_name, e)
+                    self.expire_session(key)
+            return bool(keys)
+
+        entries = index.by_name(name)
+        muted = self.muted_sessions.setdefault(name, set())
+        for entry in entries:
+            try:
+                if not entry.volume.GetMute():  # Только если еще не заглушен
+                    entry.volume.SetMute(1, None)
+                    muted.add(entry.key)
+            except Exception as e:
+                # Уведомление о завершении могло не дойти - сессия больше недействительна
+                log.warning("⚠️ Аудиосессия %s (PID %s) недоступна: %s", process_name, entry.pid, e)
+                self.expire_session(entry.key)
+        return bool(entries)
+
+    def _apply_switches(self, switches):
+        """
+        Для каждой роли применяет самый новый запрос. Каждый запрос получает
+        результат своих ролей; запрос, все роли которого заменены более
+        новыми, завершается с False и superseded=True.
+        """
+        targets = {}
+        for request in switches:
+            for role in request.roles:
+                targets[role] = request
+        if len(switches) > 1:
+            log.debug("Объединено запросов: %d", len(switches))
+
+        results = {}
+        for request in dict.fromkeys(targets.values()):
+            roles = [role for role, target in targets.items() if target is request]
+            results[request] = self._apply_switch(request.device_id, request.device_name, roles)
+        for request in switches:
+            request.superseded = request not in results
+            request.finish(results.get(request, False))
+
+    def _apply_switch(self, device_id, device_name, roles=None):
+        log.info("Попытка установить устройство: '%s' (ID: %s)", device_name, device_id)
+        roles = list(ROLES if roles is None else roles)
+        try:
+            # Лишняя запись заставляет Windows пересогласовать все открытые потоки
+            pending = []
+            for role_id in roles:
+                if self.get_default_device_id(role_id) == device_id:
+                    self.skipped_writes += 1
+                    log.debug("  ⏭ Роль '%s' уже на этом устройстве", ROLES[role_id])
+                else:
+                    pending.append(role_id)
+            if not pending:
+                return True
+
+            policy_config = self.get_policy_config()
+
+            # Устанавливаем устройство для нужных ролей, с логированием каждой попытки
+            failed = 0
+            for role_id in pending:
+                role_name = ROLES[role_id]
+                try:
+                    with metrics.timed(ROLE_STAGES[role_id]):
+                        policy_config.SetDefaultEndpoint(device_id, role_id)
+                    self.current_defaults[role_id] = device_id
+                    log.debug("  ✅ Успешно для роли '%s'", role_name)
+                except Exception as role_e:
+                    failed += 1
+                    self.current_defaults.pop(role_id, None)
+                    log.error("  ❌ Ошибка для роли '%s': %s", role_name, role_e)
+            if failed == len(pending):
+                # Объект мог стать недействительным - пересоздадим при следующем запросе
+                self.policy_config = None
+                log.error("❌ Устройство '%s' не установлено ни для одной роли", device_name)
+                return False
+
+            log.info("✅ Успешно завершена установка '%s'.", device_name)
+            return True
+        except Exception as e:
+            self.policy_config = None
+            log.error("❌ КРИТИЧЕСКАЯ ОШИБКА при установке устройства: %s", e)
+            return False
+
+class EndpointNotificationClient(MMNotificationClient):
+    """
+    Переносит уведомления об устройствах в DeviceRegistry. Уведомления приходят
+    в потоках Windows, которые нельзя блокировать, поэтому чтение свойств
+    нового устройства ставится в очередь AudioWorker.
+    """
+
+    def __init__(self, registry, worker):
+        super().__init__()
+        self.registry = registry
+        self.worker = worker
+
+    def _refresh(self, device_id):
+        info = self.worker.describe_device(device_id)
+        if info is not None:
+            self.registry.apply_device(info)
+
+    def on_device_added(self, added_device_id):
+        self.worker.post(self._refresh, added_device_id)
+
+    def on_device_removed(self, removed_device_id):
+        self.registry.apply_removed(removed_device_id)
+
+    def on_device_state_changed(self, device_id, new_state, new_state_id):
+        if not self.registry.apply_state(device_id, new_state_id):
+            self.worker.post(self._refresh, device_id)
+
+    def on_property_value_changed(self, device_id, property_struct, fmtid, pid):
+        if str(fmtid).upper() == FRIENDLY_NAME_FMTID and pid == FRIENDLY_NAME_PID:
+            self.worker.post(self._refresh, device_id)
+
+    def on_default_device_changed(self, flow, flow_id, role, role_id, default_device_id):
+        # Индекс сессий строится по устройству воспроизведения по умолчанию (Multimedia)
+        if flow_id == EDataFlow.eRender.value and role_id == ROLE_MULTIMEDIA:
+            self.worker.post(self.worker.reset_sessions)
+
+class SessionNotificationClient(AudioSessionNotification):
+    """Новые аудиосессии: добавление в индекс ставится в очередь AudioWorker."""
+
+    def __init__(self, worker):
+        super().__init__()
+        self.worker = worker
+
+    def on_session_created(self, new_session):
+        self.worker.post(self.worker.add_session, new_session)
+
+class SessionExpiryEvents(AudioSessionEvents):
+    """Завершение одной аудиосессии: удаление из индекса ставится в очередь AudioWorker."""
+
+    def __init__(self, worker, key):
+        super().__init__()
+        self.worker = worker
+        self.key = key
+
+    def on_state_changed(self, new_state, new_state_id):
+        if new_state == "Expired":
+            self.worker.post(self.worker.expire_session, self.key)
+
+    def on_session_disconnected(self, disconnect_reason, disconnect_reason_id):
+        self.worker.post(self.worker.expire_session, self.key)
+
+_worker = None
+_worker_lock = threading.Lock()
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_worker():
+    """Возвращает запущенный AudioWorker (создается при первом обращении)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = AudioWorker()
+            _worker.start()
+        return _worker
+
+def get_device_registry():
+    """
+    Реестр устройств: при первом обращении подписывается на уведомления
+    и один раз перечисляет устройства, дальше обновляется сам.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            registry = DeviceRegistry()
+            worker = get_worker()
+            # Сначала подписка, чтобы не потерять изменения во время перечисления
+            worker.call(worker.register_endpoint_notifications,
+                        EndpointNotificationClient(registry, worker))
+            registry.load(worker.call(worker.enumerate_devices))
+            _registry = registry
+        return _registry
+
+def shutdown():
+    """Останавливает поток COM (при выходе из приложения)."""
+    global _worker, _registry
+    with _registry_lock:
+        _registry = None
+    with _worker_lock:
+        if _worker is not None:
+            _worker.stop()
+            _worker.join(2)
+            _worker = None
+
+def set_default_audio_device_by_id(device_id, device_name, roles=None):
+    """
+    Устанавливает аудиоустройство по умолчанию через Windows COM API по его ID.
+    roles - список ролей (ROLE_*), по умолчанию все три.
+    Выполняется в потоке AudioWorker, вызов ждет результата.
+    """
+    return get_worker().switch(device_id, device_name, roles).wait()
+
+def get_default_device_id(role=ROLE_CONSOLE):
+    """ID текущего устройства по умолчанию для роли (или None)."""
+    worker = get_worker()
+    return worker.call(worker.get_default_device_id, role)
 
 def get_all_audio_devices():
     """
@@ -65,42 +609,81 @@ def get_all_audio_devices():
     Returns:
         list: Список кортежей (имя_устройства, device_id)
     """
-    filtered_devices = []
     try:
-        CoInitialize()
-        all_devices = AudioUtilities.GetAllDevices()
-        for device in all_devices:
-            if device.state == const.AudioDeviceState.Active and AudioUtilities.GetEndpointDataFlow(device.id) == 'eRender':
-                name = device.FriendlyName
-                device_id = device.id
-                filtered_devices.append((name, device_id))
+        return get_device_registry().render_devices()
     except Exception as e:
-        print(f"❌ Не удалось получить список аудиоустройств: {e}")
-    finally:
-        CoUninitialize()
-    return filtered_devices
+        log.error("❌ Не удалось получить список аудиоустройств: %s", e)
+        return []
+
+def prepare_session_index():
+    """Строит индекс аудиосессий в фоне, чтобы первый звонок не перечислял сессии."""
+    worker = get_worker()
+    return worker.post(worker.get_session_index)
 
-def set_device_from_config(device_type, config_file='config.json'):
+def mute_process_async(process_name, mute=True, on_done=None):
+    """
+    Глушит или включает звук процесса в потоке AudioWorker, сразу возвращает
+    AudioRequest. on_done(request) вызывается в потоке AudioWorker,
+    request.result - найдены ли сессии процесса.
+    """
+    worker = get_worker()
+    return worker.post(worker.set_process_mute, process_name, mute, on_done=on_done)
+
+def set_process_mute(process_name, mute=True, timeout=None):
+    """Синхронный вариант mute_process_async (например, при выходе)."""
+    request = mute_process_async(process_name, mute)
+    request.wait(timeout)
+    if request.error is not None:
+        log.warning("⚠️ Не удалось изменить звук %s: %s", process_name, request.error)
+        return False
+    return bool(request.result)
+
+def device_from_config(device_type, config_file='config.json'):
+    """Возвращает (device_id, device_name) из конфига или None."""
+    log.debug("Загрузка устройства типа '%s' из файла '%s'", device_type, config_file)
+    try:
+        store = config_store.get_store(config_file)
+        if not store.exists():
+            log.error("❌ Файл конфигурации '%s' не найден.", config_file)
+            return None
+        # Читается из памяти, файл перечитывается только при изменении
+        device_info = store.get_value(device_type)
+    except Exception as e:
+        log.error("❌ Ошибка чтения конфигурации: %s", e)
+        return None
+
+    if device_info and 'id' in device_info and device_info['id']:
+        return device_info['id'], device_info.get('name', 'N/A')
+    log.warning("⚠️ Устройство типа '%s' не найдено или его ID пуст в конфигурации.", device_type)
+    return None
+
+def set_device_from_config(device_type, config_file='config.json', roles=None):
     """
     Читает ID устройства из конфига и устанавливает его.
     device_type: 'headset' или 'speakers'
+    roles: только эти роли (например, [ROLE_COMMUNICATIONS]), по умолчанию все
     """
-    print(f"[CONFIG] Загрузка устройства типа '{device_type}' из файла '{config_file}'")
-    try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        
-        device_info = config.get(device_type)
-        if device_info and 'id' in device_info and device_info['id']:
-            device_id = device_info['id']
-            device_name = device_info.get('name', 'N/A')
-            return set_default_audio_device_by_id(device_id, device_name)
-        else:
-            print(f"⚠️ Устройство типа '{device_type}' не найдено или его ID пуст в конфигурации.")
-            return False
-    except FileNotFoundError:
-        print(f"❌ Файл конфигурации '{config_file}' не найден.")
+    device = device_from_config(device_type, config_file)
+    if device is None:
         return False
+    try:
+        return set_default_audio_device_by_id(device[0], device[1], roles)
     except Exception as e:
-        print(f"❌ Ошибка чтения конфигурации или установки устройства: {e}")
-        return False
\ No newline at end of file
+        log.error("❌ Ошибка установки устройства: %s", e)
+        return False
+
+def switch_device_async(device_type, config_file='config.json', roles=None, on_done=None, context=None):
+    """
+    Асинхронный вариант set_device_from_config: сразу возвращает SwitchRequest.
+    on_done(request) вызывается в потоке AudioWorker после применения,
+    request.result - успех, request.latency - время переключения.
+    Если устройство не настроено, запрос завершается с False сразу.
+    """
+    device = device_from_config(device_type, config_file)
+    device_id, device_name = device if device else (None, device_type)
+    request = SwitchRequest(device_id, device_name, roles, on_done=on_done,
+                            device_type=device_type, context=context)
+    if device is None:
+        request.finish(False)
+        return request
+    return get_worker().submit(request)
\ No newline at end of file
@@ -0,0 +1,773 @@
+# benchmarks.py
+"""
+Бенчмарки, которые запускаются без Windows, sipphone.exe и PyQt.
+
+Запуск всех:      python benchmarks.py
+Запуск одного:    python benchmarks.py memo_events
+"""
+import re
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+
+from memo_source import ScriptedMemoSource, MemoTextTracker
+from process_watcher import FakeProcessWatcher
+from call_state import TriggerMatcher, DEFAULT_TRIGGERS, DEFAULT_DIRECTIONS
+from call_pipeline import IncomingCallPipeline
+from ringtone_cache import RingtoneCache
+
+
+def percentile(values, p):
+    """Перцентиль p (0-100) по отсортированной копии значений."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name, latencies_ms, extra=""):
+    print(f"{name:<28} n={len(latencies_ms):<5} "
+          f"p50={percentile(latencies_ms, 50):8.3f} мс  "
+          f"p95={percentile(latencies_ms, 95):8.3f} мс  "
+          f"max={max(latencies_ms or [0]):8.3f} мс {extra}")
+
+
+def bench_memo_events(calls=50, step=0.01, poll_interval=0.5):
+    """
+    Задержка обнаружения звонка через источник событий против опроса.
+    ScriptedMemoSource проигрывает чередование "входящий"/"тишина",
+    потребитель работает так же, как CallMonitor.handle_memo_events().
+    """
+    script = []
+    for i in range(calls):
+        script.append((step, 1, f"Входящий звонок tv_tech #{i}"))
+        script.append((step, 1, ""))
+    source = ScriptedMemoSource(script)
+    tracker = MemoTextTracker(TriggerMatcher())
+
+    latencies = []
+    source.start()
+    while not source.finished:
+        events = source.wait_events(0.1)
+        for event in events:
+            tracker.update(event.hwnd, event.text)
+        if events and tracker.memo_text():
+            latencies.append((time.perf_counter() - events[-1].timestamp) * 1000)
+    source.stop()
+    report("memo_events (события)", latencies)
+
+    # Опрос с фиксированным интервалом: событие ждет ближайшего тика
+    emitted = [t - source.emitted[0] for t in source.emitted[::2]]
+    polled = [(poll_interval - t % poll_interval) * 1000 for t in emitted]
+    report(f"memo_events (опрос {poll_interval} с)", polled)
+
+
+def bench_process_exit(runs=20, search_interval=2.0):
+    """
+    Задержка реакции на закрытие телефона: уведомление ProcessWatcher
+    против поиска снимком раз в search_interval секунд.
+    """
+    watcher = FakeProcessWatcher()
+    latencies = []
+    for _ in range(runs):
+        wakeup = threading.Event()
+        watcher.start_process()
+        watcher.watch(watcher.pid, wakeup.set)
+
+        def monitor():
+            # Так же, как CallMonitor._wait(): спим, пока нас не разбудят
+            while watcher.is_running():
+                wakeup.wait(search_interval)
+            latencies.append((time.perf_counter() - watcher.stopped_at) * 1000)
+
+        thread = threading.Thread(target=monitor)
+        thread.start()
+        time.sleep(random.uniform(0.001, 0.005))
+        watcher.stop_process()
+        thread.join()
+        watcher.unwatch()
+    report("process_exit (уведомление)", latencies)
+
+    polled = [random.uniform(0, search_interval) * 1000 for _ in range(runs)]
+    report(f"process_exit (снимок {search_interval} с)", polled)
+
+
+def recorded_memo_text(lines, tail):
+    """Имитация записанного лога TMemo за смену: lines служебных строк и хвост звонка."""
+    noise = [
+        "Регистрация на сервере успешна",
+        "Соединение установлено 10.0.0.{i}",
+        "Ожидание вызова",
+        "Статус: готов, линия {i}",
+    ]
+    body = "\n".join(noise[i % len(noise)].format(i=i) for i in range(lines))
+    return body + "\n" + tail
+
+
+def bench_trigger_match(repeats=200):
+    """
+    Поиск триггеров в больших текстах TMemo: прежний способ, одно
+    регулярное выражение-альтернация (один проход) и TriggerMatcher.
+    """
+    triggers = list(DEFAULT_TRIGGERS.values())
+
+    def legacy(text):
+        found = [trigger in text for trigger in triggers]
+        direction = None
+        if any(found):
+            for name in DEFAULT_DIRECTIONS:
+                if name in text:
+                    direction = name
+                    break
+        return found, direction
+
+    patterns = sorted(triggers + DEFAULT_DIRECTIONS, key=len, reverse=True)
+    regex = re.compile('|'.join(re.escape(p) for p in patterns))
+
+    def single_pass(text):
+        return {m.group() for m in regex.finditer(text)}
+
+    matcher = TriggerMatcher()
+    candidates = (("старый", legacy), ("regex 1 проход", single_pass), ("TriggerMatcher", matcher.match))
+    for lines in (10, 1000, 10000):
+        text = recorded_memo_text(lines, "Входящий звонок от 79991234567 tv_order")
+        for name, func in candidates:
+            timings = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                func(text)
+                timings.append((time.perf_counter() - started) * 1000)
+            report(f"trigger_match {name}", timings, f"({len(text)} симв.)")
+
+
+def bench_incoming_ring(calls=30, mute_cost=0.003, backlog=(0, 2, 5), job_cost=0.002):
+    """
+    Время до звука рингтона: прежний путь (mute в слоте GUI + sleep 50 мс)
+    против IncomingCallPipeline на очереди, где перед mute стоит backlog
+    других вызовов по job_cost секунд (занятый поток COM).
+    """
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        time.sleep(mute_cost)
+        time.sleep(0.05)
+        latencies.append((time.perf_counter() - started) * 1000)
+    report("incoming_ring (sleep 50 мс)", latencies)
+
+    class Channel:
+        def stop(self):
+            pass
+
+    for queued in backlog:
+        jobs = []
+        cond = threading.Condition()
+
+        def worker():
+            while True:
+                with cond:
+                    while not jobs:
+                        cond.wait()
+                    job = jobs.pop(0)
+                if job is None:
+                    return
+                job()
+
+        def post(job):
+            with cond:
+                jobs.append(job)
+                cond.notify()
+
+        def mute(on_done):
+            for _ in range(queued):
+                post(lambda: time.sleep(job_cost))
+
+            def apply():
+                time.sleep(mute_cost)
+                on_done(True)
+            post(apply)
+
+        rung = threading.Event()
+
+        def ring():
+            rung.set()
+            return Channel()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        pipeline = IncomingCallPipeline(mute, ring, history=calls)
+        for _ in range(calls):
+            rung.clear()
+            pipeline.start("tv_tech", time.perf_counter())
+            rung.wait(1)
+            pipeline.cancel()
+        post(None)
+        thread.join()
+        report(f"incoming_ring (конвейер, очередь {queued})", pipeline.time_to_ring_ms())
+
+
+def bench_ringtone_cache(ringtones=4, seconds=60, decode_rate=100.0):
+    """
+    Загрузка рингтонов: декодирование, PCM с диска и из памяти.
+    Декодер имитируется: seconds секунд звука 44.1 кГц/16 бит/стерео
+    "декодируются" со скоростью decode_rate x реального времени.
+    """
+    fmt = (44100, -16, 2)
+
+    class FakeBackend:
+        def format(self):
+            return fmt
+
+        def decode(self, path):
+            time.sleep(seconds / decode_rate)
+            return bytes(seconds * fmt[0] * 4)
+
+        def from_pcm(self, data):
+            return data
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = []
+        for i in range(ringtones):
+            path = f"{root}/ring{i}.mp3"
+            with open(path, 'wb') as f:
+                f.write(f"ringtone {i}".encode() * 1000)
+            paths.append(path)
+
+        budget = 3 * 30 * fmt[0] * 4  # Три обрезанных рингтона
+        for title in ("декодирование", "PCM с диска"):
+            cache = RingtoneCache(f"{root}/cache", budget_bytes=budget, backend=FakeBackend())
+            timings = []
+            for path in paths:
+                started = time.perf_counter()
+                cache.load(path)
+                timings.append((time.perf_counter() - started) * 1000)
+            stats = cache.stats()
+            report(f"ringtone_cache ({title})", timings,
+                   f"(в памяти {stats['used_bytes'] / 1048576:.1f} из {budget / 1048576:.1f} МБ, "
+                   f"выгружено {stats['evictions']})")
+
+        timings = []
+        for _ in range(100):
+            started = time.perf_counter()
+            cache.get(paths[-1])
+            timings.append((time.perf_counter() - started) * 1000)
+        report("ringtone_cache (из памяти)", timings)
+
+
+def bench_playback(buffers=(512, 256, 128), plays=50):
+    """
+    Задержка от play() до начала микширования на драйвере SDL dummy
+    (работает на Linux без звуковой карты): первый звук сразу после открытия
+    микшера и звуки после прогрева, для разных размеров буфера.
+    """
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    try:
+        import pygame
+    except ImportError:
+        print("playback: pygame не установлен, пропуск")
+        return
+    from playback import PlaybackEngine
+
+    for buffer in buffers:
+        engine = PlaybackEngine(buffer=buffer)
+        mixer = engine.pygame.mixer
+        mixer.init(engine.frequency, engine.size, engine.channels, buffer)
+        channel = mixer.Channel(0)
+        cold = engine.measure_latency(channel)
+        latencies = [engine.measure_latency(channel) for _ in range(plays)]
+        mixer.quit()
+        report(f"playback (буфер {buffer})", [value for value in latencies if value is not None],
+               f"(первый {cold or 0:.2f} мс, буфер устройства {engine.buffer_ms:.1f} мс)")
+
+
+def bench_logging(calls=20000):
+    """
+    Стоимость строки журнала в горячем цикле: print в файл, app_log
+    с выключенным уровнем и с включенным (запись уходит в фоновый поток),
+    поток одинаковых сообщений с подавлением повторов.
+    """
+    import logging
+    import app_log
+
+    with tempfile.TemporaryDirectory() as root:
+        with open(f"{root}/print.txt", 'w', encoding='utf-8') as f:
+            started = time.perf_counter()
+            for i in range(calls):
+                print(f"⚠️ Временная ошибка доступа к окну: {i}", file=f)
+            per_call = (time.perf_counter() - started) / calls * 1e6
+        print(f"{'logging print в файл':<28} {per_call:8.3f} мкс/вызов")
+
+        app_log.setup(logging.INFO, log_dir=root, console=False, dedup_interval=0)
+        log = app_log.get_logger('bench')
+        for title, func in (("выключенный DEBUG", log.debug), ("INFO, фоновая запись", log.info)):
+            started = time.perf_counter()
+            for i in range(calls):
+                func("⚠️ Временная ошибка доступа к окну: %s", i)
+            per_call = (time.perf_counter() - started) / calls * 1e6
+            print(f"{'logging ' + title:<28} {per_call:8.3f} мкс/вызов")
+
+        app_log.setup(logging.INFO, log_dir=root, console=False)
+        log = app_log.get_logger('bench')
+        started = time.perf_counter()
+        for _ in range(calls):
+            log.warning("⚠️ Временная ошибка доступа к окну: %s", "timeout")
+        per_call = (time.perf_counter() - started) / calls * 1e6
+        print(f"{'logging повторы подавлены':<28} {per_call:8.3f} мкс/вызов")
+        app_log.shutdown()
+
+
+def bench_metrics(calls=100000):
+    """Стоимость замера metrics.timed() в выключенном и включенном состоянии."""
+    import metrics
+
+    registry = metrics.MetricsRegistry()
+    for enabled in (False, True):
+        registry.enabled = enabled
+        started = time.perf_counter()
+        for _ in range(calls):
+            with registry.timed('check_process'):
+                pass
+        per_call = (time.perf_counter() - started) / calls * 1e6
+        title = "включены" if enabled else "выключены"
+        print(f"{'metrics ' + title:<28} {per_call:8.3f} мкс/замер")
+    stats = registry.snapshot()['check_process']
+    print(f"{'metrics check_process':<28} p50={stats['p50'] * 1e6:.2f} мкс p99={stats['p99'] * 1e6:.2f} мкс")
+
+
+def bench_call_history(calls=20000, days=30):
+    """
+    История звонков: стоимость записи для вызывающего потока (только очередь)
+    и время запроса перцентилей ответа по дням и направлениям.
+    """
+    from call_history import CallHistoryStore, CallRecorder
+
+    with tempfile.TemporaryDirectory() as root:
+        store = CallHistoryStore(f"{root}/history.sqlite3", flush_interval=0.2)
+        now = [0.0]
+        recorder = CallRecorder(store, clock=lambda: now[0],
+                                wall_clock=lambda: 1790000000 + now[0] * days * 86400 / (calls * 60))
+        timings = []
+        for i in range(calls):
+            started = time.perf_counter()
+            recorder.incoming(DEFAULT_DIRECTIONS[i % len(DEFAULT_DIRECTIONS)])
+            now[0] += random.uniform(1, 25)
+            if i % 10:
+                recorder.answered()
+                now[0] += 30
+            recorder.ended()
+            timings.append((time.perf_counter() - started) * 1000)
+            now[0] += 5
+        report("call_history (звонок, GUI)", timings)
+
+        started = time.perf_counter()
+        store.flush(60)
+        print(f"{'call_history запись':<28} {(time.perf_counter() - started):.2f} с после постановки, "
+              f"пачек {store.batches}, строк {store.rows_written}")
+
+        timings = []
+        for _ in range(5):
+            started = time.perf_counter()
+            rows = store.answer_time_percentiles()
+            timings.append((time.perf_counter() - started) * 1000)
+        report("call_history перцентили", timings, f"({len(rows)} групп день/направление)")
+        store.close()
+
+
+def bench_core(calls=50, step=0.01):
+    """
+    Ядро без Qt: CallMonitor с фейковыми процессом и источником TMemo,
+    события читаются через asyncio (monitor.events()). Задержка - от
+    появления текста до получения события в цикле asyncio. Затем время
+    запуска и память процесса, который импортирует только ядро, против
+    процесса с pygame и PyQt5 (что из них установлено).
+    """
+    import asyncio
+    import subprocess
+    import importlib.util
+    from monitor_core import CallMonitor
+
+    script = []
+    for i in range(calls):
+        script.append((step, 1, f"Входящий звонок tv_tech #{i}"))
+        script.append((step, 1, ""))
+    watcher = FakeProcessWatcher()
+    watcher.start_process()
+    source = ScriptedMemoSource(script)
+    monitor = CallMonitor(memo_source=source, process_watcher=watcher)
+
+    async def consume():
+        latencies = []
+        async for event in monitor.events():
+            if event.name == 'incoming_call':
+                latencies.append((time.perf_counter() - event.detected_at) * 1000)
+                if len(latencies) == calls:
+                    return latencies
+
+    async def run():
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0)  # Подписка до запуска монитора
+        monitor.start()
+        try:
+            return await asyncio.wait_for(consumer, timeout=calls * step * 2 + 5)
+        finally:
+            monitor.stop()
+            monitor.join()
+
+    report("core (asyncio события)", asyncio.run(run()))
+
+    # Память - VmRSS из /proc (ru_maxrss в дочернем процессе наследует пик родителя)
+    probe = ("import time; t = time.perf_counter(); {imports}; ms = (time.perf_counter() - t) * 1000; "
+             "rss = [l.split()[1] for l in open('/proc/self/status') if l.startswith('VmRSS')][0]; "
+             "print(ms, rss)")
+    core_imports = "import monitor_core, call_state, call_history"
+    stacks = [("ядро", core_imports)]
+    gui = [core_imports]
+    for module in ('pygame', 'PyQt5'):
+        if importlib.util.find_spec(module) is not None:
+            gui.append(f"import {module}" + (".QtWidgets" if module == 'PyQt5' else ""))
+    if len(gui) > 1:
+        stacks.append(("ядро + " + ", ".join(line.split()[1] for line in gui[1:]), "; ".join(gui)))
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    for label, imports in stacks:
+        try:
+            output = subprocess.run([sys.executable, "-c", probe.format(imports=imports)], env=env,
+                                    capture_output=True, text=True, check=True).stdout.split()
+        except (subprocess.CalledProcessError, OSError, IndexError) as e:
+            print(f"core запуск ({label}): не удалось измерить: {e}")
+            continue
+        print(f"core запуск ({label}): импорт {float(output[0]):.1f} мс, "
+              f"память {int(output[1]) / 1024:.1f} МБ")
+
+
+def bench_profiles(profiles=4, calls=20, step=0.01):
+    """
+    Несколько профилей в одном CallMonitor: два и больше экземпляра
+    sipphone.exe и другой клиент. PID раздаются из общего снимка,
+    события TMemo с PID доходят до машины состояний своего профиля.
+    Считаются снимки процессов (общий против отдельного монитора на
+    профиль) и задержка доставки событий по профилям.
+    """
+    import asyncio
+    from monitor_core import CallMonitor
+    from monitor_profiles import MonitorProfile
+
+    class FakeSystem(FakeProcessWatcher):
+        """Снимок всех фейковых процессов сразу"""
+
+        def __init__(self, processes):
+            super().__init__()
+            self.processes = processes
+
+        def find_processes(self, names):
+            self.snapshot_scans += 1
+            wanted = {name.lower() for name in names}
+            return {name: sorted(pids) for name, pids in self.processes.items() if name in wanted}
+
+    names = ['sipphone.exe'] * (profiles - 1) + ['softphone.exe']
+    pids = [1000 + i for i in range(profiles)]
+    processes = {}
+    for name, pid in zip(names, pids):
+        processes.setdefault(name, []).append(pid)
+    system = FakeSystem(processes)
+    system.start_process(pids[0])
+    watchers = []
+    for name, pid in zip(names[1:], pids[1:]):
+        watcher = FakeProcessWatcher(name)
+        watcher.start_process(pid)
+        watchers.append(watcher)
+    factory = iter(watchers)
+
+    script = []
+    for i in range(calls):
+        for n, pid in enumerate(pids):
+            script.append((step / profiles, 10 + n, f"Входящий звонок tv_tech #{i}", pid))
+        for n, pid in enumerate(pids):
+            script.append((step / profiles, 10 + n, "", pid))
+    source = ScriptedMemoSource(script)
+    monitor = CallMonitor(memo_source=source, process_watcher=system,
+                          profiles=[MonitorProfile(name=f"line{n + 1}", process_name=name)
+                                    for n, name in enumerate(names)],
+                          watcher_factory=lambda name: next(factory))
+
+    async def consume():
+        latencies = {}
+        total = 0
+        async for event in monitor.events():
+            if event.name == 'incoming_call':
+                latencies.setdefault(event.profile.name, []).append(
+                    (time.perf_counter() - event.detected_at) * 1000)
+                total += 1
+                if total == calls * profiles:
+                    return latencies
+
+    async def run():
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        monitor.start()
+        try:
+            return await asyncio.wait_for(consumer, timeout=calls * step * 2 + 5), time.perf_counter() - started
+        finally:
+            monitor.stop()
+            monitor.join()
+
+    latencies, elapsed = asyncio.run(run())
+    for name in sorted(latencies):
+        report(f"profiles {name}", latencies[name])
+    assigned = {state.profile.name: state.process_id for state in monitor.profiles}
+    print(f"profiles: PID {assigned}, снимков {system.snapshot_scans} за {elapsed:.2f} с "
+          f"(отдельные мониторы: {system.snapshot_scans * profiles})")
+
+
+def bench_polling(hours=8, tick_cost=0.002):
+    """
+    Адаптивный опрос против прежних фиксированных интервалов (0.5 с без
+    событий TMemo, 2 с с событиями) на синтетической смене
+    (trace_replay.synthetic_trace), проигранной на виртуальных часах.
+    Задержка обнаружения входящего, ответа и конца звонка, тики и
+    процессорное время в час; стоимость одного опроса - tick_cost (оценка).
+    """
+    from trace_replay import TraceReplayer, synthetic_trace
+
+    trace = synthetic_trace(hours)
+    fixed = {'fast': 0.5, 'call': 0.5, 'idle_min': 0.5, 'idle_max': 0.5, 'poll_idle_max': 0.5}
+    fixed_events = {'fast': 2.0, 'call': 2.0, 'idle_min': 2.0, 'idle_max': 2.0, 'poll_idle_max': 2.0}
+    variants = [
+        ("опрос, фикс. 0.5 с", fixed, False),
+        ("опрос, адаптивный", None, False),
+        ("события, фикс. 2 с", fixed_events, True),
+        ("события, адаптивный", None, True),
+    ]
+    calls = sum(1 for record in trace if record.kind == 'event' and record.value[0] == 'incoming_call')
+    print(f"polling: смена {hours} ч, входящих {calls}, стоимость опроса {tick_cost * 1000:.1f} мс (оценка)")
+    for label, settings, events in variants:
+        result = TraceReplayer(trace, settings=settings, events=events).run()
+        stats = result.poll_stats
+        # С событиями изменение будит цикл сразу: задержка нулевая по построению
+        for name in () if events else ('incoming_call', 'call_answered', 'call_ended'):
+            report(f"polling {label}: {name}", [value * 1000 for value in result.latencies(name)])
+        by_mode = ", ".join(f"{mode} {count}" for mode, count in stats['ticks_by_mode'].items() if count)
+        print(f"polling {label}: {stats['rate']:.2f} тиков/с ({by_mode}), "
+              f"CPU ~{result.ticks * tick_cost / hours:.1f} с/ч, проигрывание {result.wall_seconds:.2f} с")
+
+
+def bench_replay(traces=20, hours=1.0, glitch_rate=0.1):
+    """
+    Набор синтетических трасс (перезапуски телефона, исходящие, пропущенные
+    и кратковременно пустеющий TMemo) через TraceReplayer с событиями TMemo
+    и только опросом: задержка обнаружения по событиям, лишние и
+    пропущенные переходы и сколько трасс в секунду проигрывается.
+    """
+    from trace_replay import TraceReplayer, synthetic_trace
+
+    suite = [synthetic_trace(hours, seed=seed, glitch_rate=glitch_rate, restarts=1) for seed in range(traces)]
+    for label, events in (("события", True), ("опрос", False)):
+        latencies = {}
+        false_transitions = missed = records = 0
+        started = time.perf_counter()
+        for trace in suite:
+            result = TraceReplayer(trace, events=events).run()
+            for detection in result.detections:
+                latencies.setdefault(detection.name, []).append(
+                    (detection.detected_at - detection.changed_at) * 1000)
+            false_transitions += len(result.false_transitions)
+            missed += len(result.missed)
+            records += len(trace)
+        elapsed = time.perf_counter() - started
+        for name in ('incoming_call', 'call_answered', 'call_ended', 'process_running'):
+            report(f"replay {label}: {name}", latencies.get(name, []))
+        print(f"replay {label}: лишних переходов {false_transitions}, пропущено {missed}, "
+              f"{traces / elapsed:.1f} трасс/с ({records / elapsed:.0f} записей/с, "
+              f"{traces * hours * 3600 / elapsed:.0f}x быстрее реального времени)")
+
+
+def bench_memo_read(ticks=5000, lines=2000, change_rate=0.05, tick=0.5):
+    """
+    Растущий журнал TMemo, опрос на каждом тике: полное копирование
+    (WM_GETTEXT) и поиск по всему тексту против MemoReader (метка длины и
+    числа строк, дочитывание хвоста) и IncrementalMatch. FakeEditApi
+    считает скопированные символы и сообщения окну; время - только поиск
+    триггеров (стоимость сообщений между процессами на Linux не измерить).
+    Результат поиска сверяется с полным на каждом тике.
+    """
+    from memo_reader import MemoReader, FakeEditApi
+    from call_state import IncrementalMatch
+
+    rng = random.Random(7)
+    matcher = TriggerMatcher()
+    initial = "\r\n".join(f"12:{i % 60:02d}:00 Регистрация ok {i}" for i in range(lines))
+    texts = []
+    text = initial
+    for _ in range(ticks):
+        if rng.random() < change_rate:
+            direction = rng.choice(DEFAULT_DIRECTIONS)
+            text += "\r\n" + rng.choice([f"Входящий звонок {direction}", "Длительность 00:00", "Завершен"])
+        texts.append(text)
+
+    expected = []
+    for label in ("полное чтение", "MemoReader"):
+        api = FakeEditApi()
+        clock = [0.0]
+        reader = MemoReader(1, api, clock=lambda: clock[0])
+        scan = IncrementalMatch(matcher)
+        timings = []
+        for n, text in enumerate(texts):
+            api.texts[1] = text
+            clock[0] += tick
+            if label == "полное чтение":
+                text = api.get_text(1, api.text_length(1))
+                started = time.perf_counter()
+                result = matcher.match(text)
+                timings.append((time.perf_counter() - started) * 1000)
+                expected.append(result)
+            else:
+                text = reader.read()
+                started = time.perf_counter()
+                result = scan.feed(text, reader.appended_from) if reader.changed else scan.result
+                timings.append((time.perf_counter() - started) * 1000)
+                if result != expected[n]:
+                    print(f"❌ memo_read: тик {n}: {result} != {expected[n]}")
+                    return
+        report(f"memo_read {label}: поиск", timings,
+               f"скопировано {api.copied * 2 / 1024 / ticks:.2f} КБ/тик, "
+               f"сообщений {api.messages / ticks:.1f}/тик")
+    stats = reader.stats.as_dict()
+    print(f"memo_read MemoReader: пропущено {stats['skipped']}, дочитано {stats['appended']}, "
+          f"целиком {stats['full']} (сверка раз в {reader.verify_interval:.0f} с), результаты совпали")
+
+
+def bench_gui_styling(ticks=2000, icon_pixels=512):
+    """
+    Тик секундомера и смена статуса в окне: setStyleSheet() на каждом тике
+    против готовых палитр LabelPalettes и масштабирование иконки на каждую
+    смену статуса против StatusIcons. Qt без экрана (QT_QPA_PLATFORM=offscreen),
+    иконка - сгенерированный QPixmap. Без PyQt5 бенчмарк пропускается.
+    """
+    import importlib.util
+    if importlib.util.find_spec('PyQt5') is None:
+        print("gui_styling: PyQt5 не установлен, пропуск")
+        return
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtGui import QPixmap, QColor
+    from PyQt5.QtWidgets import QApplication, QLabel
+    from gui_assets import StatusIcons, LabelPalettes, COLOR_OK, COLOR_LATE, COLOR_HIDDEN
+
+    app = QApplication.instance() or QApplication([])
+    # Цвет на тике как в update_timer/blink: зеленый, затем мигание красный/прозрачный
+    colors = [COLOR_OK if n % 20 < 12 else (COLOR_LATE if n % 2 else COLOR_HIDDEN) for n in range(ticks)]
+
+    label = QLabel()
+    timings = []
+    for n, color in enumerate(colors):
+        started = time.perf_counter()
+        label.setText(f"Время ожидания: {n} сек")
+        label.setStyleSheet(f"color: {color}; font-weight: bold;")
+        app.processEvents()
+        timings.append((time.perf_counter() - started) * 1000)
+    report("gui_styling setStyleSheet", timings)
+
+    label = QLabel()
+    palettes = LabelPalettes(label.palette())
+    timings = []
+    for n, color in enumerate(colors):
+        started = time.perf_counter()
+        label.setText(f"Время ожидания: {n} сек")
+        palettes.apply(label, color)
+        app.processEvents()
+        timings.append((time.perf_counter() - started) * 1000)
+    report("gui_styling LabelPalettes", timings)
+
+    source = QPixmap(icon_pixels, icon_pixels)
+    source.fill(QColor('#2196F3'))
+    keys = ["speakers", "headset", "ringing", "disconnected"]
+    label = QLabel()
+    timings = []
+    for n in range(ticks // 10):
+        started = time.perf_counter()
+        label.setPixmap(source.scaled(64, 64, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        timings.append((time.perf_counter() - started) * 1000)
+    report("gui_styling scaled() на статус", timings)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "icon.png")
+        source.save(path)
+        icons = StatusIcons({key: path for key in keys})
+    timings = []
+    for n in range(ticks // 10):
+        started = time.perf_counter()
+        icons.prepare(1.0)
+        label.setPixmap(icons.get(keys[n % len(keys)]))
+        timings.append((time.perf_counter() - started) * 1000)
+    report("gui_styling StatusIcons", timings)
+
+
+def bench_routing(calls=20000, rules=40):
+    """
+    Выбор маршрута входящего: проход по правилам с fnmatch на каждый звонок
+    против RoutingTable (словарь точных направлений, шаблоны по приоритету,
+    запомненный результат). Маршруты сверяются.
+    """
+    from fnmatch import fnmatchcase
+    from call_routing import RoutingTable
+
+    config = [{'direction': f"queue_{i}", 'ringtone': f"ring{i % 4}.mp3", 'priority': i} for i in range(rules)]
+    config.append({'direction': "tv_*", 'color': '#2196F3', 'priority': rules})
+    table = RoutingTable(config)
+    rng = random.Random(3)
+    directions = [rng.choice([f"queue_{rng.randrange(rules)}", "tv_tech", "tv_order", None])
+                  for _ in range(calls)]
+
+    def scan(direction):
+        for rule in table.rules:
+            if direction is not None and fnmatchcase(direction, rule.pattern):
+                return rule.pattern
+        return None
+
+    for label, lookup in (("проход по правилам", scan), ("RoutingTable", lambda d: table.route(d).pattern)):
+        timings = []
+        for direction in directions:
+            started = time.perf_counter()
+            pattern = lookup(direction)
+            timings.append((time.perf_counter() - started) * 1000)
+            if pattern != scan(direction):
+                print(f"❌ routing: {direction}: {pattern} != {scan(direction)}")
+                return
+        report(f"routing {label}", timings, f"правил {len(table.rules)}")
+
+
+BENCHMARKS = {
+    'memo_events': bench_memo_events,
+    'process_exit': bench_process_exit,
+    'trigger_match': bench_trigger_match,
+    'incoming_ring': bench_incoming_ring,
+    'ringtone_cache': bench_ringtone_cache,
+    'playback': bench_playback,
+    'logging': bench_logging,
+    'metrics': bench_metrics,
+    'call_history': bench_call_history,
+    'core': bench_core,
+    'profiles': bench_profiles,
+    'polling': bench_polling,
+    'memo_read': bench_memo_read,
+    'replay': bench_replay,
+    'gui_styling': bench_gui_styling,
+    'routing': bench_routing,
+}
+
+
+def main(argv):
+    names = argv or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"❌ Неизвестный бенчмарк: {name}. Доступны: {', '.join(BENCHMARKS)}")
+            return 1
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,266 @@
+# call_audio.py
+"""
+Реакция на события звонка без Qt: гарнитура, динамики, mute софтфона,
+рингтон и история звонков.
+
+CallAudioController - общая логика для GUI и фонового сервиса. Сервис
+подписывает handle_event() на CallMonitor, GUI вызывает те же методы
+on_*(event) из своих слотов и добавляет к ним только обновление виджетов.
+Переключение и mute идут в потоке AudioWorker, методы не блокируют.
+audio_manager (comtypes, pycaw) импортируется при первом обращении к звуку.
+
+Устройства берутся из профиля события (MonitorProfile.device_key), mute -
+по имени процесса профиля. Пока звонок идет хотя бы в одном профиле,
+завершение звонка в другом не возвращает динамики.
+
+Входящий получает маршрут по направлению (call_routing.RoutingTable): из
+него берутся рингтон и гарнитура разговора. Входящий с менее важным
+направлением не перебивает рингтон уже звонящего профиля.
+
+С 'headset_preswitch': true в config.json роль Communications переводится
+на гарнитуру уже на входящем (preswitch): рингтон играет через роль
+Console/Multimedia и остается на динамиках, а на call_started самое
+долгое переключение - роль, через которую идет голос, - уже сделано.
+Сколько времени так скрыто, пишется в журнал и в metrics
+('headset_preswitch_hidden'). Если звонок пропущен или отменен
+(call_ended или process_stopped без call_started), роль возвращается на
+динамики. Пока в другом профиле идет звонок, предварительного
+переключения нет: его гарнитура не трогается.
+"""
+import time
+
+import metrics
+from app_log import get_logger
+from call_pipeline import IncomingCallPipeline
+from call_history import CallRecorder
+from monitor_profiles import MonitorProfile
+from call_routing import RoutingTable
+
+log = get_logger(__name__)
+
+
+class CallAudioController:
+    """
+    ring(route) - запуск рингтона маршрута (возвращает объект со stop() или
+    None). Без него софтфон не глушится: звонит сам телефон.
+    on_switch_done(request) - результат переключения, в потоке AudioWorker.
+    history - CallHistoryStore или None; звонки пишутся отдельно по профилям.
+    preswitch - роль Communications на гарнитуру уже на входящем.
+    """
+
+    def __init__(self, config_file='config.json', ring=None, history=None, on_switch_done=None,
+                 default_profile=None, routing=None, preswitch=False):
+        self.config_file = config_file
+        self.preswitch = preswitch
+        self.preswitched = {}  # имя профиля -> SwitchRequest предварительного переключения
+        self.routing = routing or RoutingTable()
+        self.routes = {}  # имя профиля -> Route текущего входящего
+        self.history = history
+        self.on_switch_done = on_switch_done
+        self.default_profile = default_profile or MonitorProfile()
+        self.recorders = {}  # имя профиля -> CallRecorder
+        self.in_call = set()  # профили, где сейчас идет звонок (входящий, исходящий, разговор)
+        self.ringing_profile = None
+        self.ringing_route = None
+        # Входящий: mute софтфона в потоке AudioWorker, рингтон сразу после подтверждения
+        self.pipeline = None
+        if ring is not None:
+            self.pipeline = IncomingCallPipeline(lambda on_done: self.mute(on_done, self.ringing_profile),
+                                                 lambda: ring(self.ringing_route))
+
+    def handle_event(self, event, context=None):
+        """Слушатель CallMonitor: вызывает on_<имя события>(event, context)"""
+        handler = getattr(self, 'on_' + event.name, None)
+        if handler is None:
+            return None
+        return handler(event, context)
+
+    def profile_of(self, event):
+        return event.profile if event is not None and event.profile is not None else self.default_profile
+
+    def recorder(self, profile):
+        """CallRecorder профиля (None без истории)"""
+        if self.history is None:
+            return None
+        recorder = self.recorders.get(profile.name)
+        if recorder is None:
+            recorder = self.recorders[profile.name] = CallRecorder(self.history)
+        return recorder
+
+    def switch(self, device_type, context=None, profile=None, device_key=None, roles=None):
+        """device_key - ключ устройства из маршрута вместо устройства профиля, roles - только эти роли"""
+        import audio_manager
+        key = device_key or (profile or self.default_profile).device_key(device_type)
+        return audio_manager.switch_device_async(key, self.config_file, roles=roles,
+                                                 on_done=self.on_switch_done, context=context)
+
+    def start_preswitch(self, profile, route):
+        """Входящий: роль Communications на гарнитуру маршрута, рингтон остается на динамиках"""
+        if self.in_call - {profile.name}:
+            log.debug("🎧 Предварительное переключение пропущено: идет звонок в %s",
+                      ", ".join(sorted(self.in_call - {profile.name})))
+            return None
+        import audio_manager
+        request = self.switch('headset', None, profile, route.headset, roles=[audio_manager.ROLE_COMMUNICATIONS])
+        self.preswitched[profile.name] = request
+        log.info("🎧 Предварительное переключение [%s]: Communications -> гарнитура", profile.name)
+        return request
+
+    def finish_preswitch(self, profile):
+        """Разговор начался: сколько времени переключения скрыто звонком (сек или None)"""
+        request = self.preswitched.pop(profile.name, None)
+        if request is None:
+            return None
+        if request.latency is None or not request.result:
+            log.info("🎧 Предварительное переключение [%s] не успело или не удалось", profile.name)
+            return None
+        metrics.observe('headset_preswitch_hidden', request.latency)
+        log.info("🎧 Предварительное переключение [%s] скрыло %.1f мс (готово за %.1f мс до разговора)",
+                 profile.name, request.latency * 1000, (time.perf_counter() - request.finished_at) * 1000)
+        return request.latency
+
+    def rollback_preswitch(self, profile, context=None):
+        """Звонок пропущен или отменен: роль Communications обратно на динамики"""
+        if self.preswitched.pop(profile.name, None) is None:
+            return None
+        if self.in_call:
+            return None  # Гарнитура нужна звонку другого профиля
+        import audio_manager
+        log.info("↩️ Звонок [%s] не принят: Communications обратно на динамики", profile.name)
+        return self.switch('speakers', context, profile, roles=[audio_manager.ROLE_COMMUNICATIONS])
+
+    def mute(self, on_done=None, profile=None):
+        """
+        Заглушает звук софтфона профиля в потоке AudioWorker.
+        on_done(ok) вызывается в потоке AudioWorker после применения.
+        """
+        import audio_manager
+        process_name = (profile or self.default_profile).process_name
+
+        def done(request):
+            ok = request.error is None and bool(request.result)
+            if request.error is not None:
+                log.warning("⚠️ Не удалось заглушить %s: %s", process_name, request.error)
+            elif ok:
+                metrics.observe('mute_sipphone', request.latency or 0)
+                log.info("🔇 Звук %s заглушен (%.1f мс)", process_name, (request.latency or 0) * 1000)
+            if on_done is not None:
+                on_done(ok)
+
+        return audio_manager.mute_process_async(process_name, True, on_done=done)
+
+    def unmute(self, profile=None):
+        """Включает звук софтфона, если его заглушили мы"""
+        import audio_manager
+        process_name = (profile or self.default_profile).process_name
+
+        def done(request):
+            if request.error is not None:
+                log.warning("⚠️ Не удалось включить звук %s: %s", process_name, request.error)
+            elif request.result:
+                log.info("🔊 Звук %s включен", process_name)
+
+        return audio_manager.mute_process_async(process_name, False, on_done=done)
+
+    def stop_ringtone(self, profile=None):
+        """Останавливает рингтон (только если звонит этот профиль). True, если рингтон звучал"""
+        if self.pipeline is None:
+            return False
+        if profile is not None and self.ringing_profile is not None and profile.name != self.ringing_profile.name:
+            return False
+        self.ringing_profile = None
+        self.ringing_route = None
+        return self.pipeline.cancel()
+
+    def on_incoming_call(self, event, context=None):
+        """Возвращает маршрут направления (Route)"""
+        profile = self.profile_of(event)
+        direction = event.args[0] if event.args else None
+        route = self.routes[profile.name] = self.routing.route(direction)
+        self.in_call.add(profile.name)
+        recorder = self.recorder(profile)
+        if recorder is not None:
+            recorder.incoming(direction)
+        if self.preswitch:
+            self.start_preswitch(profile, route)
+        if self.pipeline is not None:
+            ringing = self.ringing_route
+            if (ringing is not None and self.ringing_profile.name != profile.name
+                    and ringing.priority < route.priority):
+                log.info("🔔 Входящий %s [%s] не перебивает более важный %s [%s]",
+                         direction, profile.name, ringing.direction, self.ringing_profile.name)
+                return route
+            # КРИТИЧНО: сначала глушим софтфон, рингтон включится сразу после подтверждения mute
+            self.ringing_profile = profile
+            self.ringing_route = route
+            self.pipeline.start(direction, event.detected_at)
+        return route
+
+    def on_outgoing_call(self, event=None, context=None):
+        profile = self.profile_of(event)
+        self.in_call.add(profile.name)
+        self.routes.pop(profile.name, None)
+        recorder = self.recorder(profile)
+        if recorder is not None:
+            recorder.outgoing()
+        # При исходящем рингтон не нужен, сразу гарнитура
+        return self.switch('headset', context, profile)
+
+    def on_call_answered(self, event=None, context=None):
+        """Возвращает время ожидания ответа, сек (или None)"""
+        profile = self.profile_of(event)
+        self.stop_ringtone(profile)
+        self.unmute(profile)
+        recorder = self.recorder(profile)
+        return recorder.answered() if recorder is not None else None
+
+    def on_call_started(self, event=None, context=None):
+        profile = self.profile_of(event)
+        self.in_call.add(profile.name)
+        recorder = self.recorder(profile)
+        if recorder is not None:
+            recorder.answered()  # Для исходящего - соединение
+        self.finish_preswitch(profile)
+        route = self.routes.get(profile.name)
+        return self.switch('headset', context, profile, route.headset if route is not None else None)
+
+    def on_call_ended(self, event=None, context=None):
+        profile = self.profile_of(event)
+        self.in_call.discard(profile.name)
+        self.routes.pop(profile.name, None)
+        recorder = self.recorder(profile)
+        if recorder is not None:
+            recorder.ended()
+        self.stop_ringtone(profile)
+        self.unmute(profile)
+        if self.preswitched.pop(profile.name, None) is not None and not self.in_call:
+            log.info("↩️ Звонок [%s] не принят: динамики вместе с ролью Communications", profile.name)
+        if self.in_call:
+            log.info("🎧 Звонок [%s] завершен, но идет звонок в %s - гарнитура остается",
+                     profile.name, ", ".join(sorted(self.in_call)))
+            return None
+        return self.switch('speakers', context, profile)
+
+    def on_process_stopped(self, event=None, context=None):
+        profile = self.profile_of(event)
+        self.in_call.discard(profile.name)
+        self.routes.pop(profile.name, None)
+        recorder = self.recorder(profile)
+        if recorder is not None:
+            recorder.ended()
+        self.stop_ringtone(profile)
+        return self.rollback_preswitch(profile)
+
+    def on_process_running(self, event=None, context=None):
+        return self.on_call_ended(event, context)
+
+    def shutdown(self, profiles=None):
+        """Синхронно возвращает звук софтфонов и динамики (при выходе)"""
+        import audio_manager
+        self.stop_ringtone()
+        profiles = profiles or [self.default_profile]
+        for process_name in dict.fromkeys(profile.process_name for profile in profiles):
+            audio_manager.set_process_mute(process_name, False, timeout=2)
+        audio_manager.set_device_from_config(profiles[0].device_key('speakers'), self.config_file)
+        for recorder in self.recorders.values():
+            recorder.ended()
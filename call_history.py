@@ -0,0 +1,309 @@
+# call_history.py
+"""
+История звонков в SQLite (режим WAL).
+
+CallRecorder отслеживает текущий звонок по событиям монитора и считает
+ожидание и разговор по time.monotonic(), а не по тикам QTimer, которые
+отстают под нагрузкой. CallHistoryStore пишет события и итог каждого
+звонка в фоновом потоке пачками (одна транзакция на пачку), поток GUI
+только кладет запись в очередь. База открывается, переводится в WAL и
+получает схему тоже в фоновом потоке: создание хранилища не трогает
+диск. Таблицы только дополняются. Если пачка не записалась из-за одной
+записи (повтор call_id), пачка пишется заново по одной записи, и теряется
+только эта запись.
+
+Пример запроса: store.answer_time_percentiles() - p50/p90/p95 времени
+ответа по направлениям и дням.
+"""
+import os
+import time
+import queue
+import sqlite3
+import threading
+import uuid
+from contextlib import closing
+from datetime import datetime
+
+from app_log import get_logger
+
+log = get_logger(__name__)
+
+DB_FILE = 'call_history.sqlite3'
+FLUSH_INTERVAL = 1.0
+BATCH_SIZE = 100
+
+KIND_INCOMING = 'incoming'
+KIND_OUTGOING = 'outgoing'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS call_events (
+    id INTEGER PRIMARY KEY,
+    call_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    direction TEXT,
+    wall_time REAL NOT NULL,
+    mono_time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS calls (
+    call_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    direction TEXT,
+    day TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    answered INTEGER NOT NULL,
+    answer_seconds REAL,
+    talk_seconds REAL,
+    total_seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calls_day_direction ON calls (day, direction, answer_seconds);
+"""
+
+INSERT_EVENT = ("INSERT INTO call_events (call_id, event, direction, wall_time, mono_time) "
+                "VALUES (?, ?, ?, ?, ?)")
+INSERT_CALL = ("INSERT INTO calls (call_id, kind, direction, day, started_at, answered, "
+               "answer_seconds, talk_seconds, total_seconds) VALUES (:call_id, :kind, :direction, "
+               ":day, :started_at, :answered, :answer_seconds, :talk_seconds, :total_seconds)")
+
+# Перцентиль по ближайшему рангу, оконные функции SQLite (3.25+)
+PERCENTILE_QUERY = """
+WITH ranked AS (
+    SELECT day, direction, answer_seconds,
+           ROW_NUMBER() OVER (PARTITION BY day, direction ORDER BY answer_seconds) AS rank,
+           COUNT(*) OVER (PARTITION BY day, direction) AS total
+    FROM calls
+    WHERE kind = ? AND answered = 1 AND day >= ? AND day <= ?
+)
+SELECT day, direction, total,
+       MIN(CASE WHEN rank >= total * 0.50 THEN answer_seconds END),
+       MIN(CASE WHEN rank >= total * 0.90 THEN answer_seconds END),
+       MIN(CASE WHEN rank >= total * 0.95 THEN answer_seconds END),
+       MAX(answer_seconds)
+FROM ranked
+GROUP BY day, direction
+ORDER BY day, direction
+"""
+
+
+class CallHistoryStore:
+    """
+    append_event() и append_call() только кладут запись в очередь,
+    запись в базу идет в потоке CallHistoryWriter раз в flush_interval
+    секунд или по batch_size записей.
+    """
+
+    def __init__(self, path=DB_FILE, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE):
+        self.path = os.path.abspath(path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._stopping = False
+        self.batches = 0
+        self.rows_written = 0
+        self._ready = threading.Event()  # База открыта и схема создана
+
+        self._thread = threading.Thread(target=self._run, name="CallHistoryWriter", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def append_event(self, call_id, event, direction, wall_time, mono_time):
+        self._queue.put(('event', (call_id, event, direction, wall_time, mono_time)))
+
+    def append_call(self, record):
+        """record - dict с полями таблицы calls."""
+        self._queue.put(('call', record))
+
+    def _open(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._open()
+        except sqlite3.Error as e:
+            log.error("❌ Не удалось открыть базу истории звонков %s: %s", self.path, e)
+            return
+        finally:
+            self._ready.set()
+        try:
+            while True:
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    if self._stopping:
+                        return
+                    continue
+                # Набираем пачку: все, что успело прийти за flush_interval
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and batch[-1] is not None:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                stop = batch[-1] is None
+                self._write(conn, [item for item in batch if item is not None])
+                for _ in batch:
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        if not batch:
+            return
+        events = [row for kind, row in batch if kind == 'event']
+        calls = [row for kind, row in batch if kind == 'call']
+        try:
+            with conn:
+                conn.executemany(INSERT_EVENT, events)
+                conn.executemany(INSERT_CALL, calls)
+            written = len(batch)
+        except sqlite3.IntegrityError as e:
+            log.warning("⚠️ Пачка истории звонков (%d записей) не записалась: %s, пишем по одной",
+                        len(batch), e)
+            written = self._write_rows(conn, batch)
+        except sqlite3.Error as e:
+            log.error("❌ Не удалось записать историю звонков (%d записей): %s", len(batch), e)
+            return
+        self.batches += 1
+        self.rows_written += written
+
+    def _write_rows(self, conn, batch):
+        """Каждая запись в своей точке сохранения: ошибка одной не откатывает остальные"""
+        written = 0
+        try:
+            with conn:
+                for kind, row in batch:
+                    conn.execute("SAVEPOINT history_row")
+                    try:
+                        conn.execute(INSERT_EVENT if kind == 'event' else INSERT_CALL, row)
+                        written += 1
+                    except sqlite3.IntegrityError as e:
+                        conn.execute("ROLLBACK TO history_row")
+                        log.warning("⚠️ Запись истории звонков пропущена (%s %s): %s",
+                                    kind, row[0] if kind == 'event' else row['call_id'], e)
+                    conn.execute("RELEASE history_row")
+        except sqlite3.Error as e:
+            log.error("❌ Не удалось записать историю звонков (%d записей): %s", len(batch), e)
+            return 0
+        return written
+
+    def flush(self, timeout=5.0):
+        """Ждет, пока очередь будет записана (для выхода и тестов производительности)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self, timeout=5.0):
+        """Дописывает очередь и останавливает поток записи."""
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def answer_time_percentiles(self, since=None, until=None, kind=KIND_INCOMING):
+        """
+        Время ответа по дням и направлениям: список dict
+        (day, direction, count, p50, p90, p95, max), секунды.
+        since/until - даты 'YYYY-MM-DD' включительно.
+        """
+        self._ready.wait(5)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(PERCENTILE_QUERY,
+                                (kind, since or '0000-00-00', until or '9999-99-99')).fetchall()
+        keys = ('day', 'direction', 'count', 'p50', 'p90', 'p95', 'max')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def missed_calls(self, since=None, until=None):
+        """Число пропущенных входящих по дням и направлениям: {(day, direction): count}."""
+        self._ready.wait(5)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT day, direction, COUNT(*) FROM calls WHERE kind = ? AND answered = 0 "
+                "AND day >= ? AND day <= ? GROUP BY day, direction",
+                (KIND_INCOMING, since or '0000-00-00', until or '9999-99-99')).fetchall()
+        return {(day, direction): count for day, direction, count in rows}
+
+
+class CallRecorder:
+    """
+    Текущий звонок по событиям монитора. Время ожидания и ответа - по
+    clock (time.monotonic), дата и время начала - по wall_clock.
+    """
+
+    def __init__(self, store, clock=time.monotonic, wall_clock=time.time):
+        self.store = store
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.call = None
+
+    def _event(self, event):
+        self.store.append_event(self.call['call_id'], event, self.call['direction'],
+                                self.wall_clock(), self.clock())
+
+    def _begin(self, kind, direction):
+        if self.call is not None:
+            self.ended()
+        now = self.clock()
+        wall = self.wall_clock()
+        self.call = {
+            # Профили начинают звонки в один момент - время в ключ не годится
+            'call_id': uuid.uuid4().hex,
+            'kind': kind,
+            'direction': direction,
+            'started_mono': now,
+            'started_at': wall,
+            'answered_mono': None,
+        }
+        self._event(kind)
+
+    def incoming(self, direction):
+        self._begin(KIND_INCOMING, direction)
+
+    def outgoing(self):
+        self._begin(KIND_OUTGOING, None)
+
+    def answered(self):
+        """Отмечает ответ. Возвращает время ожидания, сек (или None, если звонка нет)."""
+        if self.call is None:
+            return None
+        if self.call['answered_mono'] is None:
+            self.call['answered_mono'] = self.clock()
+            self._event('answered')
+        return self.call['answered_mono'] - self.call['started_mono']
+
+    def waiting_seconds(self):
+        """Сколько ждет текущий звонок (по монотонным часам)."""
+        if self.call is None:
+            return 0.0
+        return self.clock() - self.call['started_mono']
+
+    def ended(self):
+        """Завершает текущий звонок и ставит его итог в очередь записи."""
+        call, self.call = self.call, None
+        if call is None:
+            return None
+        now = self.clock()
+        self.store.append_event(call['call_id'], 'ended', call['direction'], self.wall_clock(), now)
+        answered = call['answered_mono'] is not None
+        record = {
+            'call_id': call['call_id'],
+            'kind': call['kind'],
+            'direction': call['direction'],
+            'day': datetime.fromtimestamp(call['started_at']).strftime('%Y-%m-%d'),
+            'started_at': call['started_at'],
+            'answered': int(answered),
+            'answer_seconds': call['answered_mono'] - call['started_mono'] if answered else None,
+            'talk_seconds': now - call['answered_mono'] if answered else None,
+            'total_seconds': now - call['started_mono'],
+        }
+        self.store.append_call(record)
+        return record
@@ -0,0 +1,138 @@
+# call_pipeline.py
+"""
+Конвейер входящего звонка: заглушить sipphone.exe, затем запустить рингтон.
+
+Раньше слот GUI глушил телефон синхронно, спал 50 мс и только потом включал
+рингтон. Здесь mute выполняется асинхронно, а рингтон запускается сразу из
+обработчика подтверждения, в том потоке, который выполнил mute, и не ждет
+очереди событий GUI. Для каждого звонка пишутся отметки этапов:
+detect (монитор увидел вызов), slot (слот GUI получил сигнал),
+mute (mute подтвержден) и ring (рингтон запущен).
+"""
+import time
+import threading
+from collections import deque
+
+from app_log import get_logger
+import metrics
+
+log = get_logger(__name__)
+
+STAGE_DETECT = 'detect'
+STAGE_SLOT = 'slot'
+STAGE_MUTE = 'mute'
+STAGE_RING = 'ring'
+STAGES = (STAGE_DETECT, STAGE_SLOT, STAGE_MUTE, STAGE_RING)
+
+# Если mute не подтвержден за это время, рингтон все равно запускается
+MUTE_TIMEOUT = 0.5
+
+
+class CallTrace:
+    """Отметки времени этапов одного входящего звонка (clock(), сек)."""
+
+    def __init__(self, direction):
+        self.direction = direction
+        self.stages = {}
+        self.muted = None  # True/False - результат mute, None - не дождались
+        self.cancelled = False
+
+    def mark(self, stage, at):
+        self.stages.setdefault(stage, at)
+
+    def elapsed(self, start, end):
+        if start not in self.stages or end not in self.stages:
+            return None
+        return self.stages[end] - self.stages[start]
+
+    @property
+    def time_to_ring(self):
+        """От обнаружения вызова до запуска рингтона, сек."""
+        return self.elapsed(STAGE_DETECT, STAGE_RING)
+
+    def summary(self):
+        parts = []
+        for start, end in zip(STAGES, STAGES[1:]):
+            value = self.elapsed(start, end)
+            if value is not None:
+                parts.append(f"{start}→{end} {value * 1000:.1f} мс")
+        if self.time_to_ring is not None:
+            parts.append(f"до звука {self.time_to_ring * 1000:.1f} мс")
+        return ", ".join(parts)
+
+
+class IncomingCallPipeline:
+    """
+    mute(on_done) запускает заглушение и вызывает on_done(ok) из любого потока.
+    ring() запускает рингтон и возвращает объект со stop() (канал pygame) или None.
+    """
+
+    def __init__(self, mute, ring, clock=time.perf_counter, mute_timeout=MUTE_TIMEOUT, history=100):
+        self.mute = mute
+        self.ring = ring
+        self.clock = clock
+        self.mute_timeout = mute_timeout
+        self.traces = deque(maxlen=history)  # Завершенные звонки, для статистики
+        self._lock = threading.Lock()
+        self._current = None
+        self._channel = None
+        self._timer = None
+
+    def start(self, direction, detected_at=None):
+        """Начинает конвейер для нового вызова, предыдущий отменяется."""
+        now = self.clock()
+        self.cancel()
+        trace = CallTrace(direction)
+        trace.mark(STAGE_DETECT, detected_at if detected_at is not None else now)
+        trace.mark(STAGE_SLOT, now)
+        with self._lock:
+            self._current = trace
+            if self.mute_timeout is not None:
+                self._timer = threading.Timer(self.mute_timeout, self._on_muted, (trace, None))
+                self._timer.daemon = True
+                self._timer.start()
+        try:
+            self.mute(lambda ok: self._on_muted(trace, ok))
+        except Exception as e:
+            log.warning("⚠️ Не удалось заглушить sipphone: %s", e)
+            self._on_muted(trace, False)
+        return trace
+
+    def _on_muted(self, trace, ok):
+        with self._lock:
+            if trace is not self._current or STAGE_RING in trace.stages:
+                return
+            if ok is None:
+                log.warning("⚠️ Mute не подтвержден за %.0f мс, рингтон без ожидания", self.mute_timeout * 1000)
+            else:
+                trace.mark(STAGE_MUTE, self.clock())
+            trace.muted = ok
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            try:
+                self._channel = self.ring()
+            except Exception as e:
+                log.warning("⚠️ Не удалось запустить рингтон: %s", e)
+            trace.mark(STAGE_RING, self.clock())
+            self.traces.append(trace)
+        metrics.observe('time_to_ring', trace.time_to_ring)
+        log.info("⏱ Входящий %s: %s", trace.direction, trace.summary())
+
+    def cancel(self):
+        """Останавливает рингтон и отменяет незавершенный конвейер. True, если рингтон звучал."""
+        with self._lock:
+            if self._current is not None and STAGE_RING not in self._current.stages:
+                self._current.cancelled = True
+            self._current = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            channel, self._channel = self._channel, None
+        if channel is not None:
+            channel.stop()
+        return channel is not None
+
+    def time_to_ring_ms(self):
+        """Время до звука по последним звонкам, мс."""
+        return [trace.time_to_ring * 1000 for trace in self.traces if trace.time_to_ring is not None]
@@ -0,0 +1,122 @@
+# call_routing.py
+"""
+Маршрутизация входящих по направлению: рингтон, цвет в окне, гарнитура и
+приоритет.
+
+Правила задаются списком 'routing' в config.json:
+
+    "routing": [
+        {"direction": "tv_tech", "color": "#4CAF50"},
+        {"direction": "tv_order", "color": "#F44336", "ringtone": "sounds/order.mp3"},
+        {"direction": "tv_pay_*", "color": "#2196F3", "headset": "headset_2", "priority": 5}
+    ]
+
+- direction - направление или шаблон с * и ? (fnmatch, с учетом регистра);
+- ringtone - свой рингтон (без него - общий 'ringtone');
+- color - цвет направления в окне (без него - серый, как у неизвестного);
+- headset - ключ устройства в config.json вместо гарнитуры профиля;
+- priority - меньше = важнее (по умолчанию - место в списке). Из
+  подходящих правил берется самое важное, входящий с менее важным
+  направлением не перебивает рингтон уже звонящего.
+
+В TMemo ищутся 'directions' из config.json (без них - направления по
+умолчанию) и направления правил без шаблонов. Шаблон срабатывает на
+найденное направление: "tv_pay_*" - на tv_pay_tech из списка по
+умолчанию; направление, которого нет ни в списке, ни в правилах, шаблон
+не найдет.
+
+RoutingTable собирается один раз: точные направления - словарь, шаблоны -
+список по приоритету, а найденный маршрут запоминается, поэтому на
+входящем route() - одно обращение к словарю. ringtones() - все рингтоны
+правил, их декодируют заранее (RingtoneCache), и выбор рингтона при
+звонке ничего не стоит.
+"""
+from collections import namedtuple
+from fnmatch import fnmatchcase
+
+from app_log import get_logger
+from call_state import DEFAULT_DIRECTIONS
+
+log = get_logger(__name__)
+
+# Правила по умолчанию: прежние цвета направлений
+DEFAULT_RULES = [
+    {'direction': 'tv_tech', 'color': '#4CAF50'},      # Зеленый
+    {'direction': 'tv_order', 'color': '#F44336'},     # Красный
+    {'direction': 'tv_pay_tech', 'color': '#2196F3'},  # Синий
+]
+
+LOWEST_PRIORITY = 1000000  # Направление без правила
+
+# Маршрут входящего: направление, правило (шаблон или None) и что из него взято
+Route = namedtuple('Route', ['direction', 'pattern', 'ringtone', 'color', 'headset', 'priority'])
+
+
+def is_pattern(direction):
+    return any(char in direction for char in '*?[')
+
+
+class RoutingTable:
+    def __init__(self, rules=None):
+        compiled = []
+        for index, rule in enumerate(DEFAULT_RULES if rules is None else rules):
+            direction = rule.get('direction')
+            if not direction:
+                log.warning("⚠️ routing: правило %d без 'direction' пропущено", index + 1)
+                continue
+            priority = rule.get('priority', index)
+            try:
+                priority = int(priority)
+            except (TypeError, ValueError):
+                log.warning("⚠️ routing: у '%s' приоритет %r не число, используется %d", direction, priority, index)
+                priority = index
+            compiled.append((priority, index, Route(direction, direction, rule.get('ringtone') or None,
+                                                    rule.get('color') or None, rule.get('headset') or None,
+                                                    priority)))
+        compiled.sort(key=lambda item: item[:2])
+        self.rules = [route for _, _, route in compiled]
+        self.exact = {}
+        for route in self.rules:
+            if not is_pattern(route.pattern):
+                self.exact.setdefault(route.pattern, route)
+        self.patterns = [route for route in self.rules if is_pattern(route.pattern)]
+        self._routes = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls((config or {}).get('routing'))
+
+    def route(self, direction):
+        """Маршрут направления (None - направление не найдено в TMemo)"""
+        route = self._routes.get(direction)
+        if route is None:
+            route = self._routes[direction] = self._resolve(direction)
+        return route
+
+    def _resolve(self, direction):
+        best = self.exact.get(direction) if direction is not None else None
+        if direction is not None:
+            for rule in self.patterns:
+                if best is not None and rule.priority >= best.priority:
+                    break
+                if fnmatchcase(direction, rule.pattern):
+                    best = rule
+                    break
+        if best is None:
+            return Route(direction, None, None, None, None, LOWEST_PRIORITY)
+        return best._replace(direction=direction)
+
+    def directions(self, base=None):
+        """
+        Что искать в TMemo: base ('directions' из config.json) и за ним
+        направления правил без шаблонов. Без base - сначала направления
+        правил в порядке приоритета, затем DEFAULT_DIRECTIONS.
+        """
+        names = [route.pattern for route in self.rules if not is_pattern(route.pattern)]
+        if base:
+            return list(dict.fromkeys(list(base) + names))
+        return list(dict.fromkeys(names + DEFAULT_DIRECTIONS))
+
+    def ringtones(self):
+        """Рингтоны правил без повторов"""
+        return list(dict.fromkeys(route.ringtone for route in self.rules if route.ringtone))
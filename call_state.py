@@ -0,0 +1,212 @@
+# call_state.py
+"""
+Машина состояний звонка без зависимости от Qt.
+
+TriggerMatcher находит в тексте TMemo все триггеры и направление,
+IncrementalMatch - то же для дописываемого текста (смотрит только хвост),
+CallStateMachine по таблице переходов определяет новое состояние и список
+событий, которые CallMonitor передает слушателям.
+"""
+from collections import namedtuple
+
+from app_log import get_logger
+
+log = get_logger(__name__)
+
+# Триггеры по умолчанию (текст в окне sipphone.exe)
+TRIGGER_INCOMING = "Входящий звонок"
+TRIGGER_OUTGOING = "Исходящий звонок"
+TRIGGER_DURATION = "Длительность"
+TRIGGER_MIC_MUTED = "МИКРОФОН ОТКЛЮЧЕН"
+
+DEFAULT_TRIGGERS = {
+    'incoming': TRIGGER_INCOMING,
+    'outgoing': TRIGGER_OUTGOING,
+    'duration': TRIGGER_DURATION,
+    'mic_muted': TRIGGER_MIC_MUTED,
+}
+
+# Направления звонков по умолчанию (порядок = приоритет)
+DEFAULT_DIRECTIONS = ["tv_tech", "tv_order", "tv_pay_tech"]
+
+UNKNOWN_DIRECTION = "Неизвестно"
+
+# Состояния
+IDLE = 'idle'
+INCOMING = 'incoming'
+OUTGOING = 'outgoing'
+ACTIVE = 'active'
+
+# Результат поиска по тексту: найденные виды триггеров и направление
+MatchResult = namedtuple('MatchResult', ['triggers', 'direction'])
+
+
+class TriggerMatcher:
+    """
+    Подготовленный набор триггеров и направлений.
+    triggers: dict вид -> текст, directions: список направлений по приоритету.
+
+    Поиск идет отдельным поиском подстроки на шаблон: на CPython это быстрее
+    одного регулярного выражения-альтернации по всему тексту
+    (см. python benchmarks.py trigger_match).
+    """
+
+    def __init__(self, triggers=None, directions=None):
+        self.triggers = dict(triggers or DEFAULT_TRIGGERS)
+        self.directions = list(DEFAULT_DIRECTIONS if directions is None else directions)
+        self._trigger_items = tuple(self.triggers.items())
+        self._trigger_texts = tuple(dict.fromkeys(self.triggers.values()))
+
+    @classmethod
+    def from_config(cls, config):
+        """Берет 'triggers' и 'directions' из config.json, недостающее - по умолчанию."""
+        triggers = dict(DEFAULT_TRIGGERS)
+        triggers.update(config.get('triggers') or {})
+        directions = config.get('directions') or DEFAULT_DIRECTIONS
+        return cls(triggers, directions)
+
+    def has_trigger(self, text):
+        for trigger in self._trigger_texts:
+            if trigger in text:
+                return True
+        return False
+
+    def match(self, text):
+        """Все найденные триггеры и направление с наивысшим приоритетом."""
+        found = frozenset(kind for kind, trigger in self._trigger_items if trigger in text)
+        direction = None
+        if found:
+            for name in self.directions:
+                if name in text:
+                    direction = name
+                    break
+        return MatchResult(found, direction)
+
+
+class IncrementalMatch:
+    """
+    Поиск триггеров в дописываемом тексте. feed(text, appended_from)
+    просматривает только дописанное (с перекрытием на длину шаблона, чтобы
+    не потерять триггер на стыке), если прошлый текст длиной appended_from
+    остался началом нового; результат тот же, что у matcher.match(text).
+    """
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        patterns = [text for text in matcher.triggers.values()] + list(matcher.directions)
+        self.overlap = max((len(text) for text in patterns), default=1) - 1
+        self.reset()
+
+    def reset(self):
+        self.length = 0
+        self.tail = ""
+        self.found = frozenset()
+        self.direction_ranks = frozenset()  # Индексы найденных направлений в matcher.directions
+        self.result = MatchResult(frozenset(), None)
+
+    def feed(self, text, appended_from=None):
+        if appended_from is None or appended_from != self.length:
+            self.reset()
+            chunk = text
+        else:
+            chunk = self.tail + text[appended_from:]
+        matcher = self.matcher
+        found = self.found | frozenset(kind for kind, trigger in matcher._trigger_items if trigger in chunk)
+        ranks = self.direction_ranks | frozenset(
+            i for i, name in enumerate(matcher.directions) if name in chunk)
+        self.found = found
+        self.direction_ranks = ranks
+        self.length = len(text)
+        self.tail = text[-self.overlap:] if self.overlap else ""
+        direction = matcher.directions[min(ranks)] if found and ranks else None
+        self.result = MatchResult(found, direction)
+        return self.result
+
+
+def classify(triggers):
+    """Сводит найденные триггеры к одному наблюдению (состоянию в окне)."""
+    if 'duration' in triggers or 'mic_muted' in triggers:
+        return ACTIVE
+    if 'incoming' in triggers:
+        return INCOMING
+    if 'outgoing' in triggers:
+        return OUTGOING
+    return IDLE
+
+
+# Переход: новое состояние, события, что делать с направлением, сообщение в лог
+# (шаблон logging; %s - направление)
+Transition = namedtuple('Transition', ['target', 'events', 'direction', 'message'])
+
+SET, KEEP, CLEAR = 'set', 'keep', 'clear'
+
+# (текущее состояние, наблюдение) -> Transition. Отсутствующая пара - ничего не меняется.
+TRANSITIONS = {
+    (IDLE, INCOMING): Transition(INCOMING, ('incoming_call',), SET, "📞 ВХОДЯЩИЙ ВЫЗОВ: %s"),
+    (IDLE, OUTGOING): Transition(OUTGOING, ('outgoing_call',), SET, "📤 ИСХОДЯЩИЙ ЗВОНОК"),
+    (IDLE, ACTIVE): Transition(ACTIVE, ('call_started',), SET, None),
+
+    (INCOMING, OUTGOING): Transition(OUTGOING, ('outgoing_call',), SET, "📤 ИСХОДЯЩИЙ ЗВОНОК"),
+    (INCOMING, ACTIVE): Transition(ACTIVE, ('call_answered', 'call_started'), KEEP,
+                                   "✅ ЗВОНОК ПРИНЯТ: %s"),
+    (INCOMING, IDLE): Transition(IDLE, ('call_ended',), CLEAR, "❌ ВЫЗОВ ПРОПУЩЕН/ОТМЕНЕН"),
+
+    (OUTGOING, INCOMING): Transition(INCOMING, ('incoming_call',), SET, "📞 ВХОДЯЩИЙ ВЫЗОВ: %s"),
+    (OUTGOING, ACTIVE): Transition(ACTIVE, ('call_started',), KEEP, "✅ ИСХОДЯЩИЙ ЗВОНОК СОЕДИНЕН"),
+    (OUTGOING, IDLE): Transition(IDLE, ('call_ended',), CLEAR, "❌ ИСХОДЯЩИЙ ЗВОНОК ОТМЕНЕН"),
+
+    (ACTIVE, INCOMING): Transition(INCOMING, ('incoming_call',), SET, "📞 ВХОДЯЩИЙ ВЫЗОВ: %s"),
+    (ACTIVE, OUTGOING): Transition(OUTGOING, ('outgoing_call',), SET, "📤 ИСХОДЯЩИЙ ЗВОНОК"),
+    (ACTIVE, IDLE): Transition(IDLE, ('call_ended',), CLEAR, "📴 ЗВОНОК ЗАВЕРШЕН"),
+}
+
+
+class CallStateMachine:
+    """
+    Состояние звонка по тексту TMemo.
+    feed() возвращает список событий (имя, аргументы) для отправки наружу.
+    """
+
+    def __init__(self, matcher=None, transitions=TRANSITIONS):
+        self.matcher = matcher or TriggerMatcher()
+        self.transitions = transitions
+        self.state = IDLE
+        self.direction = None
+
+    def feed(self, memo_text):
+        return self.apply(self.matcher.match(memo_text))
+
+    def apply(self, result):
+        """Применяет готовый результат поиска (MatchResult), например от IncrementalMatch."""
+        return self.observe(classify(result.triggers), result.direction)
+
+    def observe(self, observation, direction=None):
+        """Применяет наблюдение к таблице переходов."""
+        transition = self.transitions.get((self.state, observation))
+        if transition is None:
+            return []
+
+        self.state = transition.target
+        if transition.direction == SET:
+            self.direction = direction
+        elif transition.direction == CLEAR:
+            self.direction = None
+
+        if transition.message:
+            if '%s' in transition.message:
+                log.info(transition.message, self.direction)
+            else:
+                log.info(transition.message)
+
+        events = []
+        for name in transition.events:
+            if name == 'incoming_call':
+                events.append((name, (self.direction or UNKNOWN_DIRECTION,)))
+            else:
+                events.append((name, ()))
+        return events
+
+    def reset(self):
+        """Сброс без событий (например, процесс телефона закрыт)."""
+        self.state = IDLE
+        self.direction = None
@@ -0,0 +1,105 @@
+# config_store.py
+"""
+Общее хранилище config.json для GUI и audio_manager.
+
+Чтения обслуживаются из памяти: файл перечитывается, только если изменились
+его mtime или размер. Запись идет во временный файл рядом с конфигом и
+атомарно заменяет его (os.replace), так что оборванная запись не оставит
+поврежденный config.json.
+"""
+import os
+import copy
+import json
+import tempfile
+import threading
+
+from app_log import get_logger
+
+log = get_logger(__name__)
+
+
+class ConfigStore:
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._lock = threading.RLock()
+        self._config = {}
+        self._signature = None  # (mtime_ns, size) последней загруженной версии
+        self.reloads = 0
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _refresh(self):
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return
+        if signature is None:
+            self._config = {}
+            self._signature = None
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._config = json.load(f)
+            self.reloads += 1
+        except (OSError, json.JSONDecodeError) as e:
+            # Оставляем последнюю удачно прочитанную версию
+            log.warning("⚠️ Не удалось прочитать конфигурацию '%s': %s", self.path, e)
+        self._signature = signature
+
+    def get(self):
+        """Копия текущей конфигурации (dict)."""
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._config)
+
+    def get_value(self, key, default=None):
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._config.get(key, default))
+
+    def update(self, changes):
+        """Обновляет ключи и атомарно сохраняет файл. Возвращает новую конфигурацию."""
+        with self._lock:
+            self._refresh()
+            config = copy.deepcopy(self._config)
+            config.update(changes)
+            self._write(config)
+            self._config = config
+            self._signature = self._stat_signature()
+            return copy.deepcopy(config)
+
+    def _write(self, config):
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.config-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path='config.json'):
+    """Один ConfigStore на файл для всех модулей процесса."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ConfigStore(key)
+        return _stores[key]
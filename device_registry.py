@@ -0,0 +1,112 @@
+# device_registry.py
+"""
+Реестр аудиоустройств, который обновляется уведомлениями Windows.
+
+Устройства перечисляются один раз при запуске, дальше реестр меняется только
+по уведомлениям IMMNotificationClient (добавление, удаление, смена
+состояния, смена имени). Поиск по ID - обычный dict, без обращения к COM.
+Модуль не зависит от COM и Qt: источник уведомлений подключает audio_manager.
+"""
+import threading
+from collections import namedtuple
+
+from app_log import get_logger
+
+log = get_logger(__name__)
+
+# Состояния устройства (DEVICE_STATE_*)
+STATE_ACTIVE = 1
+STATE_DISABLED = 2
+STATE_NOTPRESENT = 4
+STATE_UNPLUGGED = 8
+
+FLOW_RENDER = 'eRender'
+FLOW_CAPTURE = 'eCapture'
+
+# Изменения, о которых сообщают слушателям
+ADDED = 'added'
+REMOVED = 'removed'
+STATE_CHANGED = 'state_changed'
+RENAMED = 'renamed'
+
+DeviceInfo = namedtuple('DeviceInfo', ['id', 'name', 'flow', 'state'])
+
+
+class DeviceRegistry:
+    """
+    Индекс ID -> DeviceInfo. Методы apply_* вызываются из потоков COM,
+    слушатели listener(change, device_id) вызываются в том же потоке.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._listeners = []
+        self.loaded = False
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, change, device_id):
+        for listener in list(self._listeners):
+            try:
+                listener(change, device_id)
+            except Exception as e:
+                log.warning("⚠️ Ошибка обработчика изменения устройств: %s", e)
+
+    def load(self, devices):
+        """Первичное заполнение результатом полного перечисления."""
+        with self._lock:
+            self._devices = {info.id: info for info in devices}
+            self.loaded = True
+
+    def get(self, device_id):
+        return self._devices.get(device_id)
+
+    def is_available(self, device_id):
+        """Устройство есть в системе и активно."""
+        info = self._devices.get(device_id)
+        return info is not None and info.state == STATE_ACTIVE
+
+    def render_devices(self):
+        """Активные устройства воспроизведения: список (имя, id)."""
+        with self._lock:
+            return [(info.name, info.id) for info in self._devices.values()
+                    if info.flow == FLOW_RENDER and info.state == STATE_ACTIVE]
+
+    def apply_device(self, info):
+        """Добавляет или обновляет устройство (после запроса его свойств)."""
+        with self._lock:
+            old = self._devices.get(info.id)
+            self._devices[info.id] = info
+        if old is None:
+            self._notify(ADDED, info.id)
+        elif old.state != info.state:
+            self._notify(STATE_CHANGED, info.id)
+        elif old.name != info.name:
+            self._notify(RENAMED, info.id)
+
+    def apply_removed(self, device_id):
+        with self._lock:
+            removed = self._devices.pop(device_id, None)
+        if removed is not None:
+            self._notify(REMOVED, device_id)
+
+    def apply_state(self, device_id, state):
+        """
+        Меняет состояние известного устройства. Возвращает False, если устройство
+        неизвестно и его свойства нужно запросить отдельно.
+        """
+        with self._lock:
+            info = self._devices.get(device_id)
+            if info is None:
+                return False
+            if info.state == state:
+                return True
+            self._devices[device_id] = info._replace(state=state)
+        self._notify(STATE_CHANGED, device_id)
+        return True
@@ -0,0 +1,147 @@
+# gui_assets.py
+"""
+Готовые картинки и цвета для окна SIP Helper.
+
+Раньше update_status() масштабировал иконку с Qt.SmoothTransformation при
+каждой смене статуса, а секундомер и мигание звали setStyleSheet() раз в
+0.5-1 с: на каждый вызов Qt заново разбирает стиль и переполировывает
+виджет. Здесь все готовится один раз:
+
+- StatusIcons - иконки статуса, масштабированные под devicePixelRatio
+  экрана окна (пересчет только при смене DPI);
+- LabelPalettes - палитры QLabel на каждый цвет (направление, срочность,
+  мигание); apply() меняет палитру, только если цвет другой.
+
+GuiLoadMeter считает процессорное время потока GUI в час отдельно без
+звонка и во время звонка.
+"""
+import time
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPixmap, QPalette, QColor
+
+from app_log import get_logger
+
+log = get_logger(__name__)
+
+ICON_SIZE = 64  # Логические пиксели
+
+# Цвета надписей (None - цвет темы по умолчанию)
+COLOR_DEFAULT = None
+COLOR_OK = '#4CAF50'       # Зеленый: ответили вовремя
+COLOR_LATE = '#F44336'     # Красный: ожидание больше 12 с
+COLOR_OUTGOING = '#FF9800'
+COLOR_UNKNOWN = '#9E9E9E'  # Направление без цвета (цвета направлений - call_routing)
+COLOR_HIDDEN = 'transparent'  # Фаза мигания
+
+GUI_LOAD_INTERVAL = 60.0
+GUI_LOAD_REPORT = 3600.0
+
+
+class StatusIcons:
+    """icon_key -> путь; каждый файл читается один раз, масштаб - под DPI"""
+
+    def __init__(self, paths, size=ICON_SIZE):
+        self.size = size
+        self.sources = {}
+        loaded = {}
+        for key, path in paths.items():
+            if path not in loaded:
+                loaded[path] = QPixmap(path)
+                if loaded[path].isNull():
+                    log.warning("⚠️ Не удалось загрузить иконку: %s", key)
+            self.sources[key] = loaded[path]
+        self.ratio = None
+        self.scaled = {}
+
+    def prepare(self, ratio=1.0):
+        """Масштабирует все иконки под devicePixelRatio (если он изменился)"""
+        if ratio == self.ratio:
+            return
+        self.ratio = ratio
+        pixels = int(round(self.size * ratio))
+        done = {}
+        self.scaled = {}
+        for key, source in self.sources.items():
+            if source.isNull():
+                continue
+            pixmap = done.get(source.cacheKey())
+            if pixmap is None:
+                pixmap = source.scaled(pixels, pixels, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                pixmap.setDevicePixelRatio(ratio)
+                done[source.cacheKey()] = pixmap
+            self.scaled[key] = pixmap
+        log.debug("🖼️ Иконки статуса: %d шт. по %d px (DPR %.2f)", len(self.scaled), pixels, ratio)
+
+    def get(self, key):
+        return self.scaled.get(key)
+
+
+class LabelPalettes:
+    """Палитры QLabel по цвету текста, созданные один раз от палитры виджета"""
+
+    def __init__(self, base):
+        self.base = QPalette(base)
+        self.palettes = {COLOR_DEFAULT: self.base}
+
+    def palette(self, color):
+        palette = self.palettes.get(color)
+        if palette is None:
+            palette = QPalette(self.base)
+            palette.setColor(QPalette.WindowText, QColor(Qt.transparent) if color == COLOR_HIDDEN
+                             else QColor(color))
+            self.palettes[color] = palette
+        return palette
+
+    def apply(self, label, color):
+        """Меняет цвет надписи, только если он другой (цвет хранится в свойстве 'textColor')"""
+        if label.property('textColor') == color:
+            return False
+        label.setProperty('textColor', color)
+        label.setPalette(self.palette(color))
+        return True
+
+
+class GuiLoadMeter:
+    """
+    Процессорное время потока GUI в час без звонка и во время звонка.
+    sample() вызывается из потока GUI по таймеру и при смене режима
+    (sample(in_call)); время с прошлого замера относится к прежнему режиму.
+    """
+
+    def __init__(self, clock=time.monotonic, cpu_clock=time.thread_time, report_interval=GUI_LOAD_REPORT):
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self.report_interval = report_interval
+        self.totals = {'idle': [0.0, 0.0], 'call': [0.0, 0.0]}  # режим -> [сек CPU, сек]
+        self.in_call = False
+        self.last = None
+        self.last_report = None
+
+    def sample(self, in_call=None):
+        now, cpu = self.clock(), self.cpu_clock()
+        if self.last is not None:
+            total = self.totals['call' if self.in_call else 'idle']
+            total[0] += cpu - self.last[1]
+            total[1] += now - self.last[0]
+        else:
+            self.last_report = now
+        self.last = (now, cpu)
+        if in_call is not None:
+            self.in_call = in_call
+        if now - self.last_report >= self.report_interval:
+            self.last_report = now
+            self.log_stats()
+
+    def stats(self):
+        """режим -> {'cpu_seconds', 'hours', 'cpu_per_hour'}"""
+        return {mode: {'cpu_seconds': cpu, 'hours': seconds / 3600,
+                       'cpu_per_hour': cpu / (seconds / 3600) if seconds else 0.0}
+                for mode, (cpu, seconds) in self.totals.items()}
+
+    def log_stats(self):
+        stats = self.stats()
+        log.info("📊 Поток GUI: без звонка %.2f с CPU/ч (%.1f ч), в звонке %.2f с CPU/ч (%.1f ч)",
+                 stats['idle']['cpu_per_hour'], stats['idle']['hours'],
+                 stats['call']['cpu_per_hour'], stats['call']['hours'])
+        return stats
@@ -1,42 +1,102 @@
 # main_gui.py
+from startup_timing import startup  # Первым: отсюда отсчитывается время запуска
 import sys
-import json
 import os
+import time
+import threading
 import traceback
 import warnings
 from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QLabel, QComboBox, QPushButton, QGroupBox, QMessageBox, QFileDialog, QCheckBox,
                              QSystemTrayIcon, QMenu, QAction)
-from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QPixmap, QFont, QIcon
-import pygame
-from pycaw.pycaw import AudioUtilities, ISimpleAudioVolume
+from PyQt5.QtCore import Qt, QTimer, QObject, pyqtSignal
+from PyQt5.QtGui import QFont, QIcon
 
 # Подавляем предупреждение о разрядности
 warnings.filterwarnings('ignore', message='.*32-bit application should be automated.*')
 
-# Импортируем наши модули
-import audio_manager
+# Импортируем наши модули. Тяжелые (audio_manager с comtypes/pycaw, pygame,
+# pywinauto) загружаются при первом использовании, уже после показа окна
+import config_store
+import app_log
+import metrics
 from window_monitor import MonitorThread
+from call_audio import CallAudioController
+from ringtone_cache import RingtoneCache
+from playback import PlaybackEngine
+from call_history import CallHistoryStore, DB_FILE
+from monitor_profiles import load_profiles
+from poll_scheduler import PollScheduler
+from trace_replay import TraceRecorder
+from call_routing import RoutingTable
+from gui_assets import (StatusIcons, LabelPalettes, GuiLoadMeter, COLOR_DEFAULT, COLOR_OK, COLOR_LATE,
+                        COLOR_OUTGOING, COLOR_UNKNOWN, COLOR_HIDDEN, GUI_LOAD_INTERVAL)
 
 CONFIG_FILE = 'config.json'
+log = app_log.get_logger('main_gui')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Вид изменения DeviceEvents: реестр устройств загружен в фоне
+DEVICES_LOADED = 'loaded'
+
+startup.mark('imports')
+
 def get_resource_path(relative_path):
     """Создает полный, надежный путь к файлу ресурса."""
     return os.path.join(BASE_DIR, relative_path)
 
+class DeviceEvents(QObject):
+    """Переносит уведомления реестра устройств из потоков COM в поток GUI"""
+    changed = pyqtSignal(str, str)  # (вид изменения, ID устройства)
+
+class AudioSwitcher(QObject):
+    """
+    Переносит результат переключения из потока AudioWorker в поток GUI
+    сигналом switch_finished(SwitchRequest).
+    """
+    switch_finished = pyqtSignal(object)
+
+class RingtoneLoader(QObject):
+    """
+    Загружает рингтоны через RingtoneCache в фоновом потоке.
+    О готовности сообщает сигналом ready(путь, звук или None, ошибка или None).
+    """
+    ready = pyqtSignal(str, object, object)
+
+    def __init__(self):
+        super().__init__()
+        self.cache = RingtoneCache()
+
+    def load(self, path):
+        return self.cache.request(path, self.ready.emit)
+
 class SipManagerApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("SIP Helper")
         self.setGeometry(200, 200, 450, 600)
 
-        # Инициализация pygame для звуковых уведомлений
-        pygame.mixer.init()
-        self.alert_sound = self.load_sound(get_resource_path('sounds/alert.wav'))
-        self.ringtone = None  # Кастомный рингтон
+        # Общий с audio_manager кэш config.json
+        self.config_store = config_store.get_store(CONFIG_FILE)
+
+        # История звонков: запись в SQLite в фоновом потоке
+        self.call_history = CallHistoryStore(self.config_store.get_value('call_history_db', DB_FILE))
+
+        # Профили софтфонов ('profiles' в config.json, по умолчанию один sipphone.exe)
+        self.profiles = load_profiles(self.load_config())
+
+        # Правила направлений ('routing' в config.json): рингтон, цвет, гарнитура, приоритет
+        self.routing = RoutingTable.from_config(self.load_config())
+
+        # Микшер и загрузчик рингтонов создаются в finish_startup(), после показа окна
+        self.playback = None
+        self.alert_sound = None
+        self.ringtone = None  # Путь загруженного рингтона; звук - в RingtoneCache, ссылку на него не держим
+        self.ringtone_path = None  # Путь выбранного рингтона (звук может еще загружаться)
+        self.ringtone_show_errors = False  # Показать ошибку загрузки в окне (выбор пользователем)
+        self.ringtone_loader = None
+        self.route_ringtones = self.routing.ringtones()  # Пути рингтонов направлений (звуки - в RingtoneCache)
         self.ringtone_channel = None  # Канал для воспроизведения рингтона
         self.is_ringtone_testing = False  # Флаг тестирования рингтона
         
@@ -44,26 +104,106 @@ class SipManagerApp(QMainWindow):
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_timer)
         self.elapsed_seconds = 0
+        self.timer_started = time.monotonic()  # Секундомер считает по часам, а не по тикам
         self.answer_time = None  # Время ответа на звонок
         
         # Таймер для мигания
         self.blink_timer = QTimer()
         self.blink_timer.timeout.connect(self.blink_answer_label)
         self.blink_state = False
+
+        # Процессорное время потока GUI в час: без звонка и в звонке
+        self.gui_load = GuiLoadMeter()
+        self.gui_load_timer = QTimer()
+        self.gui_load_timer.timeout.connect(self.gui_load.sample)
         
-        # Процесс sipphone для управления громкостью
-        self.sipphone_session = None
+        # Асинхронное переключение устройств; статус меняется только после подтверждения
+        self.status_version = 0
+        self.audio_switcher = AudioSwitcher()
+        self.audio_switcher.switch_finished.connect(self.on_switch_finished)
+
+        # Звук по событиям звонка (общее с sip_service ядро): mute софтфона,
+        # рингтон сразу после подтверждения, гарнитура/динамики, история
+        self.call_audio = CallAudioController(CONFIG_FILE, ring=self.start_ringtone_loop,
+                                              history=self.call_history,
+                                              on_switch_done=self.audio_switcher.switch_finished.emit,
+                                              default_profile=self.profiles[0], routing=self.routing,
+                                              preswitch=bool(self.load_config().get('headset_preswitch')))
 
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
         self.layout = QVBoxLayout(self.central_widget)
 
-        self.init_ui()
-        self.load_config()
-        self.populate_devices()
-        self.init_tray()
-        
-        self.start_monitoring()
+        # Сначала окно, трей и мониторинг, остальное - после показа окна
+        with startup.phase('init_ui'):
+            self.init_ui()
+            self.apply_settings()
+        with startup.phase('init_tray'):
+            self.init_tray()
+        with startup.phase('start_monitoring'):
+            self.start_monitoring()
+
+        self.startup_pending = {'deferred', 'devices'}
+        QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        """
+        Отложенная инициализация: по одному шагу на итерацию цикла событий,
+        чтобы окно успевало отрисоваться. Устройства перечисляются в фоне.
+        """
+        self.run_deferred([
+            ('metrics', self.start_metrics),
+            ('devices_watch', self.watch_devices),
+            ('playback', self.start_playback),
+            ('session_index', self.prepare_sessions),
+            ('gui_load', self.start_gui_load),
+        ])
+
+    def run_deferred(self, steps):
+        if not steps:
+            self.startup_step_done('deferred')
+            return
+        name, step = steps[0]
+        with startup.phase(name):
+            try:
+                step()
+            except Exception as e:
+                log.error("❌ Ошибка отложенной инициализации (%s): %s: %s", name, type(e).__name__, e)
+        QTimer.singleShot(0, lambda: self.run_deferred(steps[1:]))
+
+    def startup_step_done(self, part):
+        """Когда готовы и отложенные шаги, и устройства - отчет о запуске"""
+        self.startup_pending.discard(part)
+        if not self.startup_pending:
+            startup.mark('ready')
+            startup.report()
+
+    def start_gui_load(self):
+        self.gui_load.sample(False)
+        self.gui_load_timer.start(int(GUI_LOAD_INTERVAL * 1000))
+
+    def start_metrics(self):
+        # Замеры этапов (ключ 'metrics' в config.json), по умолчанию выключены
+        metrics.configure(self.load_config())
+
+    def start_playback(self):
+        # Микшер с малым буфером и отдельными каналами для рингтона и аварийного сигнала
+        self.playback = PlaybackEngine.from_config(self.load_config()).start()
+        self.alert_sound = self.load_sound(get_resource_path('sounds/alert.wav'))
+        self.ringtone_loader = RingtoneLoader()
+        self.ringtone_loader.ready.connect(self.on_ringtone_ready)
+        # Рингтон из конфига (или выбранный, пока микшер не был готов) декодируется в фоне
+        path = self.ringtone_path or self.load_config().get('ringtone')
+        if path:
+            self.load_ringtone(path, self.ringtone_show_errors)
+        # Рингтоны направлений декодируются заранее и живут в RingtoneCache под общим
+        # лимитом памяти: при звонке звук берется из кэша, выгруженный догружается с диска
+        for route_path in self.route_ringtones:
+            self.ringtone_loader.load(route_path)
+
+    def prepare_sessions(self):
+        import audio_manager
+        audio_manager.prepare_session_index()
 
     def init_ui(self):
         # --- Секция статуса ---
@@ -87,7 +227,7 @@ class SipManagerApp(QMainWindow):
         
         # Время ответа
         self.answer_time_label = QLabel("")
-        self.answer_time_label.setFont(QFont("Arial", 11))
+        self.answer_time_label.setFont(QFont("Arial", 11, QFont.Bold))
         self.answer_time_label.setAlignment(Qt.AlignCenter)
         status_layout.addWidget(self.answer_time_label)
         
@@ -151,18 +291,16 @@ class SipManagerApp(QMainWindow):
         
         self.layout.addStretch()
 
-        # Загрузка иконок
-        self.icons = {
-            "speakers": QPixmap(get_resource_path('icons/speakers.png')),
-            "headset": QPixmap(get_resource_path('icons/headset.png')),
-            "disconnected": QPixmap(get_resource_path('icons/shutdown.png')),
-            "ringing": QPixmap(get_resource_path('icons/headset.png'))  # Можно создать отдельную иконку
-        }
-        
-        for name, pixmap in self.icons.items():
-            if pixmap.isNull():
-                print(f"⚠️ Не удалось загрузить иконку: {name}")
-        
+        # Иконки статуса: каждый файл читается и масштабируется под DPI экрана один раз
+        self.status_icons = StatusIcons({
+            "speakers": get_resource_path('icons/speakers.png'),
+            "headset": get_resource_path('icons/headset.png'),
+            "disconnected": get_resource_path('icons/shutdown.png'),
+            "ringing": get_resource_path('icons/headset.png')  # Можно создать отдельную иконку
+        })
+        # Цвета надписей - готовые палитры вместо setStyleSheet на каждом тике
+        self.label_palettes = LabelPalettes(self.answer_time_label.palette())
+
         self.update_status("disconnected", "SIP-телефон не найден")
 
     def init_tray(self):
@@ -196,7 +334,7 @@ class SipManagerApp(QMainWindow):
         # Показываем иконку в трее
         self.tray_icon.show()
         
-        print("✅ Системный трей инициализирован")
+        log.info("✅ Системный трей инициализирован")
     
     def on_tray_icon_activated(self, reason):
         """Обработка клика по иконке трея"""
@@ -207,22 +345,22 @@ class SipManagerApp(QMainWindow):
         """Переключение видимости окна"""
         if self.isVisible():
             self.hide()
-            print("🔽 Окно скрыто в трей")
+            log.info("🔽 Окно скрыто в трей")
         else:
             self.show()
             self.setWindowState(self.windowState() & ~Qt.WindowMinimized | Qt.WindowActive)
             self.activateWindow()
             self.raise_()
-            print("🔼 Окно показано из трея")
+            log.info("🔼 Окно показано из трея")
 
     def load_sound(self, path):
         if os.path.exists(path):
             try:
-                return pygame.mixer.Sound(path)
+                return self.playback.pygame.mixer.Sound(path)
             except Exception as e:
-                print(f"⚠️ Ошибка загрузки звука {path}: {e}")
+                log.warning("⚠️ Ошибка загрузки звука %s: %s", path, e)
                 return None
-        print(f"⚠️ Звуковой файл не найден: {path}")
+        log.warning("⚠️ Звуковой файл не найден: %s", path)
         return None
 
     def select_ringtone(self):
@@ -235,20 +373,57 @@ class SipManagerApp(QMainWindow):
         )
         
         if file_path:
-            try:
-                self.ringtone = pygame.mixer.Sound(file_path)
-                self.ringtone_label.setText(f"Рингтон: {os.path.basename(file_path)}")
-                self.test_ringtone_btn.setEnabled(True)
-                
-                # Сохраняем путь в конфиг
-                config = self.load_config()
-                config['ringtone'] = file_path
-                with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(config, f, indent=4, ensure_ascii=False)
-                    
-                print(f"✅ Рингтон установлен: {file_path}")
-            except Exception as e:
-                QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить рингтон:\n{e}")
+            # Декодирование идет в фоне, результат придет в on_ringtone_ready
+            self.load_ringtone(file_path, show_errors=True)
+
+    def load_ringtone(self, path, show_errors=False):
+        """Запускает фоновую загрузку рингтона; до ее завершения звучит прежний"""
+        self.ringtone_path = path
+        self.ringtone_show_errors = show_errors
+        if self.ringtone_loader is None or self.ringtone_loader.load(path) is None:
+            self.ringtone_label.setText(f"Рингтон: {os.path.basename(path)} (загрузка...)")
+
+    def on_ringtone_ready(self, path, sound, error):
+        """Рингтон загружен (или не удалось) в фоновом потоке"""
+        if path in self.route_ringtones:
+            if error is None:
+                log.info("🎵 Рингтон направления готов: %s", os.path.basename(path))
+            elif path != self.ringtone_path:
+                log.warning("⚠️ Не удалось загрузить рингтон направления %s: %s", path, error)
+        if path != self.ringtone_path:
+            return  # Пока грузился, выбрали другой
+        if error is not None:
+            log.warning("⚠️ Не удалось загрузить рингтон: %s", error)
+            self.ringtone_label.setText(f"Рингтон не загружен: {os.path.basename(path)}")
+            if self.ringtone_show_errors:
+                QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить рингтон:\n{error}")
+            return
+
+        self.ringtone = path
+        self.ringtone_label.setText(f"Рингтон: {os.path.basename(path)}")
+        self.test_ringtone_btn.setEnabled(True)
+        if self.load_config().get('ringtone') != path:
+            # Сохраняем путь в конфиг
+            self.config_store.update({'ringtone': path})
+            log.info("✅ Рингтон установлен: %s", path)
+        stats = self.ringtone_loader.cache.stats()
+        log.info("🎵 Кэш рингтонов: %.1f из %.0f МБ, декодирований %d, с диска %d",
+                 stats['used_bytes'] / 1048576, stats['budget_bytes'] / 1048576,
+                 stats['decodes'], stats['disk_hits'])
+
+    def ringtone_sound(self):
+        """
+        Звук общего рингтона на одно воспроизведение. Берется из RingtoneCache
+        каждый раз: ссылка в окне не дала бы кэшу освободить выгруженный по
+        лимиту звук. Выгруженный читается из PCM на диске.
+        """
+        if not self.ringtone or self.ringtone_loader is None:
+            return None
+        try:
+            return self.ringtone_loader.cache.load(self.ringtone)
+        except Exception as e:
+            log.warning("⚠️ Не удалось загрузить рингтон %s: %s", self.ringtone, e)
+            return None
 
     def test_ringtone(self):
         """Тестирование рингтона (toggle)"""
@@ -258,19 +433,22 @@ class SipManagerApp(QMainWindow):
                 self.stop_ringtone()
                 self.is_ringtone_testing = False
                 self.test_ringtone_btn.setText("Тест")
-                print("🔕 Тестирование рингтона остановлено")
+                log.info("🔕 Тестирование рингтона остановлено")
             else:
                 # Запускаем воспроизведение (один раз, без loop)
                 self.stop_ringtone()
-                self.ringtone_channel = self.ringtone.play()
+                sound = self.ringtone_sound()
+                if sound is None:
+                    return
+                self.ringtone_channel = self.playback.play_ringtone(sound, loops=0)
                 self.is_ringtone_testing = True
                 self.test_ringtone_btn.setText("Стоп")
-                print("🔔 Тестирование рингтона запущено")
+                log.info("🔔 Тестирование рингтона запущено")
                 
                 # Устанавливаем таймер для автоматического возврата кнопки
                 # после окончания воспроизведения
                 if self.ringtone_channel:
-                    duration = int(self.ringtone.get_length() * 1000)  # в миллисекундах
+                    duration = int(sound.get_length() * 1000)  # в миллисекундах
                     QTimer.singleShot(duration, self.on_test_ringtone_finished)
     
     def on_test_ringtone_finished(self):
@@ -278,58 +456,47 @@ class SipManagerApp(QMainWindow):
         if self.is_ringtone_testing:
             self.is_ringtone_testing = False
             self.test_ringtone_btn.setText("Тест")
-            print("✅ Тестирование рингтона завершено")
-
-    def play_ringtone(self):
-        """Воспроизведение рингтона в цикле"""
-        if self.ringtone:
-            self.stop_ringtone()
-            self.ringtone_channel = self.ringtone.play(loops=-1)  # Бесконечный цикл
-            print("🔔 Воспроизведение кастомного рингтона")
+            log.info("✅ Тестирование рингтона завершено")
+
+    def start_ringtone_loop(self, route=None):
+        """
+        Запуск рингтона в цикле. Вызывается конвейером входящего звонка,
+        в том числе из потока AudioWorker, поэтому не трогает виджеты.
+        Рингтон направления из RingtoneCache; если его нет в памяти (еще
+        грузится или выгружен по лимиту) - общий, а направление догружается в фоне.
+        """
+        sound = None
+        if route is not None and route.ringtone and self.ringtone_loader is not None:
+            sound = self.ringtone_loader.cache.request(route.ringtone)
+            if sound is None:
+                log.info("🎵 Рингтон %s не в памяти, звучит общий (загрузка в фоне)",
+                         os.path.basename(route.ringtone))
+        sound = sound or self.ringtone_sound()
+        if sound:
+            channel = self.playback.play_ringtone(sound)  # Бесконечный цикл
+            log.info("🔔 Воспроизведение кастомного рингтона")
+            return channel
+        return None
 
-    def stop_ringtone(self):
-        """Остановка рингтона"""
+    def stop_ringtone(self, event=None):
+        """Остановка рингтона (для события профиля - только если звонит этот профиль)"""
+        stopped = self.call_audio.stop_ringtone(event.profile if event is not None else None)
         if self.ringtone_channel:
             self.ringtone_channel.stop()
             self.ringtone_channel = None
-            print("🔕 Рингтон остановлен")
+            stopped = True
+        if stopped:
+            log.info("🔕 Рингтон остановлен")
         
         # Сбрасываем флаг и кнопку тестирования если рингтон был в режиме теста
         if self.is_ringtone_testing:
             self.is_ringtone_testing = False
             self.test_ringtone_btn.setText("Тест")
 
-    def mute_sipphone(self):
-        """Заглушает звук sipphone.exe"""
-        try:
-            sessions = AudioUtilities.GetAllSessions()
-            for session in sessions:
-                if session.Process and session.Process.name() == "sipphone.exe":
-                    volume = session._ctl.QueryInterface(ISimpleAudioVolume)
-                    current_mute = volume.GetMute()
-                    if not current_mute:  # Только если еще не заглушен
-                        volume.SetMute(1, None)
-                        self.sipphone_session = session
-                        print("🔇 Звук sipphone.exe заглушен")
-                    return True
-        except Exception as e:
-            print(f"⚠️ Не удалось заглушить sipphone: {e}")
-        return False
-
-    def unmute_sipphone(self):
-        """Включает звук sipphone.exe"""
-        try:
-            if self.sipphone_session:
-                volume = self.sipphone_session._ctl.QueryInterface(ISimpleAudioVolume)
-                volume.SetMute(0, None)
-                print("🔊 Звук sipphone.exe включен")
-                self.sipphone_session = None
-        except Exception as e:
-            print(f"⚠️ Не удалось включить звук sipphone: {e}")
-
     def start_timer(self):
         """Запуск секундомера"""
         self.elapsed_seconds = 0
+        self.timer_started = time.monotonic()
         self.answer_time = None
         self.blink_timer.stop()  # Останавливаем мигание если было
         self.timer.start(1000)  # Обновление каждую секунду
@@ -341,51 +508,74 @@ class SipManagerApp(QMainWindow):
 
     def update_timer(self):
         """Обновление отображения секундомера"""
-        self.elapsed_seconds += 1
+        # Тики QTimer под нагрузкой опаздывают, поэтому секунды берутся по часам
+        self.elapsed_seconds = int(time.monotonic() - self.timer_started)
         
-        # Определяем цвет и нужно ли мигание
+        # Определяем цвет и нужно ли мигание (палитра меняется только при смене цвета)
+        self.answer_time_label.setText(f"Время ожидания: {self.elapsed_seconds} сек")
         if self.elapsed_seconds <= 12:
-            color = "#4CAF50"  # Зеленый
             self.blink_timer.stop()
-            self.answer_time_label.setText(f"Время ожидания: {self.elapsed_seconds} сек")
-            self.answer_time_label.setStyleSheet(f"color: {color}; font-weight: bold;")
+            self.label_palettes.apply(self.answer_time_label, COLOR_OK)
         elif self.elapsed_seconds <= 15:
-            color = "#F44336"  # Красный
             # Запускаем мигание если еще не запущено
             if not self.blink_timer.isActive():
                 self.blink_timer.start(500)  # Мигание каждые 500мс
-            self.answer_time_label.setText(f"Время ожидания: {self.elapsed_seconds} сек")
         else:
             # После 15 секунд продолжаем красным без мигания
-            color = "#F44336"
             self.blink_timer.stop()
-            self.answer_time_label.setText(f"Время ожидания: {self.elapsed_seconds} сек")
-            self.answer_time_label.setStyleSheet(f"color: {color}; font-weight: bold;")
+            self.label_palettes.apply(self.answer_time_label, COLOR_LATE)
     
     def blink_answer_label(self):
-        """Мигание надписи времени ответа"""
+        """Мигание надписи времени ответа: красный / прозрачный"""
         self.blink_state = not self.blink_state
-        if self.blink_state:
-            self.answer_time_label.setStyleSheet("color: #F44336; font-weight: bold;")  # Красный
-        else:
-            self.answer_time_label.setStyleSheet("color: transparent; font-weight: bold;")  # Прозрачный
-        self.answer_time_label.setText(f"Время ожидания: {self.elapsed_seconds} сек")
+        self.label_palettes.apply(self.answer_time_label, COLOR_LATE if self.blink_state else COLOR_HIDDEN)
 
     def play_alert(self):
         if self.alert_sound:
-            self.alert_sound.play()
+            self.playback.play_alert(self.alert_sound)
 
     def update_status(self, icon_key, text):
         """Обновляет статус с иконкой и текстом"""
-        if icon_key in self.icons and not self.icons[icon_key].isNull():
-            scaled_pixmap = self.icons[icon_key].scaled(64, 64, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.status_icon_label.setPixmap(scaled_pixmap)
+        # Пересчет иконок - только если окно попало на экран с другим DPI
+        self.status_icons.prepare(self.devicePixelRatioF())
+        pixmap = self.status_icons.get(icon_key)
+        if pixmap is not None:
+            self.status_icon_label.setPixmap(pixmap)
         else:
-            print(f"⚠️ Иконка '{icon_key}' недоступна")
+            log.warning("⚠️ Иконка '%s' недоступна", icon_key)
         self.status_text_label.setText(text)
-        print(f"[STATUS] {icon_key}: {text}")
+        self.status_version += 1
+        log.debug("[STATUS] %s: %s", icon_key, text)
+
+    def pending_status(self, icon_key, text):
+        """Контекст переключения: статус (icon_key, text) применится после подтверждения"""
+        return (self.status_version, icon_key, text)
+
+    def on_switch_finished(self, request):
+        """Результат переключения из потока AudioWorker"""
+        latency_ms = (request.latency or 0) * 1000
+        confirmed_ms = (time.perf_counter() - request.requested_at) * 1000
+        if request.result:
+            metrics.observe(f"audio_switch_{request.device_type}", request.latency or 0)
+        log.info("⏱ Переключение '%s': %.1f мс, подтверждено в GUI через %.1f мс "
+                 "(результат: %s, заменен: %s)", request.device_type, latency_ms,
+                 confirmed_ms, request.result, request.superseded)
+        if not request.result or request.superseded or request.context is None:
+            return
+        version, icon_key, text = request.context
+        # Если статус уже сменился (например, пришел новый звонок), старый не возвращаем
+        if version == self.status_version:
+            self.update_status(icon_key, text)
+
+    def fill_device_combos(self):
+        """Заполняет списки устройств из реестра. Сохраненное в конфиге устройство
+        выбирается, если оно доступно, иначе сохраняется текущий выбор."""
+        config = self.load_config()
+        candidates = {}
+        for key, combo in (('headset', self.headset_combo), ('speakers', self.speakers_combo)):
+            candidates[combo] = [(config.get(key) or {}).get('id'), combo.currentData()]
 
-    def populate_devices(self):
+        import audio_manager
         self.devices = audio_manager.get_all_audio_devices()
         
         self.headset_combo.clear()
@@ -399,23 +589,76 @@ class SipManagerApp(QMainWindow):
         for name, dev_id in self.devices:
             self.headset_combo.addItem(name, dev_id)
             self.speakers_combo.addItem(name, dev_id)
-        
-        config = self.load_config()
-        if 'headset' in config and config['headset']['id']:
-            idx = self.headset_combo.findData(config['headset']['id'])
-            if idx != -1: self.headset_combo.setCurrentIndex(idx)
-        if 'speakers' in config and config['speakers']['id']:
-            idx = self.speakers_combo.findData(config['speakers']['id'])
-            if idx != -1: self.speakers_combo.setCurrentIndex(idx)
-        
-        # Загружаем рингтон из конфига
-        if 'ringtone' in config and config['ringtone']:
+
+        for combo, device_ids in candidates.items():
+            for dev_id in device_ids:
+                idx = combo.findData(dev_id) if dev_id else -1
+                if idx != -1:
+                    combo.setCurrentIndex(idx)
+                    break
+
+    def watch_devices(self):
+        """
+        Подписка на изменения устройств: списки обновляются без пересканирования.
+        Реестр загружается в фоне, о готовности сообщает DEVICES_LOADED.
+        """
+        import audio_manager
+        self.device_events = DeviceEvents()
+        self.device_events.changed.connect(self.on_devices_changed)
+        self.headset_available = None
+
+        def load():
             try:
-                self.ringtone = pygame.mixer.Sound(config['ringtone'])
-                self.ringtone_label.setText(f"Рингтон: {os.path.basename(config['ringtone'])}")
-                self.test_ringtone_btn.setEnabled(True)
+                with startup.phase('devices_load', background=True):
+                    registry = audio_manager.get_device_registry()
+                registry.add_listener(lambda change, device_id: self.device_events.changed.emit(change, device_id))
             except Exception as e:
-                print(f"⚠️ Не удалось загрузить сохраненный рингтон: {e}")
+                log.warning("⚠️ Не удалось подписаться на изменения аудиоустройств: %s", e)
+            self.device_events.changed.emit(DEVICES_LOADED, '')
+
+        threading.Thread(target=load, name="DeviceRegistryLoader", daemon=True).start()
+
+    def refresh_headset_available(self):
+        """Запоминает, доступна ли сохраненная гарнитура (для уведомлений об отключении)"""
+        import audio_manager
+        headset_id = (self.load_config().get('headset') or {}).get('id')
+        if not headset_id:
+            return
+        try:
+            self.headset_available = audio_manager.get_device_registry().is_available(headset_id)
+        except Exception as e:
+            log.warning("⚠️ Не удалось проверить гарнитуру: %s", e)
+
+    def on_devices_changed(self, change, device_id):
+        """Устройство добавлено/удалено/изменило состояние (или реестр загружен)"""
+        import audio_manager
+        if change == DEVICES_LOADED:
+            self.fill_device_combos()
+            self.refresh_headset_available()
+            startup.mark('devices_loaded')
+            self.startup_step_done('devices')
+            return
+        log.info("GUI: Изменение устройства (%s): %s", change, device_id)
+        self.fill_device_combos()
+
+        headset = self.load_config().get('headset') or {}
+        if device_id != headset.get('id'):
+            return
+        available = audio_manager.get_device_registry().is_available(device_id)
+        if available == self.headset_available:
+            return
+        self.headset_available = available
+        name = headset.get('name', 'Гарнитура')
+        if available:
+            message = f"Гарнитура снова подключена: {name}"
+        else:
+            message = f"Гарнитура отключена: {name}"
+        log.warning("🎧 %s", message)
+        self.tray_icon.showMessage("SIP Helper", message, QSystemTrayIcon.Warning, 3000)
+
+    def apply_settings(self):
+        """Флажки из конфига; устройства и рингтон загружаются после показа окна"""
+        config = self.load_config()
         
         # Загружаем настройку аварийного сигнала
         if 'alert_on_close' in config:
@@ -430,15 +673,11 @@ class SipManagerApp(QMainWindow):
             self.auto_show_checkbox.setChecked(True)  # По умолчанию включено
 
     def load_config(self):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        return self.config_store.get()
 
     def save_config(self):
-        config = self.load_config()  # Сохраняем существующие настройки (например, ringtone)
-        config.update({
+        # Остальные настройки (например, ringtone) сохраняются хранилищем
+        self.config_store.update({
             "headset": {
                 "name": self.headset_combo.currentText(),
                 "id": self.headset_combo.currentData()
@@ -450,56 +689,48 @@ class SipManagerApp(QMainWindow):
             "alert_on_close": self.alert_checkbox.isChecked(),
             "auto_show_window": self.auto_show_checkbox.isChecked()
         })
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+        self.refresh_headset_available()
         
         QMessageBox.information(self, "Сохранено", "Настройки сохранены.")
         self.on_call_ended()
 
     def start_monitoring(self):
-        self.monitor_thread = MonitorThread()
-        self.monitor_thread.call_started.connect(self.on_call_started)
-        self.monitor_thread.call_ended.connect(self.on_call_ended)
-        self.monitor_thread.process_stopped.connect(self.on_process_stopped)
-        self.monitor_thread.process_running.connect(self.on_process_running)
-        self.monitor_thread.incoming_call.connect(self.on_incoming_call)
-        self.monitor_thread.outgoing_call.connect(self.on_outgoing_call)
-        self.monitor_thread.call_answered.connect(self.on_call_answered)
+        # Процессы, окна, триггеры и направления - из профилей config.json, интервалы - из 'polling',
+        # запись трассы для trace_replay - 'monitor_trace'
+        config = self.load_config()
+        self.monitor_thread = MonitorThread(profiles=self.profiles,
+                                            scheduler=PollScheduler.from_config(config),
+                                            trace=TraceRecorder.from_config(config))
+        self.monitor_thread.monitor_event.connect(self.on_monitor_event)
         self.monitor_thread.start()
 
-    def on_incoming_call(self, direction):
+    def on_monitor_event(self, event):
+        """Событие монитора в потоке GUI: вызывает on_<имя события>(event)"""
+        getattr(self, 'on_' + event.name)(event)
+
+    def profile_label(self, event):
+        """' [имя профиля]' для текста статуса, если телефонов несколько"""
+        if event is None or event.profile is None or len(self.profiles) < 2:
+            return ""
+        return f" [{event.profile.name}]"
+
+    def on_incoming_call(self, event):
         """Обработка входящего звонка"""
-        print(f"GUI: Входящий звонок - {direction}")
-        
-        # КРИТИЧНО: Сначала глушим sipphone
-        self.mute_sipphone()
-        
-        # Небольшая задержка для гарантии применения mute
-        import time
-        time.sleep(0.05)
+        direction = event.args[0]
+        log.info("GUI: Входящий звонок - %s%s", direction, self.profile_label(event))
+        self.gui_load.sample(True)
         
-        # Затем включаем кастомный рингтон
-        self.play_ringtone()
+        # Сначала глушим софтфон, рингтон включится сразу после подтверждения mute
+        # (рингтон другого профиля останавливает контроллер, если этот звонок важнее)
+        self.stop_ringtone(event)
+        route = self.call_audio.on_incoming_call(event)
         
         # Обновляем GUI с цветовой индикацией направления
-        self.update_status("ringing", "Входящий звонок...")
-        
-        # Устанавливаем цвет в зависимости от направления
-        if direction == "tv_tech":
-            color = "#4CAF50"  # Зеленый
-            direction_text = "tv_tech"
-        elif direction == "tv_order":
-            color = "#F44336"  # Красный
-            direction_text = "tv_order"
-        elif direction == "tv_pay_tech":
-            color = "#2196F3"  # Синий (можно изменить при необходимости)
-            direction_text = "tv_pay_tech"
-        else:
-            color = "#9E9E9E"  # Серый для неизвестного
-            direction_text = direction if direction else "Неизвестно"
+        self.update_status("ringing", "Входящий звонок..." + self.profile_label(event))
         
-        self.direction_label.setText(f"Направление: {direction_text}")
-        self.direction_label.setStyleSheet(f"color: {color}; font-weight: bold;")
+        # Цвет из правила направления (серый для неизвестного)
+        self.direction_label.setText(f"Направление: {direction or 'Неизвестно'}")
+        self.label_palettes.apply(self.direction_label, route.color or COLOR_UNKNOWN)
         
         # Запускаем секундомер
         self.start_timer()
@@ -512,76 +743,72 @@ class SipManagerApp(QMainWindow):
             self.activateWindow()
             self.raise_()
 
-    def on_outgoing_call(self):
+    def on_outgoing_call(self, event=None):
         """Обработка исходящего звонка"""
-        print("GUI: Исходящий звонок")
-        
-        # При исходящем звонке НЕ воспроизводим рингтон
-        # Сразу переключаем на гарнитуру
-        if audio_manager.set_device_from_config('headset'):
-            self.update_status("headset", "Исходящий звонок\n(Гарнитура)")
+        log.info("GUI: Исходящий звонок%s", self.profile_label(event))
+        self.gui_load.sample(True)
+        # При исходящем звонке НЕ воспроизводим рингтон, сразу переключаем на гарнитуру
+        self.call_audio.on_outgoing_call(event, self.pending_status(
+            "headset", "Исходящий звонок" + self.profile_label(event) + "\n(Гарнитура)"))
         
         self.direction_label.setText("Направление: Исходящий")
-        self.direction_label.setStyleSheet("color: #FF9800; font-weight: bold;")  # Оранжевый
+        self.label_palettes.apply(self.direction_label, COLOR_OUTGOING)
 
-    def on_call_answered(self):
+    def on_call_answered(self, event=None):
         """Обработка момента ответа на звонок"""
-        print("GUI: Звонок принят")
+        log.info("GUI: Звонок принят%s", self.profile_label(event))
         
         # Останавливаем рингтон
-        self.stop_ringtone()
-        self.unmute_sipphone()
+        self.stop_ringtone(event)
         
-        # Фиксируем время ответа в секундах
+        # Фиксируем время ответа в секундах (по часам, с момента входящего)
         self.stop_timer()
+        wait_seconds = self.call_audio.on_call_answered(event)
+        if wait_seconds is not None:
+            self.elapsed_seconds = int(wait_seconds)
         
-        # Определяем цвет в зависимости от времени ответа
-        if self.elapsed_seconds <= 12:
-            color = "#4CAF50"  # Зеленый
-        else:
-            color = "#F44336"  # Красный (12-15 и больше)
-        
+        # Цвет в зависимости от времени ответа: зеленый до 12 с, дальше красный
         self.answer_time_label.setText(f"Время ответа: {self.elapsed_seconds} сек")
-        self.answer_time_label.setStyleSheet(f"color: {color}; font-weight: bold;")
+        self.label_palettes.apply(self.answer_time_label, COLOR_OK if self.elapsed_seconds <= 12 else COLOR_LATE)
 
-    def on_call_started(self):
+    def on_call_started(self, event=None):
         """Активный разговор"""
-        print("GUI: Получен сигнал 'call_started'")
-        if audio_manager.set_device_from_config('headset'):
-            self.update_status("headset", "Активен звонок\n(Гарнитура)")
+        log.info("GUI: Получен сигнал 'call_started'%s", self.profile_label(event))
+        self.call_audio.on_call_started(event, self.pending_status(
+            "headset", "Активен звонок" + self.profile_label(event) + "\n(Гарнитура)"))
 
-    def on_call_ended(self):
+    def on_call_ended(self, event=None):
         """Звонок завершен"""
-        print("GUI: Получен сигнал 'call_ended'")
-        
+        log.info("GUI: Получен сигнал 'call_ended'%s", self.profile_label(event))
         # Останавливаем рингтон и таймер
-        self.stop_ringtone()
-        self.unmute_sipphone()
+        self.stop_ringtone(event)
         self.stop_timer()
         
         # Сбрасываем отображение
         self.direction_label.setText("Направление: —")
-        self.direction_label.setStyleSheet("")
+        self.label_palettes.apply(self.direction_label, COLOR_DEFAULT)
         self.answer_time_label.setText("")
-        self.answer_time_label.setStyleSheet("")
+        self.label_palettes.apply(self.answer_time_label, COLOR_DEFAULT)
         
-        if audio_manager.set_device_from_config('speakers'):
-            self.update_status("speakers", "Ожидание звонка\n(Динамики)")
+        self.call_audio.on_call_ended(event, self.pending_status("speakers", "Ожидание звонка\n(Динамики)"))
+        self.gui_load.sample(bool(self.call_audio.in_call))
 
-    def on_process_stopped(self):
-        print("GUI: Получен сигнал 'process_stopped'")
-        self.stop_ringtone()
+    def on_process_stopped(self, event=None):
+        log.info("GUI: Получен сигнал 'process_stopped'%s", self.profile_label(event))
+        self.stop_ringtone(event)
+        self.call_audio.on_process_stopped(event)
+        self.gui_load.sample(bool(self.call_audio.in_call))
         self.stop_timer()
-        self.update_status("disconnected", "SIP-телефон не найден")
+        self.update_status("disconnected", "SIP-телефон не найден" + self.profile_label(event))
         self.direction_label.setText("Направление: —")
         
         # Воспроизводим аварийный сигнал только если настройка включена
         if self.alert_checkbox.isChecked():
             self.play_alert()
 
-    def on_process_running(self):
-        print("GUI: Получен сигнал 'process_running'")
-        self.on_call_ended()
+    def on_process_running(self, event=None):
+        log.info("GUI: Получен сигнал 'process_running'%s", self.profile_label(event))
+        self.on_call_ended(event)
 
     def closeEvent(self, event):
         """При закрытии окна (X) сворачиваем в трей вместо выхода"""
@@ -593,18 +820,26 @@ class SipManagerApp(QMainWindow):
             QSystemTrayIcon.Information,
             2000
         )
-        print("🔽 Окно свернуто в трей")
+        log.info("🔽 Окно свернуто в трей")
     
     def quit_application(self):
         """Полный выход из приложения"""
-        print("👋 Выход из приложения")
+        log.info("👋 Выход из приложения")
         self.stop_ringtone()
-        self.unmute_sipphone()
         self.timer.stop()
         self.blink_timer.stop()
+        self.gui_load_timer.stop()
+        self.gui_load.sample()
+        self.gui_load.log_stats()
         self.monitor_thread.stop()
         self.monitor_thread.wait()
-        audio_manager.set_device_from_config('speakers')
+        self.call_audio.shutdown(self.profiles)
+        import audio_manager
+        audio_manager.shutdown()
+        if self.playback is not None:
+            self.playback.stop()
+        self.call_history.close()
+        metrics.shutdown()
         self.tray_icon.hide()
         QApplication.quit()
 
@@ -612,7 +847,7 @@ def log_uncaught_exceptions(ex_cls, ex, tb):
     """Записывает любую необработанную ошибку в файл."""
     text = '{}: {}:\n'.format(ex_cls.__name__, ex)
     text += ''.join(traceback.format_tb(tb))
-    print(text)
+    log.critical(text)
     with open('crash_log.txt', 'a') as f:
         f.write(text)
     sys.exit(1)
@@ -620,7 +855,13 @@ def log_uncaught_exceptions(ex_cls, ex, tb):
 sys.excepthook = log_uncaught_exceptions
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    # Уровень журнала: 'log_level' в config.json (DEBUG, INFO, WARNING, ERROR)
+    with startup.phase('logging'):
+        app_log.setup(config_store.get_store(CONFIG_FILE).get_value('log_level', 'INFO'))
+    with startup.phase('qapplication'):
+        app = QApplication(sys.argv)
     window = SipManagerApp()
-    window.show()
+    with startup.phase('show'):
+        window.show()
+    startup.mark('window_shown')
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,289 @@
+# memo_reader.py
+"""
+Инкрементальное чтение TMemo чужого процесса.
+
+window_text() (WM_GETTEXT) на каждом тике копирует между процессами весь
+текст TMemo, а журнал sipphone.exe за смену растет. MemoReader сначала
+спрашивает длину (WM_GETTEXTLENGTH) и число строк (EM_GETLINECOUNT) -
+метку изменения без копирования текста:
+
+- метка не изменилась - читается только последняя строка (EM_GETLINE,
+  десятки символов); совпала с прошлой - текст не читается;
+- текст вырос, а последняя известная строка начинается там же -
+  дочитываются только строки с нее (EM_GETLINE), начало берется из
+  прошлого чтения;
+- иначе (очищен, заменен, дописано больше MAX_APPEND_LINES строк) -
+  полное чтение.
+
+Правку выше последней строки без изменения длины и числа строк не видит
+ни метка, ни сверка последней строки, поэтому не реже раза в
+VERIFY_INTERVAL секунд текст перечитывается целиком. Замена последней
+строки (статус) строкой той же длины видна сразу. TMemo -
+надстройка над стандартным EDIT, сообщения EM_* система передает между
+процессами так же, как WM_GETTEXT.
+
+Сколько чтений пропущено, дочитано и сделано целиком, сколько байт
+(UTF-16) скопировано и сколько времени ушло - в ReadStats, общем на все
+TMemo профиля.
+"""
+import sys
+import time
+import ctypes
+
+WM_GETTEXT = 0x000D
+WM_GETTEXTLENGTH = 0x000E
+EM_GETLINECOUNT = 0x00BA
+EM_LINEINDEX = 0x00BB
+EM_LINELENGTH = 0x00C1
+EM_GETLINE = 0x00C4
+SMTO_ABORTIFHUNG = 0x0002
+SEND_TIMEOUT_MS = 200
+
+MAX_APPEND_LINES = 16
+VERIFY_INTERVAL = 30.0
+BYTES_PER_CHAR = 2  # UTF-16
+
+# Как прошло чтение
+READ_SKIPPED = 'skipped'
+READ_APPENDED = 'appended'
+READ_FULL = 'full'
+
+
+class ReadStats:
+    """Счетчики чтения TMemo: пропуски, дочитывания, полные чтения, байты и время"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = {READ_SKIPPED: 0, READ_APPENDED: 0, READ_FULL: 0}
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def add(self, kind, chars, seconds):
+        self.counts[kind] += 1
+        self.bytes += chars * BYTES_PER_CHAR
+        self.seconds += seconds
+
+    def as_dict(self):
+        reads = sum(self.counts.values())
+        stats = dict(self.counts)
+        stats.update(reads=reads, bytes=self.bytes, seconds=self.seconds,
+                     bytes_per_read=self.bytes / reads if reads else 0.0)
+        return stats
+
+
+class Win32EditApi:
+    """Сообщения EDIT чужому окну через SendMessageTimeoutW; таймаут - OSError"""
+
+    def __init__(self, timeout_ms=SEND_TIMEOUT_MS):
+        self.timeout_ms = timeout_ms
+        self.user32 = ctypes.windll.user32
+
+    @staticmethod
+    def available():
+        return sys.platform == 'win32'
+
+    def _send(self, hwnd, message, wparam=0, lparam=0):
+        result = ctypes.c_size_t()
+        if not self.user32.SendMessageTimeoutW(hwnd, message, wparam, lparam, SMTO_ABORTIFHUNG,
+                                               self.timeout_ms, ctypes.byref(result)):
+            raise OSError(f"окно {hwnd} не ответило на сообщение 0x{message:04X}")
+        return result.value
+
+    def text_length(self, hwnd):
+        return self._send(hwnd, WM_GETTEXTLENGTH)
+
+    def line_count(self, hwnd):
+        return self._send(hwnd, EM_GETLINECOUNT)
+
+    def line_index(self, hwnd, line):
+        """Индекс первого символа строки (-1 - нет такой строки)"""
+        return ctypes.c_ssize_t(self._send(hwnd, EM_LINEINDEX, line)).value
+
+    def line_length(self, hwnd, char_index):
+        return self._send(hwnd, EM_LINELENGTH, char_index)
+
+    def get_line(self, hwnd, line, length):
+        if length == 0:
+            return ""
+        # Первое слово буфера - его размер в символах (EM_GETLINE)
+        buf = ctypes.create_unicode_buffer(length + 1)
+        ctypes.c_uint16.from_buffer(buf).value = length
+        copied = self._send(hwnd, EM_GETLINE, line, buf)
+        return buf[:copied]
+
+    def get_text(self, hwnd, length):
+        buf = ctypes.create_unicode_buffer(length + 1)
+        self._send(hwnd, WM_GETTEXT, len(buf), buf)
+        return buf.value
+
+
+class MemoReader:
+    """
+    Текст одного TMemo с дочитыванием. read() возвращает весь текст
+    (из кэша, если он не менялся); last_read - как он получен,
+    appended_from - длина прошлого текста, если он остался началом нового
+    (None - текст заменен).
+    """
+
+    def __init__(self, hwnd, api, stats=None, clock=time.monotonic,
+                 max_append_lines=MAX_APPEND_LINES, verify_interval=VERIFY_INTERVAL):
+        self.hwnd = hwnd
+        self.api = api
+        self.stats = stats if stats is not None else ReadStats()
+        self.clock = clock
+        self.max_append_lines = max_append_lines
+        self.verify_interval = verify_interval
+        self.text = None
+        self.length = None
+        self.lines = None
+        self.last_line_start = None
+        self.verified_at = None
+        self.last_read = None
+        self.appended_from = None
+
+    @property
+    def changed(self):
+        return self.last_read != READ_SKIPPED
+
+    def read(self):
+        started = time.perf_counter()
+        api, hwnd = self.api, self.hwnd
+        length = api.text_length(hwnd)
+        lines = api.line_count(hwnd)
+        now = self.clock()
+        verify_due = self.verified_at is None or now - self.verified_at >= self.verify_interval
+        copied = 0
+        self.appended_from = None
+
+        kind = None
+        if not verify_due and length == self.length and lines == self.lines:
+            last_line, copied = self._read_last_line(lines)
+            if last_line == self.text[self.last_line_start:]:
+                kind = READ_SKIPPED
+        if kind is None:
+            text = None
+            if not verify_due:
+                text, appended = self._read_appended(length, lines)
+                copied += appended
+            if text is not None:
+                kind = READ_APPENDED
+                # Начало до последней строки не перечитывалось, сверяем только ее
+                start = self.last_line_start
+                if text[start:len(self.text)] == self.text[start:]:
+                    self.appended_from = len(self.text)
+            else:
+                text = api.get_text(hwnd, length)
+                copied += len(text)
+                kind = READ_FULL
+                self.verified_at = now
+                if self.text is not None and text.startswith(self.text):
+                    self.appended_from = len(self.text)
+            self.text = text
+            self.length = len(text)
+            self.lines = lines
+            self.last_line_start = max(0, api.line_index(hwnd, lines - 1)) if lines else 0
+        self.last_read = kind
+        self.stats.add(kind, copied, time.perf_counter() - started)
+        return self.text
+
+    def _read_last_line(self, lines):
+        """Последняя строка и сколько символов скопировано; None - строка начинается не там"""
+        api, hwnd = self.api, self.hwnd
+        start = max(0, api.line_index(hwnd, lines - 1)) if lines else 0
+        if start != self.last_line_start:
+            return None, 0
+        line = api.get_line(hwnd, lines - 1, api.line_length(hwnd, start)) if lines else ""
+        return line, len(line)
+
+    def _read_appended(self, length, lines):
+        """Дочитывает строки с последней известной; None - нужно полное чтение"""
+        if self.text is None or length <= self.length or lines < self.lines:
+            return None, 0
+        first = self.lines - 1
+        if lines - first > self.max_append_lines:
+            return None, 0
+        api, hwnd = self.api, self.hwnd
+        if api.line_index(hwnd, first) != self.last_line_start:
+            return None, 0
+        parts = [self.text[:self.last_line_start]]
+        copied = 0
+        start = self.last_line_start
+        for line in range(first, lines):
+            line_length = api.line_length(hwnd, start)
+            parts.append(api.get_line(hwnd, line, line_length))
+            copied += line_length
+            if line + 1 < lines:
+                next_start = api.line_index(hwnd, line + 1)
+                gap = next_start - (start + line_length)
+                if gap not in (0, 2):
+                    return None, copied
+                # 2 - перевод строки CRLF, 0 - перенос по ширине TMemo
+                parts.append("\r\n" if gap else "")
+                start = next_start
+        text = "".join(parts)
+        if len(text) != length:
+            return None, copied
+        return text, copied
+
+
+class FakeEditApi:
+    """
+    Фейковый EDIT для тестов и бенчмарков без Windows: texts - hwnd ->
+    текст со строками через CRLF, wrap - перенос по ширине (символов,
+    None - без переноса). copied - сколько символов отдано наружу,
+    messages - сколько сообщений получено.
+    """
+
+    def __init__(self, wrap=None):
+        self.texts = {}
+        self.wrap = wrap
+        self.copied = 0
+        self.messages = 0
+        self._layout = (None, None)
+
+    def _lines(self, hwnd):
+        """Начала и длины строк как у EDIT"""
+        self.messages += 1
+        text = self.texts.get(hwnd, "")
+        if self._layout[0] is text:
+            return self._layout[1]
+        lines = []
+        start = 0
+        for part in text.split("\r\n"):
+            width = self.wrap or max(len(part), 1)
+            for offset in range(0, max(len(part), 1), width):
+                lines.append((start + offset, min(width, len(part) - offset)))
+            start += len(part) + 2
+        self._layout = (text, lines)
+        return lines
+
+    def text_length(self, hwnd):
+        self.messages += 1
+        return len(self.texts.get(hwnd, ""))
+
+    def line_count(self, hwnd):
+        return len(self._lines(hwnd))
+
+    def line_index(self, hwnd, line):
+        lines = self._lines(hwnd)
+        return lines[line][0] if 0 <= line < len(lines) else -1
+
+    def line_length(self, hwnd, char_index):
+        for start, length in self._lines(hwnd):
+            if start <= char_index <= start + length:
+                return length
+        return 0
+
+    def get_line(self, hwnd, line, length):
+        start, line_length = self._lines(hwnd)[line]  # _lines() считает это сообщение
+        text = self.texts[hwnd][start:start + min(length, line_length)]
+        self.copied += len(text)
+        return text
+
+    def get_text(self, hwnd, length):
+        self.messages += 1
+        text = self.texts.get(hwnd, "")[:length]
+        self.copied += len(text)
+        return text
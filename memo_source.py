@@ -0,0 +1,333 @@
+# memo_source.py
+"""
+Источники изменений текста TMemo для CallMonitor.
+
+Источник не опрашивает окно по таймеру, а сам сообщает об изменениях текста:
+CallMonitor ждет событие в wait_events() и сразу передает текст в
+analyze_call_state(). Опрос окна через pywinauto остается только запасным
+вариантом на случай, когда событий долго нет или хук недоступен.
+"""
+import sys
+import time
+import queue
+import ctypes
+import threading
+from collections import namedtuple
+
+from app_log import get_logger
+from call_state import IncrementalMatch, MatchResult
+
+log = get_logger(__name__)
+
+# Событие изменения текста: handle окна TMemo, новый текст, момент появления
+# и PID процесса (None - источник не знает процесс, событие для всех профилей)
+MemoEvent = namedtuple('MemoEvent', ['hwnd', 'text', 'timestamp', 'pid'], defaults=(None,))
+
+NO_MATCH = MatchResult(frozenset(), None)
+
+# WinEvent константы
+EVENT_OBJECT_NAMECHANGE = 0x800C
+EVENT_OBJECT_VALUECHANGE = 0x800E
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+OBJID_WINDOW = 0
+OBJID_CLIENT = -4
+WM_GETTEXT = 0x000D
+WM_GETTEXTLENGTH = 0x000E
+WM_QUIT = 0x0012
+SMTO_ABORTIFHUNG = 0x0002
+SEND_TIMEOUT_MS = 200
+
+
+class MemoChangeSource:
+    """
+    Базовый источник событий изменения TMemo.
+    attach(pid) вызывается для каждого найденного процесса телефона,
+    detach(pid) - когда процесс пропал, detach() - отписка от всех.
+    hooks_active - события действительно приходят; False - изменения
+    видны только опросом, и реже опрашивать нельзя.
+    """
+
+    hooks_active = False
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.detach()
+
+    def attach(self, pid):
+        pass
+
+    def detach(self, pid=None):
+        pass
+
+    def wake(self):
+        """Прерывает текущий wait_events() без событий."""
+        pass
+
+    def wait_events(self, timeout):
+        """
+        Ждет хотя бы одно событие не дольше timeout секунд.
+        Возвращает список накопившихся событий (пустой при таймауте).
+        """
+        raise NotImplementedError
+
+
+class QueueMemoSource(MemoChangeSource):
+    """Общая часть источников, складывающих события в очередь."""
+
+    def __init__(self):
+        self._events = queue.Queue()
+
+    def push(self, hwnd, text, timestamp=None, pid=None):
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        self._events.put(MemoEvent(hwnd, text, timestamp, pid))
+
+    def wake(self):
+        self._events.put(None)
+
+    def wait_events(self, timeout):
+        try:
+            events = [self._events.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        # Забираем все, что успело накопиться, чтобы обработать пачкой
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return [event for event in events if event is not None]
+
+
+class WinEventMemoSource(QueueMemoSource):
+    """
+    Источник на WinEvent хуках: подписывается на изменение имени/значения
+    объектов в процессах телефонов и читает текст изменившегося TMemo.
+    Хуки всех процессов работают в одном потоке с циклом сообщений;
+    при изменении набора процессов поток перезапускается.
+    """
+
+    def __init__(self, class_names=("TMemo",)):
+        super().__init__()
+        self.class_names = frozenset(class_names)
+        self._pids = frozenset()
+        self._thread = None
+        self._thread_id = None
+        self._ready = threading.Event()
+        self.hooks_active = False
+
+    @staticmethod
+    def available():
+        return sys.platform == 'win32'
+
+    def attach(self, pid):
+        if pid in self._pids and self._thread and self._thread.is_alive():
+            return
+        self._restart(self._pids | {pid})
+
+    def detach(self, pid=None):
+        pids = frozenset() if pid is None else self._pids - {pid}
+        if pids != self._pids:
+            self._restart(pids)
+
+    def _restart(self, pids):
+        self.hooks_active = False
+        if self._thread is not None:
+            if self._thread_id:
+                ctypes.windll.user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
+            self._thread.join(1.0)
+            self._thread = None
+            self._thread_id = None
+        self._pids = frozenset(pids)
+        if not self._pids:
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._hook_loop, args=(self._pids,), daemon=True)
+        self._thread.start()
+        self._ready.wait(1.0)
+
+    def _hook_loop(self, pids):
+        from ctypes import wintypes
+        user32 = ctypes.windll.user32
+        self._thread_id = ctypes.windll.kernel32.GetCurrentThreadId()
+
+        WinEventProc = ctypes.WINFUNCTYPE(
+            None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+            wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+        hooks = {}  # handle хука -> PID процесса
+        # Тип результата как у handle в callback, чтобы ключи совпадали
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+
+        def callback(hook, event, hwnd, id_object, id_child, thread, event_time):
+            if not hwnd or id_object not in (OBJID_WINDOW, OBJID_CLIENT):
+                return
+            try:
+                if self._window_class(hwnd) not in self.class_names:
+                    return
+                text = self._read_text(hwnd)
+                if text is not None:
+                    self.push(hwnd, text, pid=hooks.get(hook))
+            except Exception as e:
+                log.warning("⚠️ Ошибка обработки WinEvent: %s", e)
+
+        # Ссылку на callback держим до конца цикла, иначе его соберет GC
+        proc = WinEventProc(callback)
+        for pid in pids:
+            hook = user32.SetWinEventHook(
+                EVENT_OBJECT_NAMECHANGE, EVENT_OBJECT_VALUECHANGE, 0, proc,
+                pid, 0, WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS)
+            if hook:
+                hooks[hook] = pid
+            else:
+                log.error("❌ Не удалось установить WinEvent хук для PID %s", pid)
+        # Процесс без хука виден только опросом - тогда опрос не замедляется
+        self.hooks_active = len(hooks) == len(pids)
+        self._ready.set()
+        if not hooks:
+            return
+        try:
+            msg = wintypes.MSG()
+            while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            if self._thread is threading.current_thread():
+                self.hooks_active = False
+            for hook in hooks:
+                user32.UnhookWinEvent(hook)
+
+    @staticmethod
+    def _window_class(hwnd):
+        buf = ctypes.create_unicode_buffer(64)
+        ctypes.windll.user32.GetClassNameW(hwnd, buf, len(buf))
+        return buf.value
+
+    @staticmethod
+    def _read_text(hwnd):
+        """Читает текст чужого окна через WM_GETTEXT с таймаутом."""
+        user32 = ctypes.windll.user32
+        result = ctypes.c_size_t()
+        if not user32.SendMessageTimeoutW(hwnd, WM_GETTEXTLENGTH, 0, 0, SMTO_ABORTIFHUNG,
+                                          SEND_TIMEOUT_MS, ctypes.byref(result)):
+            return None
+        buf = ctypes.create_unicode_buffer(result.value + 1)
+        if not user32.SendMessageTimeoutW(hwnd, WM_GETTEXT, len(buf), buf, SMTO_ABORTIFHUNG,
+                                          SEND_TIMEOUT_MS, ctypes.byref(result)):
+            return None
+        return buf.value
+
+
+class ScriptedMemoSource(QueueMemoSource):
+    """
+    Фейковый источник для тестов и бенчмарков на Linux.
+    script: список (задержка_сек, hwnd, текст[, pid]), задержки отсчитываются
+    от предыдущего шага. Время фактической отправки каждого события
+    сохраняется в emitted. hooks_active=False - как WinEvent источник,
+    которому не удалось поставить хуки: цикл должен опрашивать окно.
+    """
+
+    def __init__(self, script, clock=time.perf_counter, hooks_active=True):
+        super().__init__()
+        self.script = list(script)
+        self.clock = clock
+        self.hooks_active = hooks_active
+        self.emitted = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._play, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def finished(self):
+        return self._thread is not None and not self._thread.is_alive() and self._events.empty()
+
+    def _play(self):
+        for delay, hwnd, text, *pid in self.script:
+            if self._stop.wait(delay):
+                return
+            timestamp = self.clock()
+            self.emitted.append(timestamp)
+            self.push(hwnd, text, timestamp, pid[0] if pid else None)
+
+
+class MemoTextTracker:
+    """
+    Хранит последний известный текст каждого TMemo и выбирает тот,
+    в котором есть триггеры (как раньше делал цикл по children()).
+    matcher - TriggerMatcher; текст каждого TMemo просматривает свой
+    IncrementalMatch, так что дописанный текст ищется только в хвосте.
+    """
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.texts = {}
+        self.matches = {}  # hwnd -> IncrementalMatch
+
+    def update(self, hwnd, text, appended_from=None):
+        """
+        Новый текст TMemo; appended_from - длина прошлого текста, если он
+        остался началом нового (None - проверить самому). True, если текст изменился.
+        """
+        old = self.texts.get(hwnd)
+        if old == text:
+            return False
+        scan = self.matches.get(hwnd)
+        if scan is None:
+            scan = self.matches[hwnd] = IncrementalMatch(self.matcher)
+        if appended_from is None and old is not None and text.startswith(old):
+            appended_from = len(old)
+        scan.feed(text, appended_from)
+        self.texts[hwnd] = text
+        return True
+
+    def replace(self, texts):
+        """Тексты всех TMemo окна (порядок - как в окне); True, если что-то изменилось"""
+        changed = False
+        for hwnd, text in texts.items():
+            changed = self.update(hwnd, text) or changed
+        return self.retain(texts) or changed
+
+    def retain(self, hwnds):
+        """Оставляет только TMemo hwnds в их порядке; True, если набор изменился"""
+        hwnds = [hwnd for hwnd in hwnds if hwnd in self.texts]
+        if hwnds == list(self.texts):
+            return False
+        self.texts = {hwnd: self.texts[hwnd] for hwnd in hwnds}
+        self.matches = {hwnd: self.matches[hwnd] for hwnd in hwnds}
+        return True
+
+    def clear(self):
+        self.texts = {}
+        self.matches = {}
+
+    def _matched(self):
+        for hwnd, text in self.texts.items():
+            result = self.matches[hwnd].result
+            if result.triggers:
+                return text, result
+        return "", NO_MATCH
+
+    def memo_text(self):
+        return self._matched()[0]
+
+    def match(self):
+        """MatchResult текста TMemo с триггерами (пустой, если триггеров нет)"""
+        return self._matched()[1]
+
+
+def create_default_source(class_names=("TMemo",)):
+    """Источник событий для текущей платформы или None (только опрос)."""
+    if WinEventMemoSource.available():
+        return WinEventMemoSource(class_names)
+    return None
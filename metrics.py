@@ -0,0 +1,259 @@
+# metrics.py
+"""
+Замеры длительности этапов: гистограммы, Prometheus и JSON-снимок.
+
+Этапы оборачиваются в `with metrics.timed('check_process'):`. Пока метрики
+выключены, timed() возвращает общий пустой контекст и не читает часы,
+так что замеры можно оставлять в горячем цикле. Включаются ключом
+'metrics' в config.json:
+
+    "metrics": {"enabled": true, "port": 9464, "snapshot": "metrics.json", "interval": 60}
+
+port - HTTP на 127.0.0.1 (GET /metrics, текстовый формат Prometheus; null - без HTTP),
+snapshot - файл, куда раз в interval секунд пишется JSON с p50/p95/p99.
+"""
+import os
+import json
+import time
+import bisect
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app_log import get_logger
+
+log = get_logger(__name__)
+
+METRIC_NAME = 'sip_helper_stage_duration_seconds'
+DEFAULT_PORT = 9464
+SNAPSHOT_INTERVAL = 60.0
+
+# Границы корзин, сек: от 10 мкс до 10 с
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+           0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами; перцентили - интерполяцией внутри корзины."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя - больше верхней границы
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Timer:
+    __slots__ = ('registry', 'stage', 'started')
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def timed(self, stage):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self):
+        """{этап: {count, sum, max, p50, p95, p99}}, секунды."""
+        with self._lock:
+            return {stage: histogram.snapshot() for stage, histogram in sorted(self._histograms.items())}
+
+    def prometheus_text(self):
+        lines = [f"# HELP {METRIC_NAME} Длительность этапов SIP Helper",
+                 f"# TYPE {METRIC_NAME} histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path):
+        """Атомарно записывает JSON-снимок (во временный файл, затем os.replace)."""
+        data = {'timestamp': time.time(), 'stages': self.snapshot()}
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.metrics-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug("metrics: " + format, *args)
+
+
+class MetricsExporter:
+    """HTTP /metrics на 127.0.0.1 и периодический JSON-снимок, оба в фоновых потоках."""
+
+    def __init__(self, registry, port=DEFAULT_PORT, snapshot_path=None, interval=SNAPSHOT_INTERVAL):
+        self.registry = registry
+        self.port = port
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self.server = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self.port is not None:
+            handler = type('MetricsHandler', (_MetricsHandler,), {'registry': self.registry})
+            try:
+                self.server = ThreadingHTTPServer(('127.0.0.1', self.port), handler)
+            except OSError as e:
+                log.warning("⚠️ Не удалось открыть порт метрик %s: %s", self.port, e)
+            else:
+                self._spawn(self.server.serve_forever, "MetricsHTTP")
+                log.info("📈 Метрики: http://127.0.0.1:%d/metrics", self.server.server_address[1])
+        if self.snapshot_path:
+            self._spawn(self._snapshot_loop, "MetricsSnapshot")
+        return self
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.interval):
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        try:
+            self.registry.write_snapshot(self.snapshot_path)
+        except Exception as e:
+            log.warning("⚠️ Не удалось записать снимок метрик: %s", e)
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.snapshot_path:
+            self._write_snapshot()
+
+
+# Общий реестр процесса
+registry = MetricsRegistry()
+timed = registry.timed
+observe = registry.observe
+
+_exporter = None
+
+
+def configure(config):
+    """Включает метрики по ключу 'metrics' из config.json. Возвращает экспортер или None."""
+    global _exporter
+    settings = config.get('metrics') or {}
+    if not settings.get('enabled'):
+        registry.enabled = False
+        return None
+    registry.enabled = True
+    _exporter = MetricsExporter(registry, port=settings.get('port', DEFAULT_PORT),
+                                snapshot_path=settings.get('snapshot'),
+                                interval=float(settings.get('interval', SNAPSHOT_INTERVAL))).start()
+    return _exporter
+
+
+def shutdown():
+    global _exporter
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
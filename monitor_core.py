@@ -0,0 +1,477 @@
+# monitor_core.py
+"""
+Ядро мониторинга софтфонов без Qt: поиск процессов, события TMemo,
+машины состояний звонков.
+
+CallMonitor - один цикл на все профили (monitor_profiles): у каждого
+профиля свой процесс, кэш окна, трекер TMemo и машина состояний, а снимок
+процессов, перечисление окон, поток WinEvent хуков и пробуждения цикла
+общие. Цикл работает в обычном потоке (start()) или в текущем (run()) и
+сообщает о событиях слушателям: listener(event), где event - MonitorEvent
+(имя, аргументы, момент обнаружения по perf_counter, профиль). Для asyncio
+есть events() - асинхронный итератор тех же событий. MonitorThread в
+window_monitor только переводит события в сигналы Qt, а sip_service
+запускает это же ядро без GUI.
+
+Интервал опроса выбирает PollScheduler (poll_scheduler): часто, пока
+звонит входящий или идет исходящий, реже в разговоре и с нарастающим
+откатом без звонков.
+
+pywinauto импортируется при первом подключении к окну, так что модуль
+загружается без него.
+"""
+import time
+import asyncio
+import fnmatch
+import warnings
+import threading
+from collections import namedtuple
+
+from memo_source import MemoTextTracker, create_default_source
+from memo_reader import MemoReader, ReadStats, Win32EditApi
+from window_cache import ConnectionCache, top_level_windows
+from process_watcher import Win32ProcessWatcher
+from poll_scheduler import PollScheduler, CALL_INTERVAL, FALLBACK_INTERVAL, SEARCH_INTERVAL
+from app_log import get_logger
+import metrics
+from call_state import CallStateMachine, INCOMING, OUTGOING, ACTIVE
+from monitor_profiles import (MonitorProfile, PROCESS_NAME, MAIN_WINDOW_CLASS, TARGET_TITLE,
+                              T_MEMO_CLASS)
+
+log = get_logger(__name__)
+
+# Подавляем предупреждение о разрядности Python/приложения
+warnings.filterwarnings('ignore', message='.*32-bit application should be automated.*')
+
+# Интервалы по умолчанию (сек); фактические выбирает PollScheduler по 'polling' в config.json
+POLL_INTERVAL = CALL_INTERVAL
+FALLBACK_POLL_INTERVAL = FALLBACK_INTERVAL
+PROCESS_SEARCH_INTERVAL = SEARCH_INTERVAL
+
+# События монитора (имена совпадают с сигналами MonitorThread)
+EVENT_CALL_STARTED = 'call_started'    # Звонок принят (появилась "Длительность")
+EVENT_CALL_ENDED = 'call_ended'
+EVENT_PROCESS_STOPPED = 'process_stopped'
+EVENT_PROCESS_RUNNING = 'process_running'
+EVENT_INCOMING_CALL = 'incoming_call'  # Аргумент - направление (tv_tech, tv_order и т.д.)
+EVENT_OUTGOING_CALL = 'outgoing_call'
+EVENT_CALL_ANSWERED = 'call_answered'  # Переход от "Входящий звонок" к "Длительность"
+EVENTS = (EVENT_CALL_STARTED, EVENT_CALL_ENDED, EVENT_PROCESS_STOPPED, EVENT_PROCESS_RUNNING,
+          EVENT_INCOMING_CALL, EVENT_OUTGOING_CALL, EVENT_CALL_ANSWERED)
+
+# Событие для слушателей: имя, аргументы, момент обнаружения (perf_counter) и профиль
+MonitorEvent = namedtuple('MonitorEvent', ['name', 'args', 'detected_at', 'profile'], defaults=(None,))
+
+
+class ProfileMonitor:
+    """
+    Состояние одного профиля: процесс, окно, текст TMemo и машина состояний.
+    edit_api - сообщения EDIT для MemoReader (по умолчанию Win32EditApi).
+    """
+
+    def __init__(self, profile, process_watcher, edit_api=None):
+        self.profile = profile
+        self.process_watcher = process_watcher  # Ожидание завершения процесса профиля
+        self.process_id = None
+        self.is_process_active = False
+        self.watching = False  # Наблюдатель сообщит о завершении (иначе - проверка снимком)
+        self.state_machine = CallStateMachine(profile.matcher)
+        self.memo_tracker = MemoTextTracker(profile.matcher)
+        # Дочитывание TMemo между тиками: handle -> MemoReader, счетчики общие на профиль
+        self.edit_api = edit_api
+        self.memo_readers = {}
+        self.read_stats = ReadStats()
+        # Кэш найденного главного окна и его TMemo между тиками
+        self.window_cache = ConnectionCache(self.resolve_window)
+
+    def resolve_window(self, pid):
+        """Находит главное окно телефона и его TMemo (дорогая операция, кэшируется)"""
+        from pywinauto.application import Application
+        profile = self.profile
+        with metrics.timed('window_connect'):
+            app = Application(backend="win32").connect(process=pid, timeout=5)
+            main_window = app.window(class_name=profile.window_class,
+                                     title_re=fnmatch.translate(profile.window_title)).wrapper_object()
+            memos = main_window.children(class_name=profile.memo_class)
+        stats = self.window_cache.stats()
+        log.info("🔌 Окно %s [%s] найдено (PID %s), попаданий кэша: %d, промахов: %d",
+                 profile.process_name, profile.name, pid, stats['hits'], stats['misses'])
+        return main_window, memos
+
+    def read_memos(self):
+        """
+        Запасной путь: дочитывает TMemo закэшированного окна (MemoReader
+        копирует текст, только если он изменился). True, если текст изменился.
+        """
+        _, memos = self.window_cache.get(self.process_id)
+        if self.edit_api is None:
+            self.edit_api = Win32EditApi()
+
+        # Читаем текст из TMemo без изменения состояния окна
+        readers = {}
+        changed = False
+        with metrics.timed('memo_read'):
+            for memo in memos:
+                reader = self.memo_readers.get(memo.handle)
+                if reader is None:
+                    reader = MemoReader(memo.handle, self.edit_api, self.read_stats)
+                try:
+                    text = reader.read()
+                except Exception:
+                    # Handle мог устареть между проверкой и чтением
+                    self.window_cache.invalidate()
+                    continue
+                readers[memo.handle] = reader
+                if reader.changed:
+                    changed = self.memo_tracker.update(memo.handle, text, reader.appended_from) or changed
+        self.memo_readers = readers
+        return self.memo_tracker.retain(readers) or changed
+
+    def lost(self):
+        """Процесс профиля завершился: сброс состояния без событий"""
+        self.is_process_active = False
+        self.state_machine.reset()
+        self.process_id = None
+        self.watching = False
+        self.process_watcher.unwatch()
+        self.memo_tracker.clear()
+        self.memo_readers = {}
+        self.log_read_stats()
+        stats = self.window_cache.stats()
+        log.info("📊 Кэш окна [%s]: попаданий %d, промахов %d, переподключения %.0f мс, "
+                 "сэкономлено ~%.1f с", self.profile.name, stats['hits'], stats['misses'],
+                 stats['reconnect_seconds'] * 1000, stats['saved_seconds'])
+        self.window_cache.invalidate()
+
+    def log_read_stats(self):
+        stats = self.read_stats.as_dict()
+        if stats['reads']:
+            log.info("📊 Чтение TMemo [%s]: %d чтений (пропущено %d, дочитано %d, целиком %d), "
+                     "скопировано %.1f КБ (%.0f Б/чтение), %.0f мс", self.profile.name, stats['reads'],
+                     stats['skipped'], stats['appended'], stats['full'], stats['bytes'] / 1024,
+                     stats['bytes_per_read'], stats['seconds'] * 1000)
+        return stats
+
+
+class CallMonitor:
+    """
+    profiles - список MonitorProfile (по умолчанию один профиль с matcher).
+    process_watcher делает общий снимок процессов и следит за процессом
+    первого профиля; для остальных профилей watcher_factory(имя процесса)
+    создает своих наблюдателей. scheduler - PollScheduler (по умолчанию с
+    интервалами по умолчанию и теми же часами clock). trace - TraceRecorder
+    (trace_replay) для записи входа машин состояний и событий, или None.
+    """
+
+    def __init__(self, memo_source=None, process_watcher=None, matcher=None, profiles=None,
+                 watcher_factory=Win32ProcessWatcher, clock=time.monotonic, scheduler=None, trace=None):
+        self._is_running = True
+        self.trace = trace
+        self._thread = None
+        self._listeners = []
+        self.clock = clock
+        self._last_scan = None
+        self.scheduler = scheduler or PollScheduler(clock=clock)
+
+        profiles = list(profiles or [MonitorProfile(matcher=matcher)])
+        self.process_watcher = process_watcher or watcher_factory(profiles[0].process_name)
+        self.profiles = [ProfileMonitor(profile, self.process_watcher if i == 0
+                                        else watcher_factory(profile.process_name))
+                         for i, profile in enumerate(profiles)]
+        self.primary = self.profiles[0]
+
+        # Источник событий изменения TMemo (None - только опрос), общий на все профили
+        if memo_source is None:
+            memo_source = create_default_source({monitor.profile.memo_class for monitor in self.profiles})
+        self.memo_source = memo_source
+        self._wakeup = threading.Event()
+
+        # Имя события -> время (perf_counter), когда его обнаружили, для замера задержек
+        self.detected_at = {}
+
+    def add_listener(self, listener):
+        """listener(event) вызывается в потоке монитора, поэтому не должен надолго блокировать"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def emit(self, name, *args, detected_at=None, profile=None):
+        event = MonitorEvent(name, args, detected_at if detected_at is not None else time.perf_counter(),
+                             profile or self.primary.profile)
+        if self.trace is not None:
+            self.trace.event(event.profile.name, name, args, event.detected_at)
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                log.error("❌ Ошибка обработчика события %s: %s: %s", name, type(e).__name__, e)
+
+    async def events(self):
+        """
+        Асинхронный поток событий: `async for event in monitor.events()`.
+        События переносятся в цикл asyncio через call_soon_threadsafe.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def listener(event):
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        self.add_listener(listener)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.remove_listener(listener)
+
+    def start(self):
+        """Запускает цикл мониторинга в отдельном потоке"""
+        self._is_running = True
+        self._thread = threading.Thread(target=self.run, name="CallMonitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        if self.memo_source:
+            self.memo_source.start()
+        try:
+            while self._is_running:
+                # 1. Проверяем процессы профилей (снимок - один на всех)
+                active = self.check_processes()
+                # Источник без установленных хуков событий не пришлет - опрос как без него
+                events_live = self.memo_source is not None and self.memo_source.hooks_active
+                timeout = self.scheduler.next_interval([monitor.state_machine.state for monitor in active],
+                                                       events=events_live)
+                if not active:
+                    self._wait(self._search_timeout())
+                    continue
+                if len(active) < len(self.profiles) or not all(monitor.watching for monitor in active):
+                    timeout = min(timeout, self._search_timeout())
+
+                # 2. Ждем события изменения TMemo, а при их отсутствии опрашиваем окна
+                if self.memo_source:
+                    for monitor in active:
+                        self.memo_source.attach(monitor.process_id)
+                    events = self.memo_source.wait_events(timeout)
+                    if events:
+                        self.scheduler.note_activity()
+                        self.handle_memo_events(events)
+                        continue
+                else:
+                    self._wait(timeout)
+                if not self._is_running:
+                    break
+
+                # Процессы могли завершиться, пока ждали
+                for monitor in self.check_processes():
+                    self.poll_memos(monitor)
+        finally:
+            for monitor in self.profiles:
+                monitor.process_watcher.unwatch()
+            if self.memo_source:
+                self.memo_source.stop()
+            self.scheduler.log_stats()
+            for monitor in self.profiles:
+                monitor.log_read_stats()
+            if self.trace is not None:
+                self.trace.close()
+
+    def _search_timeout(self):
+        """Сколько ждать до следующего снимка процессов"""
+        if self._last_scan is None:
+            return 0.0
+        return max(0.0, self.scheduler.search_interval - (self.clock() - self._last_scan))
+
+    def _wait(self, timeout):
+        """Пауза цикла, которую прерывает wake()"""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def wake(self):
+        """Будит цикл мониторинга (процесс завершился или поток останавливается)"""
+        self._wakeup.set()
+        if self.memo_source:
+            self.memo_source.wake()
+
+    def handle_memo_events(self, events):
+        """Раздает события изменения TMemo профилям по PID и сразу анализирует состояние"""
+        touched = {}
+        for event in events:
+            for monitor in self.profiles:
+                if not monitor.is_process_active:
+                    continue
+                if event.pid is None or event.pid == monitor.process_id:
+                    monitor.memo_tracker.update(event.hwnd, event.text)
+                    touched[id(monitor)] = (monitor, event.timestamp)
+        for monitor, timestamp in touched.values():
+            self.analyze_call_state(monitor.memo_tracker.memo_text(), timestamp, monitor,
+                                    monitor.memo_tracker.match())
+
+    def poll_memos(self, monitor=None):
+        """Запасной путь: перечитывает все TMemo окна профиля"""
+        monitor = monitor or self.primary
+        try:
+            if monitor.read_memos():
+                self.scheduler.note_activity()
+            # 3. Анализируем состояние звонка (поиск уже сделан трекером по дописанному тексту)
+            self.analyze_call_state(monitor.memo_tracker.memo_text(), monitor=monitor,
+                                    result=monitor.memo_tracker.match())
+        except Exception as e:
+            monitor.window_cache.invalidate()
+            log.warning("⚠️ Временная ошибка доступа к окну [%s]: %s", monitor.profile.name, e)
+
+    # Состояние первого профиля (для одного телефона - как раньше)
+    @property
+    def state_machine(self):
+        return self.primary.state_machine
+
+    @property
+    def process_id(self):
+        return self.primary.process_id
+
+    @property
+    def is_process_active(self):
+        return self.primary.is_process_active
+
+    @property
+    def is_call_active(self):
+        return self.state_machine.state == ACTIVE
+
+    @property
+    def is_incoming_call(self):
+        return self.state_machine.state == INCOMING
+
+    @property
+    def is_outgoing_call(self):
+        return self.state_machine.state == OUTGOING
+
+    @property
+    def current_direction(self):
+        return self.state_machine.direction
+
+    def poll_stats(self):
+        """Фактическая частота опроса и процессорное время потока мониторинга"""
+        return self.scheduler.stats()
+
+    def memo_read_stats(self):
+        """Счетчики чтения TMemo по профилям: пропуски, дочитывания, байты, время"""
+        return {monitor.profile.name: monitor.read_stats.as_dict() for monitor in self.profiles}
+
+    def analyze_call_state(self, memo_text, observed_at=None, monitor=None, result=None):
+        """
+        Анализирует текст из TMemo и сообщает слушателям события машины
+        состояний профиля. result - уже найденный MatchResult этого текста.
+        """
+        monitor = monitor or self.primary
+        if self.trace is not None:
+            self.trace.memo(monitor.profile.name, memo_text, observed_at)
+        with metrics.timed('analyze_call_state'):
+            if result is not None:
+                events = monitor.state_machine.apply(result)
+            else:
+                events = monitor.state_machine.feed(memo_text)
+        if events and observed_at is None:
+            observed_at = time.perf_counter()
+        for name, args in events:
+            self.detected_at[name] = observed_at
+            self.emit(name, *args, detected_at=observed_at, profile=monitor.profile)
+
+    def check_processes(self):
+        """
+        Проверяет процессы профилей и возвращает профили с живым процессом.
+        Пока PID профиля известен и процесс жив, снимок не делается: о
+        завершении сообщает наблюдатель. Для остальных - один снимок на всех
+        не чаще PROCESS_SEARCH_INTERVAL (сразу, если процесс только что завершился).
+        Процесс, за которым наблюдатель следить не смог, проверяется тем же
+        снимком и с тем же интервалом, а подписка повторяется.
+        """
+        with metrics.timed('check_process'):
+            return self._check_processes()
+
+    def check_process(self):
+        """Для одного телефона: жив ли процесс первого профиля"""
+        return self.primary in self.check_processes()
+
+    def _check_processes(self):
+        try:
+            lost = [monitor for monitor in self.profiles if monitor.process_id is not None
+                    and monitor.watching and not monitor.process_watcher.is_running()]
+            unwatched = [monitor for monitor in self.profiles
+                         if monitor.process_id is not None and not monitor.watching]
+            missing = [monitor for monitor in self.profiles
+                       if monitor.process_id is None or monitor in lost]
+            if (missing or unwatched) and (lost or self._search_timeout() <= 0):
+                # Профили без наблюдателя первыми: их PID, если жив, остается за ними
+                checked = unwatched + missing
+                self._last_scan = self.clock()
+                found = self.process_watcher.find_processes(
+                    {monitor.profile.process_name for monitor in checked})
+                self._assign(checked, found)
+        except Exception as e:
+            log.error("❌ Ошибка при проверке процесса: %s: %s", type(e).__name__, e)
+        return [monitor for monitor in self.profiles if monitor.is_process_active]
+
+    def _assign(self, missing, found):
+        """Раздает найденные PID профилям без процесса; PID достается одному профилю"""
+        claimed = {monitor.process_id for monitor in self.profiles
+                   if monitor not in missing and monitor.process_id is not None}
+        windows = None
+        for monitor in missing:
+            profile = monitor.profile
+            candidates = [pid for pid in found.get(profile.process_name.lower(), []) if pid not in claimed]
+            if len(candidates) > 1:
+                # Несколько экземпляров: выбираем по окну (одно перечисление окон на все профили)
+                if windows is None:
+                    windows = top_level_windows()
+                matching = [pid for pid in candidates if profile.matches_window(windows.get(pid, ()))]
+                candidates = matching or candidates
+            if monitor.process_id in candidates:
+                candidates = [monitor.process_id]
+            process_id = candidates[0] if candidates else None
+            if process_id is not None:
+                claimed.add(process_id)
+                self._set_process(monitor, process_id)
+            elif monitor.is_process_active:
+                self._process_lost(monitor)
+
+    def _set_process(self, monitor, process_id):
+        if monitor.process_id is not None and process_id != monitor.process_id:
+            # Телефон перезапущен между двумя поисками: состояние старого процесса
+            # не должно перейти к новому - сначала process_stopped, затем process_running
+            log.info("🔄 PID %s [%s] сменился: %s -> %s", monitor.profile.process_name,
+                     monitor.profile.name, monitor.process_id, process_id)
+            self._process_lost(monitor)
+        if process_id != monitor.process_id:
+            monitor.window_cache.invalidate()
+        if process_id != monitor.process_id or not monitor.watching:
+            monitor.watching = monitor.process_watcher.watch(process_id, self.wake)
+        monitor.process_id = process_id
+        if not monitor.is_process_active:
+            monitor.is_process_active = True
+            if self.trace is not None:
+                self.trace.process(monitor.profile.name, process_id)
+            self.emit(EVENT_PROCESS_RUNNING, profile=monitor.profile)
+            log.info("✅ Процесс %s [%s] обнаружен (PID %s)",
+                     monitor.profile.process_name, monitor.profile.name, process_id)
+
+    def _process_lost(self, monitor):
+        process_id = monitor.process_id
+        monitor.lost()
+        if self.trace is not None:
+            self.trace.process(monitor.profile.name, None)
+        if self.memo_source and process_id is not None:
+            self.memo_source.detach(process_id)
+        self.emit(EVENT_PROCESS_STOPPED, profile=monitor.profile)
+        log.info("❌ Процесс %s [%s] остановлен", monitor.profile.process_name, monitor.profile.name)
+
+    def stop(self):
+        self._is_running = False
+        self.wake()
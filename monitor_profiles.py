@@ -0,0 +1,96 @@
+# monitor_profiles.py
+"""
+Профили мониторинга: какой процесс и окно софтфона смотреть, какие
+триггеры искать и какие устройства включать.
+
+По умолчанию профиль один - Kartina sipphone.exe с триггерами из
+config.json. Несколько телефонов (два экземпляра sipphone.exe или другой
+клиент) задаются списком 'profiles' в config.json:
+
+    "profiles": [
+        {"name": "line1", "window_title": "Kartina sip phone*"},
+        {"name": "line2", "window_title": "Kartina sip phone*",
+         "devices": {"headset": "headset_2"}},
+        {"name": "other", "process": "softphone.exe", "window_class": "MainWnd",
+         "window_title": "*", "memo_class": "Edit",
+         "triggers": {"incoming": "Incoming call"}, "directions": ["sales"]}
+    ]
+
+Недостающие ключи берутся по умолчанию, 'triggers'/'directions' профиля -
+поверх общих из config.json; к направлениям добавляются направления
+правил 'routing' (call_routing). 'devices' сопоставляет виду устройства
+('headset', 'speakers') ключ с устройством в config.json. Несколько
+профилей с одним процессом занимают разные его экземпляры: при выборе
+учитываются класс и заголовок окна (шаблон с * и ?).
+"""
+from fnmatch import fnmatchcase
+
+from app_log import get_logger
+from call_state import TriggerMatcher, DEFAULT_TRIGGERS
+from call_routing import RoutingTable
+
+log = get_logger(__name__)
+
+# --- КОНСТАНТЫ ДЛЯ ПОИСКА ОКНА (профиль по умолчанию) ---
+PROCESS_NAME = 'sipphone.exe'
+MAIN_WINDOW_CLASS = 'TMainForm'
+TARGET_TITLE = 'Kartina sip phone'
+T_MEMO_CLASS = "TMemo"
+
+DEFAULT_PROFILE_NAME = 'sipphone'
+DEVICE_TYPES = ('headset', 'speakers')
+
+
+class MonitorProfile:
+    def __init__(self, name=DEFAULT_PROFILE_NAME, process_name=PROCESS_NAME,
+                 window_class=MAIN_WINDOW_CLASS, window_title=TARGET_TITLE,
+                 memo_class=T_MEMO_CLASS, matcher=None, devices=None):
+        self.name = name
+        self.process_name = process_name
+        self.window_class = window_class
+        self.window_title = window_title
+        self.memo_class = memo_class
+        self.matcher = matcher or TriggerMatcher()
+        self.devices = dict(devices or {})
+
+    @classmethod
+    def from_config(cls, data, config=None, index=0):
+        """Профиль из элемента списка 'profiles'; config - общие настройки."""
+        config = config or {}
+        triggers = dict(DEFAULT_TRIGGERS)
+        triggers.update(config.get('triggers') or {})
+        triggers.update(data.get('triggers') or {})
+        directions = RoutingTable.from_config(config).directions(
+            data.get('directions') or config.get('directions'))
+        return cls(name=data.get('name') or f"profile{index + 1}",
+                   process_name=data.get('process', PROCESS_NAME),
+                   window_class=data.get('window_class', MAIN_WINDOW_CLASS),
+                   window_title=data.get('window_title', TARGET_TITLE),
+                   memo_class=data.get('memo_class', T_MEMO_CLASS),
+                   matcher=TriggerMatcher(triggers, directions),
+                   devices=data.get('devices'))
+
+    def device_key(self, device_type):
+        """Ключ устройства в config.json для вида 'headset'/'speakers'."""
+        return self.devices.get(device_type, device_type)
+
+    def matches_window(self, windows):
+        """Есть ли среди окон процесса [(класс, заголовок), ...] окно профиля."""
+        return any(class_name == self.window_class and fnmatchcase(title, self.window_title)
+                   for class_name, title in windows)
+
+    def __repr__(self):
+        return f"MonitorProfile({self.name!r}, {self.process_name!r})"
+
+
+def load_profiles(config):
+    """Профили из config.json; без 'profiles' - один профиль по умолчанию."""
+    entries = config.get('profiles') or [{'name': DEFAULT_PROFILE_NAME}]
+    profiles = [MonitorProfile.from_config(data, config, i) for i, data in enumerate(entries)]
+    seen = set()
+    for i, profile in enumerate(profiles):
+        if profile.name in seen:
+            log.warning("⚠️ Повтор имени профиля '%s', переименован в '%s#%d'", profile.name, profile.name, i + 1)
+            profile.name = f"{profile.name}#{i + 1}"
+        seen.add(profile.name)
+    return profiles
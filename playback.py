@@ -0,0 +1,138 @@
+# playback.py
+"""
+Воспроизведение рингтона и аварийного сигнала с малой задержкой.
+
+Микшер pygame открывается один раз с небольшим буфером (по умолчанию
+256 отсчетов, около 6 мс при 44.1 кГц вместо 512 по умолчанию). Под
+рингтон и аварийный сигнал зарезервированы отдельные каналы: сигнал не
+занимает канал рингтона, а запуск рингтона не ищет свободный канал и не
+останавливает его отдельно. При запуске по своему зарезервированному
+каналу проигрывается короткая тишина: звуковой поток уже работает к
+первому звонку, а задержка до начала микширования измеряется и
+сравнивается с бюджетом. Измерение ждет микшер до 0.5 с, поэтому идет в
+фоновом потоке: start() вызывается из потока GUI при запуске.
+"""
+import time
+import threading
+
+from app_log import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_FREQUENCY = 44100
+DEFAULT_SIZE = -16
+DEFAULT_CHANNELS = 2
+DEFAULT_BUFFER = 256
+
+NUM_CHANNELS = 8
+RINGTONE_CHANNEL = 0
+ALERT_CHANNEL = 1
+PRIME_CHANNEL = 2  # Тишина прогрева: ее остановка по таймауту не заденет рингтон
+RESERVED_CHANNELS = 3
+
+# Бюджет задержки от play() до начала микширования, мс
+LATENCY_BUDGET_MS = 20.0
+
+
+class PlaybackEngine:
+    """
+    Обертка над pygame.mixer: start() открывает микшер, play_ringtone()
+    и play_alert() играют на своих каналах и возвращают канал (у него есть stop()).
+    """
+
+    def __init__(self, buffer=DEFAULT_BUFFER, frequency=DEFAULT_FREQUENCY, size=DEFAULT_SIZE,
+                 channels=DEFAULT_CHANNELS, latency_budget_ms=LATENCY_BUDGET_MS):
+        import pygame
+        self.pygame = pygame
+        self.buffer = buffer
+        self.frequency = frequency
+        self.size = size
+        self.channels = channels
+        self.latency_budget_ms = latency_budget_ms
+        self.ringtone_channel = None
+        self.alert_channel = None
+        self.prime_channel = None
+        self.primed_latency_ms = None
+        self._prime_thread = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Размер буфера и бюджет задержки можно задать в config.json ('audio_buffer', 'audio_latency_budget_ms')."""
+        return cls(buffer=int(config.get('audio_buffer', DEFAULT_BUFFER)),
+                   latency_budget_ms=float(config.get('audio_latency_budget_ms', LATENCY_BUDGET_MS)))
+
+    @property
+    def buffer_ms(self):
+        """Длительность одного буфера устройства, мс."""
+        return self.buffer / self.frequency * 1000
+
+    def start(self):
+        mixer = self.pygame.mixer
+        mixer.pre_init(self.frequency, self.size, self.channels, self.buffer)
+        mixer.init(self.frequency, self.size, self.channels, self.buffer)
+        mixer.set_num_channels(NUM_CHANNELS)
+        # Зарезервированные каналы не достаются Sound.play() без явного канала
+        mixer.set_reserved(RESERVED_CHANNELS)
+        self.ringtone_channel = mixer.Channel(RINGTONE_CHANNEL)
+        self.alert_channel = mixer.Channel(ALERT_CHANNEL)
+        self.prime_channel = mixer.Channel(PRIME_CHANNEL)
+        self._prime_thread = threading.Thread(target=self._prime_in_background, name="PlaybackPrime",
+                                              daemon=True)
+        self._prime_thread.start()
+        return self
+
+    def _prime_in_background(self):
+        try:
+            self.prime()
+        except self.pygame.error as e:
+            # Микшер закрыли раньше, чем закончилось измерение
+            log.debug("Прогрев микшера прерван: %s", e)
+
+    def prime(self):
+        """Запускает звуковой поток тишиной и измеряет задержку микширования."""
+        latency = self.measure_latency(self.prime_channel)
+        self.primed_latency_ms = latency
+        if latency is None:
+            log.warning("⚠️ Не удалось измерить задержку воспроизведения")
+        elif latency > self.latency_budget_ms:
+            log.warning("⚠️ Задержка воспроизведения %.1f мс больше бюджета %.0f мс (буфер %d)",
+                        latency, self.latency_budget_ms, self.buffer)
+        else:
+            log.info("🔈 Микшер готов: буфер %d (%.1f мс), задержка %.1f мс",
+                     self.buffer, self.buffer_ms, latency)
+        return latency
+
+    def measure_latency(self, channel, timeout=0.5):
+        """
+        Время от play() до того, как микшер забрал звук длиной в один отсчет, мс.
+        Задержку самого устройства (около одного буфера) сюда надо прибавлять отдельно.
+        """
+        frame = abs(self.size) // 8 * self.channels
+        silence = self.pygame.mixer.Sound(buffer=bytes(frame))
+        started = time.perf_counter()
+        channel.play(silence)
+        while channel.get_busy():
+            if time.perf_counter() - started > timeout:
+                channel.stop()
+                return None
+            time.sleep(0.0002)
+        return (time.perf_counter() - started) * 1000
+
+    def play_ringtone(self, sound, loops=-1):
+        """Рингтон на своем канале; предыдущий звук канала заменяется сразу."""
+        self.ringtone_channel.play(sound, loops=loops)
+        return self.ringtone_channel
+
+    def stop_ringtone(self):
+        if self.ringtone_channel is not None:
+            self.ringtone_channel.stop()
+
+    def play_alert(self, sound):
+        self.alert_channel.play(sound)
+        return self.alert_channel
+
+    def stop(self):
+        self.pygame.mixer.quit()
+        self.ringtone_channel = None
+        self.alert_channel = None
+        self.prime_channel = None
@@ -0,0 +1,182 @@
+# poll_scheduler.py
+"""
+Адаптивный интервал цикла мониторинга.
+
+Пока звонит входящий или набирается исходящий, окно опрашивается часто:
+каждый пропущенный интервал добавляется ко времени ответа. Во время
+разговора хватает обычного интервала, а без звонков интервал растет в
+backoff раз за тик до idle_max и сбрасывается к idle_min при любом
+изменении TMemo или событии звонка. С источником событий TMemo (WinEvent
+хуки установлены) изменения будят цикл сразу и опрос - только страховка:
+интервал не меньше fallback. Пока звонит входящий или набирается
+исходящий, интервал fast и с хуками: событие, пропущенное хуком, стоило бы
+секунд ответа, а звонок короткий. Без событий входящий замечается только опросом, поэтому
+откат короче - до poll_idle_max (0.75 с): тиков без звонка на треть
+меньше, чем при прежних 0.5 с, а любое изменение TMemo, найденное
+опросом, сразу возвращает интервал к idle_min. Цена - входящий замечается
+в среднем на ~0.1 с позже (python benchmarks.py polling). Пока телефон
+не запущен, процесс ищется раз в search секунд.
+
+Интервалы (сек) задаются ключом 'polling' в config.json, недостающие
+берутся по умолчанию:
+
+    "polling": {"fast": 0.1, "call": 0.5, "idle_min": 0.5, "idle_max": 3.0,
+                "poll_idle_max": 0.75, "backoff": 1.5, "fallback": 2.0, "search": 2.0,
+                "report": 3600}
+
+PollScheduler не спит сам и не читает системные часы напрямую: время
+берется из clock(), процессорное время потока - из cpu_clock(), поэтому с
+подставными часами решения детерминированы. stats() - фактическая частота
+тиков и процессорное время потока мониторинга; раз в report секунд они
+пишутся в журнал.
+"""
+import time
+
+from app_log import get_logger
+from call_state import INCOMING, OUTGOING, ACTIVE
+
+log = get_logger(__name__)
+
+FAST_INTERVAL = 0.1       # Входящий / исходящий
+CALL_INTERVAL = 0.5       # Разговор
+IDLE_MIN_INTERVAL = 0.5   # Без звонка: сразу после активности
+IDLE_MAX_INTERVAL = 3.0   # Без звонка: предел отката
+POLL_IDLE_MAX_INTERVAL = 0.75  # То же без источника событий TMemo
+IDLE_BACKOFF = 1.5
+FALLBACK_INTERVAL = 2.0   # Наименьший интервал при событиях TMemo
+SEARCH_INTERVAL = 2.0     # Телефон не запущен
+REPORT_INTERVAL = 3600.0
+
+DEFAULT_SETTINGS = {
+    'fast': FAST_INTERVAL,
+    'call': CALL_INTERVAL,
+    'idle_min': IDLE_MIN_INTERVAL,
+    'idle_max': IDLE_MAX_INTERVAL,
+    'poll_idle_max': POLL_IDLE_MAX_INTERVAL,
+    'backoff': IDLE_BACKOFF,
+    'fallback': FALLBACK_INTERVAL,
+    'search': SEARCH_INTERVAL,
+    'report': REPORT_INTERVAL,
+}
+
+# Режимы опроса
+MODE_FAST = 'fast'
+MODE_CALL = 'call'
+MODE_IDLE = 'idle'
+MODE_ABSENT = 'absent'
+MODES = (MODE_FAST, MODE_CALL, MODE_IDLE, MODE_ABSENT)
+
+
+class PollScheduler:
+    def __init__(self, settings=None, clock=time.monotonic, cpu_clock=time.thread_time):
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update({key: float(value) for key, value in (settings or {}).items()
+                              if key in DEFAULT_SETTINGS and value is not None})
+        for key in ('idle_max', 'poll_idle_max'):
+            if self.settings[key] < self.settings['idle_min']:
+                log.warning("⚠️ polling: %s меньше idle_min, используется idle_min", key)
+                self.settings[key] = self.settings['idle_min']
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self.mode = None
+        self.interval = None
+        self.idle_interval = self.settings['idle_min']
+        self.reset_stats()
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        return cls((config or {}).get('polling'), **kwargs)
+
+    @property
+    def search_interval(self):
+        return self.settings['search']
+
+    def reset_stats(self):
+        self.ticks = 0
+        self.ticks_by_mode = dict.fromkeys(MODES, 0)
+        self.started_at = None
+        self.cpu_started = None
+        self.cpu_seconds = 0.0
+        self.last_tick = None
+        self.last_report = None
+
+    def mode_for(self, states):
+        """Режим по состояниям машин активных профилей (пусто - телефон не запущен)"""
+        states = set(states)
+        if not states:
+            return MODE_ABSENT
+        if INCOMING in states or OUTGOING in states:
+            return MODE_FAST
+        if ACTIVE in states:
+            return MODE_CALL
+        return MODE_IDLE
+
+    def next_interval(self, states, events=True):
+        """
+        Тик цикла: сколько ждать до следующего опроса. events - изменения
+        TMemo приходят событиями (хуки источника установлены). Вызывается из потока мониторинга - там же
+        меряется его процессорное время.
+        """
+        mode = self.mode_for(states)
+        if mode == MODE_IDLE:
+            if self.mode == MODE_IDLE:
+                limit = self.settings['idle_max' if events else 'poll_idle_max']
+                self.idle_interval = min(limit, self.idle_interval * self.settings['backoff'])
+            else:
+                self.idle_interval = self.settings['idle_min']
+            interval = self.idle_interval
+        elif mode == MODE_ABSENT:
+            interval = self.settings['search']
+        else:
+            interval = self.settings[mode]
+        if events and mode not in (MODE_FAST, MODE_ABSENT):
+            interval = max(interval, self.settings['fallback'])
+        if mode != self.mode and self.mode is not None:
+            log.debug("⏱️ Опрос: %s -> %s, интервал %.2f с", self.mode, mode, interval)
+        self.mode = mode
+        self.interval = interval
+        self._count_tick(mode)
+        return interval
+
+    def note_activity(self):
+        """Изменился TMemo или случилось событие звонка: откат без звонка начинается заново"""
+        self.idle_interval = self.settings['idle_min']
+        if self.mode == MODE_IDLE:
+            self.interval = self.idle_interval
+
+    def _count_tick(self, mode):
+        now = self.clock()
+        cpu = self.cpu_clock()
+        if self.started_at is None:
+            self.started_at = self.last_report = now
+            self.cpu_started = cpu
+        self.ticks += 1
+        self.ticks_by_mode[mode] += 1
+        self.cpu_seconds = cpu - self.cpu_started
+        self.last_tick = now
+        if now - self.last_report >= self.settings['report']:
+            self.last_report = now
+            self.log_stats()
+
+    def stats(self):
+        """Тики, фактическая частота (тиков/с) и процессорное время потока с первого тика"""
+        elapsed = (self.last_tick - self.started_at) if self.started_at is not None else 0.0
+        hours = elapsed / 3600
+        return {
+            'mode': self.mode,
+            'interval': self.interval,
+            'ticks': self.ticks,
+            'ticks_by_mode': dict(self.ticks_by_mode),
+            'elapsed': elapsed,
+            'rate': self.ticks / elapsed if elapsed > 0 else 0.0,
+            'cpu_seconds': self.cpu_seconds,
+            'cpu_per_hour': self.cpu_seconds / hours if hours > 0 else 0.0,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        by_mode = ", ".join(f"{mode} {count}" for mode, count in stats['ticks_by_mode'].items() if count)
+        log.info("📊 Опрос: %d тиков за %.0f с (%.2f/с; %s), CPU потока %.2f с (%.1f с/ч)",
+                 stats['ticks'], stats['elapsed'], stats['rate'], by_mode or "нет",
+                 stats['cpu_seconds'], stats['cpu_per_hour'])
+        return stats
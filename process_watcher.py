@@ -0,0 +1,248 @@
+# process_watcher.py
+"""
+Отслеживание процесса SIP-телефона.
+
+Пока процесс не найден, ProcessWatcher ищет его снимком Toolhelp32.
+Когда PID известен, снимки больше не делаются: отдельный поток ждет
+завершения процесса на его handle и сразу вызывает on_exit. Если handle
+открыть не удалось (нет прав на SYNCHRONIZE), watch() возвращает False, и
+CallMonitor проверяет процесс снимком не чаще раза в search секунд.
+"""
+import time
+import ctypes
+import threading
+from ctypes import wintypes
+
+from app_log import get_logger
+
+log = get_logger(__name__)
+
+# Windows API константы
+TH32CS_SNAPPROCESS = 0x00000002
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value  # Как его вернет restype HANDLE
+SYNCHRONIZE = 0x00100000
+WAIT_OBJECT_0 = 0x00000000
+WAIT_TIMEOUT = 0x00000102
+INFINITE = 0xFFFFFFFF
+
+
+# Структуры для Windows API
+class PROCESSENTRY32(ctypes.Structure):
+    _fields_ = [
+        ('dwSize', wintypes.DWORD),
+        ('cntUsage', wintypes.DWORD),
+        ('th32ProcessID', wintypes.DWORD),
+        ('th32DefaultHeapID', ctypes.POINTER(wintypes.ULONG)),
+        ('th32ModuleID', wintypes.DWORD),
+        ('cntThreads', wintypes.DWORD),
+        ('th32ParentProcessID', wintypes.DWORD),
+        ('pcPriClassBase', wintypes.LONG),
+        ('dwFlags', wintypes.DWORD),
+        ('szExeFile', wintypes.CHAR * 260)
+    ]
+
+
+def load_kernel32():
+    """
+    Свой экземпляр kernel32 с restype/argtypes: без них ctypes считает
+    результат int и на 64-битном Python обрезает HANDLE. Общий
+    ctypes.windll.kernel32 не меняем - его используют другие модули.
+    """
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    signatures = {
+        'CreateToolhelp32Snapshot': (wintypes.HANDLE, [wintypes.DWORD, wintypes.DWORD]),
+        'Process32First': (wintypes.BOOL, [wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32)]),
+        'Process32Next': (wintypes.BOOL, [wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32)]),
+        'OpenProcess': (wintypes.HANDLE, [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]),
+        'CreateEventW': (wintypes.HANDLE, [wintypes.LPVOID, wintypes.BOOL, wintypes.BOOL, wintypes.LPCWSTR]),
+        'SetEvent': (wintypes.BOOL, [wintypes.HANDLE]),
+        'WaitForSingleObject': (wintypes.DWORD, [wintypes.HANDLE, wintypes.DWORD]),
+        'WaitForMultipleObjects': (wintypes.DWORD, [wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE),
+                                                    wintypes.BOOL, wintypes.DWORD]),
+        'CloseHandle': (wintypes.BOOL, [wintypes.HANDLE]),
+    }
+    for name, (restype, argtypes) in signatures.items():
+        function = getattr(kernel32, name)
+        function.restype = restype
+        function.argtypes = argtypes
+    return kernel32
+
+
+class ProcessWatcher:
+    """
+    Базовый интерфейс.
+    find_process() - поиск PID по имени (дорого, только пока процесса нет),
+    find_processes(names) - один поиск сразу для нескольких имен (профилей),
+    watch(pid, on_exit) - подписка на завершение найденного процесса
+    (False - подписаться не удалось), is_running() - дешевая проверка
+    наблюдаемого процесса.
+    """
+
+    def __init__(self, process_name):
+        self.process_name = process_name
+        self.snapshot_scans = 0
+        self.exit_notifications = 0
+
+    def find_process(self):
+        raise NotImplementedError
+
+    def find_processes(self, names):
+        """{имя в нижнем регистре: [PID, ...]} для всех запущенных процессов из names."""
+        name = self.process_name.lower()
+        if name not in {n.lower() for n in names}:
+            return {}
+        pid = self.find_process()
+        return {name: [pid]} if pid is not None else {}
+
+    def watch(self, pid, on_exit):
+        raise NotImplementedError
+
+    def unwatch(self):
+        pass
+
+    def is_running(self):
+        raise NotImplementedError
+
+
+class Win32ProcessWatcher(ProcessWatcher):
+    """Реализация на Toolhelp32 и ожидании handle процесса."""
+
+    def __init__(self, process_name):
+        super().__init__(process_name)
+        self.kernel32 = load_kernel32()
+        self.CreateToolhelp32Snapshot = self.kernel32.CreateToolhelp32Snapshot
+        self.Process32First = self.kernel32.Process32First
+        self.Process32Next = self.kernel32.Process32Next
+        self.CloseHandle = self.kernel32.CloseHandle
+        # Имя сравниваем в байтах, чтобы не декодировать каждую запись снимка
+        self._target = process_name.lower().encode('ascii')
+        self._pid = None
+        self._handle = None
+        self._cancel = None
+        self._thread = None
+
+    def find_process(self):
+        """Ищет процесс снимком Toolhelp32. Возвращает PID или None."""
+        pids = self._scan({self._target}, first_only=True).get(self._target)
+        return pids[0] if pids else None
+
+    def find_processes(self, names):
+        """Один снимок Toolhelp32 на все имена; PID каждого имени - по возрастанию."""
+        targets = {name.lower().encode('ascii'): name.lower() for name in names}
+        found = self._scan(set(targets))
+        return {targets[target]: sorted(pids) for target, pids in found.items()}
+
+    def _scan(self, targets, first_only=False):
+        """{имя в байтах: [PID, ...]} по одному снимку процессов."""
+        self.snapshot_scans += 1
+        snapshot = self.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+        if snapshot == INVALID_HANDLE_VALUE:
+            raise OSError("Не удалось создать снимок процессов")
+        found = {}
+        try:
+            pe32 = PROCESSENTRY32()
+            pe32.dwSize = ctypes.sizeof(PROCESSENTRY32)
+            if self.Process32First(snapshot, ctypes.byref(pe32)):
+                while True:
+                    name = pe32.szExeFile.lower()
+                    if name in targets:
+                        found.setdefault(name, []).append(pe32.th32ProcessID)
+                        if first_only:
+                            break
+                    if not self.Process32Next(snapshot, ctypes.byref(pe32)):
+                        break
+        finally:
+            self.CloseHandle(snapshot)
+        return found
+
+    def watch(self, pid, on_exit):
+        if pid == self._pid and self._handle:
+            return True
+        self.unwatch()
+        handle = self.kernel32.OpenProcess(SYNCHRONIZE, False, pid)
+        if not handle:
+            # Нет прав на handle: процесс будет проверяться снимком
+            log.warning("⚠️ Не удалось открыть процесс %s для ожидания завершения (ошибка %s)",
+                        pid, ctypes.get_last_error())
+            return False
+        self._pid = pid
+        self._handle = handle
+        self._cancel = self.kernel32.CreateEventW(None, True, False, None)
+        self._thread = threading.Thread(target=self._wait_exit, args=(handle, self._cancel, on_exit),
+                                        daemon=True)
+        self._thread.start()
+        return True
+
+    def _wait_exit(self, handle, cancel, on_exit):
+        handles = (wintypes.HANDLE * 2)(handle, cancel)
+        result = self.kernel32.WaitForMultipleObjects(2, handles, False, INFINITE)
+        if result == WAIT_OBJECT_0:
+            self.exit_notifications += 1
+            on_exit()
+
+    def unwatch(self):
+        if self._thread:
+            self.kernel32.SetEvent(self._cancel)
+            self._thread.join(1.0)
+            self._thread = None
+        for handle in (self._handle, self._cancel):
+            if handle:
+                self.CloseHandle(handle)
+        self._handle = None
+        self._cancel = None
+        self._pid = None
+
+    def is_running(self):
+        if not self._handle:
+            return False
+        return self.kernel32.WaitForSingleObject(self._handle, 0) == WAIT_TIMEOUT
+
+
+class FakeProcessWatcher(ProcessWatcher):
+    """
+    Фейковый наблюдатель для тестов без Windows.
+    start_process()/stop_process() имитируют запуск и закрытие телефона,
+    stopped_at хранит момент закрытия для измерения задержки реакции.
+    fail_watch - watch() не удается, как без прав на handle процесса.
+    """
+
+    def __init__(self, process_name='sipphone.exe', clock=time.perf_counter):
+        super().__init__(process_name)
+        self.clock = clock
+        self.pid = None
+        self.stopped_at = None
+        self._watched = None
+        self._on_exit = None
+        self.fail_watch = False
+        self.watch_attempts = 0
+
+    def start_process(self, pid=1000):
+        self.pid = pid
+        self.stopped_at = None
+
+    def stop_process(self):
+        self.stopped_at = self.clock()
+        self.pid = None
+        on_exit, self._on_exit = self._on_exit, None
+        if on_exit:
+            self.exit_notifications += 1
+            on_exit()
+
+    def find_process(self):
+        self.snapshot_scans += 1
+        return self.pid
+
+    def watch(self, pid, on_exit):
+        self.watch_attempts += 1
+        if self.fail_watch:
+            return False
+        self._watched = pid
+        self._on_exit = on_exit
+        return True
+
+    def unwatch(self):
+        self._watched = None
+        self._on_exit = None
+
+    def is_running(self):
+        return self._watched is not None and self._watched == self.pid
@@ -0,0 +1,224 @@
+# ringtone_cache.py
+"""
+Кэш рингтонов: декодирование в фоне, PCM на диске и общий лимит памяти.
+
+Рингтон декодируется один раз: готовый PCM (в формате микшера) сохраняется
+на диск под хэшем содержимого файла, и при следующих запусках звук создается
+из него без декодирования MP3/OGG. Длинный файл обрезается до фрагмента
+для повтора (не длиннее max_loop_seconds) с коротким затуханием в конце.
+Все загруженные рингтоны (например, по одному на направление) делят общий
+лимит памяти: при превышении из памяти уходят давно не использованные, их PCM
+остается на диске.
+"""
+import os
+import sys
+import queue
+import array
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+from app_log import get_logger
+
+log = get_logger(__name__)
+
+# Лимит памяти на все рингтоны и максимальная длина фрагмента для повтора
+DEFAULT_BUDGET_BYTES = 32 * 1024 * 1024
+MAX_LOOP_SECONDS = 30
+FADE_OUT_SECONDS = 0.02
+
+# Рингтон в памяти: звук, размер PCM, ключ кэша, был ли обрезан
+CachedRingtone = namedtuple('CachedRingtone', ['sound', 'nbytes', 'key', 'trimmed'])
+
+
+def default_cache_dir():
+    """Каталог PCM-кэша: LOCALAPPDATA на Windows, иначе ~/.cache."""
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        base = os.environ['LOCALAPPDATA']
+    else:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'SIP-Helper', 'ringtones')
+
+
+class PygameBackend:
+    """Декодирование и создание звуков через pygame.mixer (микшер уже инициализирован)."""
+
+    def __init__(self):
+        import pygame
+        self.pygame = pygame
+
+    def format(self):
+        """(частота, бит на отсчет со знаком, каналы) текущего микшера."""
+        return self.pygame.mixer.get_init()
+
+    def decode(self, path):
+        return self.pygame.mixer.Sound(path).get_raw()
+
+    def from_pcm(self, data):
+        return self.pygame.mixer.Sound(buffer=data)
+
+
+class RingtoneCache:
+    """
+    get(path) - рингтон из памяти или None, load(path) - загрузка в текущем
+    потоке, request(path, on_ready) - загрузка в фоновом потоке;
+    on_ready(path, sound, error) вызывается в этом потоке.
+    """
+
+    def __init__(self, cache_dir=None, budget_bytes=DEFAULT_BUDGET_BYTES,
+                 max_loop_seconds=MAX_LOOP_SECONDS, backend=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.budget_bytes = budget_bytes
+        self.max_loop_seconds = max_loop_seconds
+        self.backend = backend or PygameBackend()
+        self._lock = threading.Lock()
+        self._sounds = OrderedDict()  # path -> CachedRingtone, в порядке использования
+        self._queue = queue.Queue()
+        self._thread = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.decodes = 0
+        self.evictions = 0
+
+    def get(self, path):
+        with self._lock:
+            cached = self._sounds.get(path)
+            if cached is None:
+                return None
+            self._sounds.move_to_end(path)
+            self.hits += 1
+            return cached.sound
+
+    def request(self, path, on_ready=None):
+        """Ставит загрузку в очередь фонового потока. Если рингтон уже в памяти, возвращает его."""
+        sound = self.get(path)
+        if sound is not None:
+            if on_ready is not None:
+                on_ready(path, sound, None)
+            return sound
+        self._queue.put((path, on_ready))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="RingtoneLoader", daemon=True)
+                self._thread.start()
+        return None
+
+    def _run(self):
+        while True:
+            try:
+                path, on_ready = self._queue.get(timeout=5)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            sound, error = None, None
+            try:
+                sound = self.load(path)
+            except Exception as e:
+                error = e
+                log.warning("⚠️ Ошибка загрузки рингтона %s: %s", path, e)
+            if on_ready is not None:
+                try:
+                    on_ready(path, sound, error)
+                except Exception as e:
+                    log.warning("⚠️ Ошибка обработчика загрузки рингтона: %s", e)
+
+    def load(self, path):
+        """Рингтон из памяти, из PCM-кэша на диске или после декодирования."""
+        sound = self.get(path)
+        if sound is not None:
+            return sound
+
+        fmt = self.backend.format()
+        key = f"{file_hash(path)}-{fmt[0]}-{abs(fmt[1])}-{fmt[2]}"
+        pcm_path = os.path.join(self.cache_dir, key + '.pcm')
+        trimmed = False
+        try:
+            with open(pcm_path, 'rb') as f:
+                data = f.read()
+            self.disk_hits += 1
+        except FileNotFoundError:
+            data = self.backend.decode(path)
+            self.decodes += 1
+            data, trimmed = self._trim(data, fmt)
+            self._write_pcm(pcm_path, data)
+
+        sound = self.backend.from_pcm(data)
+        with self._lock:
+            self._sounds[path] = CachedRingtone(sound, len(data), key, trimmed)
+            self._sounds.move_to_end(path)
+            self._evict(keep=path)
+        if trimmed:
+            log.info("✂️ Рингтон %s обрезан до %s с для повтора", os.path.basename(path), self.max_loop_seconds)
+        return sound
+
+    def _trim(self, data, fmt):
+        """Обрезает PCM до фрагмента для повтора и лимита памяти, с затуханием в конце."""
+        frequency, bits, channels = fmt
+        frame = abs(bits) // 8 * channels
+        limit = min(int(self.max_loop_seconds * frequency) * frame, self.budget_bytes)
+        limit -= limit % frame
+        if len(data) <= limit:
+            return data, False
+        data = bytearray(data[:limit])
+        if bits == -16:
+            fade_frames = min(int(FADE_OUT_SECONDS * frequency), limit // frame)
+            tail = array.array('h', bytes(data[limit - fade_frames * frame:]))
+            samples = fade_frames * channels
+            for i in range(samples):
+                tail[i] = int(tail[i] * (samples - i) / samples)
+            data[limit - fade_frames * frame:] = tail.tobytes()
+        return bytes(data), True
+
+    def _write_pcm(self, pcm_path, data):
+        """Атомарная запись PCM: оборванная запись не оставит битый файл в кэше."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.pcm-', suffix='.tmp', dir=self.cache_dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, pcm_path)
+        except OSError as e:
+            # Без дискового кэша рингтон просто декодируется при следующем запуске
+            log.warning("⚠️ Не удалось сохранить PCM рингтона: %s", e)
+
+    def _evict(self, keep):
+        while self.used_bytes() > self.budget_bytes and len(self._sounds) > 1:
+            path = next(iter(self._sounds))
+            if path == keep:
+                break
+            del self._sounds[path]
+            self.evictions += 1
+            log.info("♻️ Рингтон %s выгружен из памяти (лимит)", os.path.basename(path))
+
+    def discard(self, path):
+        with self._lock:
+            self._sounds.pop(path, None)
+
+    def used_bytes(self):
+        return sum(cached.nbytes for cached in self._sounds.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ringtones': len(self._sounds),
+                'used_bytes': self.used_bytes(),
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'decodes': self.decodes,
+                'evictions': self.evictions,
+            }
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-1 содержимого файла: ключ PCM-кэша не зависит от имени и пути."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,110 @@
+# session_registry.py
+"""
+Индекс аудиосессий по PID и имени исполняемого файла.
+
+Сессии перечисляются один раз, дальше индекс меняется только по уведомлениям
+о создании сессии (IAudioSessionNotification) и ее завершении
+(IAudioSessionEvents). Mute находит сессии sipphone.exe поиском в dict, без
+перебора всех сессий и запроса имени процесса для каждой при каждом звонке.
+Модуль не зависит от COM: источник уведомлений подключает audio_manager.
+"""
+import threading
+from collections import namedtuple
+
+# key - InstanceIdentifier сессии, volume - ISimpleAudioVolume, session - обертка pycaw
+SessionEntry = namedtuple('SessionEntry', ['key', 'pid', 'name', 'volume', 'session'])
+
+
+class SessionIndex:
+    """
+    Индекс key -> SessionEntry с поиском по PID и по имени процесса.
+    process_name_of(pid) возвращает имя exe; результат кэшируется на PID,
+    пока у процесса есть сессии.
+    """
+
+    def __init__(self, process_name_of):
+        self.process_name_of = process_name_of
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._by_pid = {}  # PID -> множество key
+        self._by_name = {}  # имя в нижнем регистре -> множество key
+        self._names = {}  # PID -> имя
+        self.loaded = False
+
+    def name_of(self, pid):
+        """Имя exe процесса (в нижнем регистре) или None, если процесса уже нет."""
+        name = self._names.get(pid)
+        if name is None:
+            try:
+                name = self.process_name_of(pid).lower()
+            except Exception:
+                return None
+            self._names[pid] = name
+        return name
+
+    def load(self, entries):
+        """Первичное заполнение результатом полного перечисления."""
+        with self._lock:
+            self._entries = {}
+            self._by_pid = {}
+            self._by_name = {}
+            for entry in entries:
+                self._add(entry)
+            self.loaded = True
+
+    def add(self, entry):
+        """Добавляет сессию; сессия с тем же key заменяется. Возвращает замененную."""
+        with self._lock:
+            old = self._remove(entry.key)
+            self._add(entry)
+        return old
+
+    def _add(self, entry):
+        self._entries[entry.key] = entry
+        self._by_pid.setdefault(entry.pid, set()).add(entry.key)
+        self._by_name.setdefault(entry.name, set()).add(entry.key)
+
+    def remove(self, key):
+        """Убирает сессию (завершилась или отключена). Возвращает ее или None."""
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        for index, value in ((self._by_pid, entry.pid), (self._by_name, entry.name)):
+            keys = index.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[value]
+        if entry.pid not in self._by_pid:
+            # PID может достаться другому процессу
+            self._names.pop(entry.pid, None)
+        return entry
+
+    def clear(self):
+        """Убирает все сессии (например, сменилось устройство по умолчанию). Возвращает их."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries = {}
+            self._by_pid = {}
+            self._by_name = {}
+            self._names = {}
+            self.loaded = False
+        return entries
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def by_pid(self, pid):
+        with self._lock:
+            return [self._entries[key] for key in self._by_pid.get(pid, ())]
+
+    def by_name(self, name):
+        with self._lock:
+            return [self._entries[key] for key in self._by_name.get(name.lower(), ())]
+
+    def __len__(self):
+        return len(self._entries)
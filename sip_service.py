@@ -0,0 +1,131 @@
+# sip_service.py
+"""
+SIP Helper без GUI: фоновый сервис на том же ядре, что и окно.
+
+    python sip_service.py [--config config.json] [--ring]
+
+Следит за софтфонами профилей (CallMonitor), переключает гарнитуру и динамики
+и пишет историю звонков (CallAudioController). PyQt5 не загружается;
+pygame - только с --ring (свой рингтон из 'ringtone' в config.json и
+рингтоны направлений из 'routing' вместо звонка телефона). Останавливается по Ctrl+C / SIGTERM, возвращая динамики.
+"""
+import sys
+import time
+import signal
+import argparse
+import threading
+
+import app_log
+import config_store
+import metrics
+import audio_manager
+from monitor_core import CallMonitor
+from monitor_profiles import load_profiles
+from poll_scheduler import PollScheduler
+from trace_replay import TraceRecorder
+from call_audio import CallAudioController
+from call_routing import RoutingTable
+from call_history import CallHistoryStore, DB_FILE
+
+CONFIG_FILE = 'config.json'
+log = app_log.get_logger('sip_service')
+
+
+def create_ringer(config, routing):
+    """
+    Микшер, общий рингтон из config.json и рингтоны направлений (декодируются
+    сразу, в памяти их держит только RingtoneCache под своим лимитом: звук
+    берется из кэша на каждый звонок). Возвращает (ring, playback) или
+    (None, None), если общий рингтон не задан или не загрузился.
+    """
+    path = config.get('ringtone')
+    if not path:
+        log.warning("⚠️ --ring: в конфигурации нет 'ringtone', звонит сам телефон")
+        return None, None
+    from playback import PlaybackEngine
+    from ringtone_cache import RingtoneCache
+    playback = PlaybackEngine.from_config(config).start()
+    cache = RingtoneCache()
+    try:
+        cache.load(path)
+    except Exception as e:
+        log.warning("⚠️ Не удалось загрузить рингтон %s: %s", path, e)
+        playback.stop()
+        return None, None
+    log.info("🎵 Рингтон: %s", path)
+    for route_path in routing.ringtones():
+        try:
+            cache.load(route_path)
+            log.info("🎵 Рингтон направления: %s", route_path)
+        except Exception as e:
+            log.warning("⚠️ Не удалось загрузить рингтон направления %s: %s", route_path, e)
+
+    def ring(route=None):
+        # Выгруженный по лимиту рингтон направления догружается в фоне, пока звучит общий;
+        # выгруженный общий читается из PCM на диске
+        sound = cache.request(route.ringtone) if route is not None and route.ringtone else None
+        if sound is None:
+            try:
+                sound = cache.load(path)
+            except Exception as e:
+                log.warning("⚠️ Не удалось загрузить рингтон %s: %s", path, e)
+                return None
+        return playback.play_ringtone(sound)
+
+    return ring, playback
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SIP Helper: фоновый сервис без GUI")
+    parser.add_argument('--config', default=CONFIG_FILE, help="файл конфигурации")
+    parser.add_argument('--ring', action='store_true', help="глушить телефон и играть свой рингтон")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    store = config_store.get_store(args.config)
+    app_log.setup(store.get_value('log_level', 'INFO'))
+    config = store.get()
+    metrics.configure(config)
+
+    history = CallHistoryStore(config.get('call_history_db', DB_FILE))
+    routing = RoutingTable.from_config(config)
+    ring, playback = create_ringer(config, routing) if args.ring else (None, None)
+    profiles = load_profiles(config)
+    controller = CallAudioController(args.config, ring=ring, history=history, default_profile=profiles[0],
+                                     routing=routing, preswitch=bool(config.get('headset_preswitch')))
+    monitor = CallMonitor(profiles=profiles, scheduler=PollScheduler.from_config(config),
+                          trace=TraceRecorder.from_config(config))
+    monitor.add_listener(controller.handle_event)
+    audio_manager.prepare_session_index()
+
+    stopping = threading.Event()
+
+    def request_stop(signum, frame):
+        log.info("🛑 Получен сигнал %s, остановка", signum)
+        stopping.set()
+
+    for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), request_stop)
+
+    monitor.start()
+    log.info("🚀 Сервис запущен за %.0f мс", (time.perf_counter() - started) * 1000)
+    try:
+        # Ожидание с таймаутом: на Windows сигнал доставляется только между ожиданиями
+        while not stopping.wait(1.0):
+            pass
+    finally:
+        monitor.stop()
+        monitor.join(5)
+        controller.shutdown(profiles)
+        audio_manager.shutdown()
+        if playback is not None:
+            playback.stop()
+        history.close()
+        metrics.shutdown()
+        log.info("👋 Сервис остановлен")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# startup_timing.py
+"""
+Замер запуска по этапам.
+
+Модуль импортируется первым: момент импорта - начало отсчета. Время до
+него (запуск интерпретатора) берется из времени создания процесса, если
+доступен psutil. Этапы пишутся через `with startup.phase('init_ui'):`,
+вехи (окно показано, приложение готово) - через mark(). report() пишет
+в журнал таблицу: сколько занял каждый этап и какая доля от общего
+времени, и отправляет этапы в metrics как 'startup_<этап>'.
+"""
+import time
+from contextlib import contextmanager
+
+from app_log import get_logger
+import metrics
+
+log = get_logger(__name__)
+
+
+def process_age():
+    """Сколько секунд назад создан процесс (None, если не удалось узнать)."""
+    try:
+        import psutil
+        return max(0.0, time.time() - psutil.Process().create_time())
+    except Exception:
+        return None
+
+
+class StartupTimer:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started_at = clock()
+        self.interpreter_seconds = process_age()
+        self.phases = []  # (имя, начало от старта, длительность, в фоне), сек
+        self.marks = []   # (имя, время от старта), сек
+        self.reported = False
+
+    def elapsed(self):
+        return self.clock() - self.started_at
+
+    @contextmanager
+    def phase(self, name, background=False):
+        """background=True - этап в другом потоке, идет параллельно и не входит в сумму"""
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.phases.append((name, started - self.started_at, self.clock() - started, background))
+
+    def mark(self, name):
+        self.marks.append((name, self.elapsed()))
+
+    def report(self):
+        """Пишет разбивку запуска в журнал (один раз) и возвращает ее строками."""
+        total = self.elapsed()
+        lines = []
+        if self.interpreter_seconds is not None:
+            lines.append(f"  {'interpreter':<22} {self.interpreter_seconds * 1000:8.1f} мс (до импорта)")
+        accounted = 0.0
+        for name, offset, duration, background in self.phases:
+            if not background:
+                accounted += duration
+            lines.append(f"  {name:<22} {duration * 1000:8.1f} мс {duration / total * 100:5.1f}% "
+                         f"(с {offset * 1000:.0f} мс{', в фоне' if background else ''})")
+            metrics.observe(f"startup_{name}", duration)
+        lines.append(f"  {'(прочее)':<22} {(total - accounted) * 1000:8.1f} мс")
+        for name, at in self.marks:
+            lines.append(f"  ▸ {name:<20} на {at * 1000:8.1f} мс")
+        if not self.reported:
+            self.reported = True
+            log.info("🚀 Запуск за %.0f мс:\n%s", total * 1000, "\n".join(lines))
+        return lines
+
+
+# Общий замер процесса: отсчет от первого импорта модуля
+startup = StartupTimer()
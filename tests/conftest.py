@@ -0,0 +1,6 @@
+# conftest.py
+"""Модули приложения лежат в корне репозитория, рядом с каталогом tests."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
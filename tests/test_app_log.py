@@ -0,0 +1,85 @@
+# test_app_log.py
+"""RateLimitFilter: подавление повторов предупреждений и счетчик подавленных."""
+import logging
+
+import app_log
+from app_log import RateLimitFilter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def record(level, msg, *args, name='monitor_core'):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def make_filter(interval=30.0):
+    clock = FakeClock()
+    return RateLimitFilter(interval, clock=clock), clock
+
+
+def test_warning_repeats_suppressed_within_window():
+    rate_limit, clock = make_filter()
+    assert rate_limit.filter(record(logging.WARNING, "⚠️ Ошибка окна: %s", OSError("нет доступа")))
+    for _ in range(3):
+        clock.now += 5
+        assert not rate_limit.filter(record(logging.WARNING, "⚠️ Ошибка окна: %s", OSError("нет доступа")))
+    assert rate_limit.suppressed == 3
+
+
+def test_suppressed_count_reported_after_window():
+    rate_limit, clock = make_filter()
+    for _ in range(4):
+        rate_limit.filter(record(logging.ERROR, "❌ Ошибка %s", 5))
+        clock.now += 1
+    clock.now += 30
+    passed = record(logging.ERROR, "❌ Ошибка %s", 5)
+    assert rate_limit.filter(passed)
+    assert passed.getMessage() == "❌ Ошибка 5 (повторов подавлено: 3)"
+    # Счетчик начинается заново
+    clock.now += 31
+    again = record(logging.ERROR, "❌ Ошибка %s", 5)
+    assert rate_limit.filter(again)
+    assert again.getMessage() == "❌ Ошибка 5"
+
+
+def test_different_arguments_levels_and_loggers_not_duplicates():
+    rate_limit, _ = make_filter()
+    assert rate_limit.filter(record(logging.WARNING, "PID %s", 1))
+    assert rate_limit.filter(record(logging.WARNING, "PID %s", 2))
+    assert rate_limit.filter(record(logging.ERROR, "PID %s", 1))
+    assert rate_limit.filter(record(logging.WARNING, "PID %s", 1, name='audio_manager'))
+    assert rate_limit.suppressed == 0
+
+
+def test_info_and_debug_pass_through():
+    rate_limit, _ = make_filter()
+    for _ in range(5):
+        assert rate_limit.filter(record(logging.INFO, "🔔 Входящий %s", 'tv_tech'))
+        assert rate_limit.filter(record(logging.DEBUG, "тик"))
+    assert rate_limit.suppressed == 0
+
+
+def test_setup_writes_file_through_queue(tmp_path):
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    try:
+        app_log.setup('DEBUG', log_dir=str(tmp_path), console=False)
+        log = app_log.get_logger('test_app_log')
+        for _ in range(3):
+            log.warning("⚠️ Повтор")
+        log.info("✅ Готово")
+        app_log.shutdown()
+    finally:
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in handlers:
+            root.addHandler(handler)
+        root.setLevel(level)
+    lines = (tmp_path / app_log.LOG_FILE).read_text(encoding='utf-8').splitlines()
+    assert [line.split('] ', 1)[1] for line in lines] == ["⚠️ Повтор", "✅ Готово"]
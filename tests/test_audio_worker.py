@@ -0,0 +1,113 @@
+# test_audio_worker.py
+"""AudioWorker._apply_switches на фейковом IPolicyConfig: объединение запросов и пропуск лишних записей."""
+import pytest
+
+pytest.importorskip('comtypes')
+pytest.importorskip('pycaw')
+pytest.importorskip('psutil')
+
+import audio_manager  # noqa: E402
+from audio_manager import (AudioWorker, SwitchRequest, ROLE_CONSOLE, ROLE_MULTIMEDIA,  # noqa: E402
+                           ROLE_COMMUNICATIONS)
+
+HEADSET = '{headset}'
+SPEAKERS = '{speakers}'
+
+
+class Endpoint:
+    def __init__(self, device_id):
+        self.device_id = device_id
+
+    def GetId(self):
+        return self.device_id
+
+
+class FakeAudio:
+    """Устройства по умолчанию по ролям: перечислитель читает, IPolicyConfig пишет"""
+
+    def __init__(self, defaults):
+        self.defaults = dict(defaults)
+        self.writes = []
+        self.failing_roles = set()
+
+    def GetDefaultAudioEndpoint(self, flow, role):
+        return Endpoint(self.defaults[role])
+
+    def SetDefaultEndpoint(self, device_id, role):
+        if role in self.failing_roles:
+            raise OSError("E_ACCESSDENIED")
+        self.writes.append((device_id, role))
+        self.defaults[role] = device_id
+
+
+def make_worker(defaults):
+    audio = FakeAudio(defaults)
+    worker = AudioWorker()  # Поток не запускается: COM не нужен
+    worker.enumerator = audio
+    worker.policy_config = audio
+    return worker, audio
+
+
+ALL_SPEAKERS = {ROLE_CONSOLE: SPEAKERS, ROLE_MULTIMEDIA: SPEAKERS, ROLE_COMMUNICATIONS: SPEAKERS}
+
+
+def test_newest_request_per_role_wins():
+    worker, audio = make_worker(ALL_SPEAKERS)
+    first = SwitchRequest(HEADSET, 'Гарнитура')
+    second = SwitchRequest(SPEAKERS, 'Динамики', roles=[ROLE_CONSOLE, ROLE_MULTIMEDIA])
+    worker._apply_switches([first, second])
+    # Console/Multimedia уже на динамиках - писать нечего; Communications - от первого запроса
+    assert audio.writes == [(HEADSET, ROLE_COMMUNICATIONS)]
+    assert (first.result, first.superseded) == (True, False)
+    assert (second.result, second.superseded) == (True, False)
+    assert worker.skipped_writes == 2
+
+
+def test_fully_superseded_request_reports_false():
+    worker, audio = make_worker(ALL_SPEAKERS)
+    old = SwitchRequest(HEADSET, 'Гарнитура')
+    new = SwitchRequest(SPEAKERS, 'Динамики')
+    done = []
+    old.on_done = done.append
+    worker._apply_switches([old, new])
+    assert audio.writes == []
+    assert (old.result, old.superseded) == (False, True)
+    assert done == [old]
+    assert (new.result, new.superseded) == (True, False)
+
+
+def test_writes_only_roles_that_change():
+    worker, audio = make_worker({ROLE_CONSOLE: HEADSET, ROLE_MULTIMEDIA: SPEAKERS,
+                                 ROLE_COMMUNICATIONS: SPEAKERS})
+    request = SwitchRequest(HEADSET, 'Гарнитура')
+    worker._apply_switches([request])
+    assert audio.writes == [(HEADSET, ROLE_MULTIMEDIA), (HEADSET, ROLE_COMMUNICATIONS)]
+    assert request.result is True
+    assert worker.current_defaults == {ROLE_CONSOLE: HEADSET, ROLE_MULTIMEDIA: HEADSET,
+                                       ROLE_COMMUNICATIONS: HEADSET}
+    worker._apply_switches([SwitchRequest(HEADSET, 'Гарнитура')])
+    assert len(audio.writes) == 2  # Повтор ничего не пишет
+
+
+def test_partial_and_total_role_failures():
+    worker, audio = make_worker(ALL_SPEAKERS)
+    audio.failing_roles = {ROLE_COMMUNICATIONS}
+    partial = SwitchRequest(HEADSET, 'Гарнитура')
+    worker._apply_switches([partial])
+    assert partial.result is True
+    assert ROLE_COMMUNICATIONS not in worker.current_defaults
+
+    failed = SwitchRequest(HEADSET, 'Гарнитура', roles=[ROLE_COMMUNICATIONS])
+    worker._apply_switches([failed])
+    assert failed.result is False
+    assert worker.policy_config is None  # Пересоздается при следующем запросе
+
+
+def test_requests_for_other_roles_get_their_own_results():
+    worker, audio = make_worker(ALL_SPEAKERS)
+    audio.failing_roles = {ROLE_COMMUNICATIONS}
+    console = SwitchRequest(HEADSET, 'Гарнитура', roles=[ROLE_CONSOLE])
+    comms = SwitchRequest(HEADSET, 'Гарнитура', roles=[audio_manager.ROLE_COMMUNICATIONS])
+    worker._apply_switches([console, comms])
+    assert console.result is True
+    assert comms.result is False
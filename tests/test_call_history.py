@@ -0,0 +1,126 @@
+# test_call_history.py
+"""CallRecorder и CallHistoryStore на временной базе SQLite."""
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from call_history import CallHistoryStore, CallRecorder, KIND_INCOMING, KIND_OUTGOING
+
+# 2026-10-18 12:00 по местному времени: день в записях не зависит от пояса машины
+NOON = datetime(2026, 10, 18, 12, 0).timestamp()
+DAY = '2026-10-18'
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CallHistoryStore(str(tmp_path / 'history.sqlite3'), flush_interval=0.05)
+    yield store
+    store.close()
+
+
+def make_recorder(store):
+    clock = FakeClock()
+    return CallRecorder(store, clock=clock, wall_clock=lambda: NOON + clock.now), clock
+
+
+def rows(store, query):
+    store.flush()
+    with sqlite3.connect(store.path) as conn:
+        return conn.execute(query).fetchall()
+
+
+def test_answered_call_times_by_monotonic_clock(store):
+    recorder, clock = make_recorder(store)
+    recorder.incoming('tv_tech')
+    clock.now += 4.0
+    assert recorder.waiting_seconds() == 4.0
+    assert recorder.answered() == 4.0
+    clock.now += 1.0
+    assert recorder.answered() == 4.0  # Повторный ответ не сдвигает время
+    clock.now += 60.0
+    record = recorder.ended()
+    assert {key: record[key] for key in ('kind', 'direction', 'day', 'answered', 'answer_seconds',
+                                         'talk_seconds', 'total_seconds')} == {
+        'kind': KIND_INCOMING, 'direction': 'tv_tech', 'day': DAY, 'answered': 1,
+        'answer_seconds': 4.0, 'talk_seconds': 61.0, 'total_seconds': 65.0}
+    assert recorder.call is None
+    events = rows(store, "SELECT call_id, event, direction FROM call_events ORDER BY id")
+    assert events == [(record['call_id'], 'incoming', 'tv_tech'), (record['call_id'], 'answered', 'tv_tech'),
+                      (record['call_id'], 'ended', 'tv_tech')]
+
+
+def test_missed_and_interrupted_calls(store):
+    recorder, clock = make_recorder(store)
+    assert recorder.answered() is None
+    assert recorder.ended() is None
+    recorder.incoming('tv_order')
+    clock.now += 10.0
+    recorder.outgoing()  # Новый звонок завершает неотвеченный
+    clock.now += 20.0
+    recorder.answered()
+    clock.now += 5.0
+    recorder.ended()
+    calls = rows(store, "SELECT kind, direction, answered, answer_seconds, total_seconds FROM calls "
+                        "ORDER BY started_at")
+    assert calls == [(KIND_INCOMING, 'tv_order', 0, None, 10.0), (KIND_OUTGOING, None, 1, 20.0, 25.0)]
+
+
+def test_profiles_starting_calls_on_same_tick_both_kept(store):
+    # Два профиля с одними часами: звонки начинаются в один и тот же момент
+    clock = FakeClock()
+    recorders = [CallRecorder(store, clock=clock, wall_clock=lambda: NOON) for _ in range(2)]
+    for recorder, direction in zip(recorders, ('tv_tech', 'tv_order')):
+        recorder.incoming(direction)
+    ids = {recorder.call['call_id'] for recorder in recorders}
+    for recorder in recorders:
+        recorder.ended()
+    assert len(ids) == 2
+    assert rows(store, "SELECT direction FROM calls ORDER BY direction") == [('tv_order',), ('tv_tech',)]
+
+
+def test_bad_row_does_not_drop_batch(store):
+    recorder, clock = make_recorder(store)
+    recorder.incoming('tv_tech')
+    clock.now += 3.0
+    record = recorder.ended()
+    store.append_call(dict(record))  # Повтор ключа в той же пачке
+    recorder.incoming('tv_order')
+    clock.now += 3.0
+    recorder.ended()
+    assert rows(store, "SELECT direction FROM calls ORDER BY direction") == [('tv_order',), ('tv_tech',)]
+    assert len(rows(store, "SELECT id FROM call_events")) == 4
+    assert store.rows_written == 6
+
+
+def test_answer_time_percentiles_and_missed_calls(store):
+    recorder, clock = make_recorder(store)
+    for waited in range(1, 21):  # tv_tech: ожидание 1..20 с
+        recorder.incoming('tv_tech')
+        clock.now += waited
+        recorder.answered()
+        recorder.ended()
+    for _ in range(3):
+        recorder.incoming('tv_order')
+        clock.now += 7
+        recorder.ended()
+    recorder.incoming('tv_order')
+    clock.now += 2
+    recorder.answered()
+    recorder.ended()
+    store.flush()
+    assert store.answer_time_percentiles() == [
+        {'day': DAY, 'direction': 'tv_order', 'count': 1, 'p50': 2.0, 'p90': 2.0, 'p95': 2.0, 'max': 2.0},
+        {'day': DAY, 'direction': 'tv_tech', 'count': 20, 'p50': 10.0, 'p90': 18.0, 'p95': 19.0, 'max': 20.0},
+    ]
+    assert store.missed_calls() == {(DAY, 'tv_order'): 3}
+    assert store.answer_time_percentiles(since='2026-10-19') == []
+    assert store.missed_calls(until='2026-10-17') == {}
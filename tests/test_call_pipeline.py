@@ -0,0 +1,147 @@
+# test_call_pipeline.py
+"""IncomingCallPipeline: порядок mute -> рингтон, таймаут mute и отмена."""
+import threading
+
+from call_pipeline import IncomingCallPipeline, STAGE_DETECT, STAGE_SLOT, STAGE_MUTE, STAGE_RING
+
+TIMEOUT = 5.0
+
+
+class Channel:
+    def __init__(self):
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+class Phone:
+    """mute() запоминает обработчик подтверждения; ring() пишет порядок вызовов"""
+
+    def __init__(self, confirm=None):
+        self.confirm = confirm  # None - подтверждение вызывает тест, иначе сразу с этим результатом
+        self.on_done = None
+        self.calls = []
+        self.channels = []
+        self.rung = threading.Event()
+
+    def mute(self, on_done):
+        self.calls.append('mute')
+        self.on_done = on_done
+        if self.confirm is not None:
+            on_done(self.confirm)
+
+    def ring(self):
+        self.calls.append('ring')
+        channel = Channel()
+        self.channels.append(channel)
+        self.rung.set()
+        return channel
+
+
+class StepClock:
+    """Часы, которые идут на 1 мс при каждом чтении"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.001
+        return self.now
+
+
+def make_pipeline(phone, mute_timeout=TIMEOUT):
+    return IncomingCallPipeline(phone.mute, phone.ring, clock=StepClock(), mute_timeout=mute_timeout)
+
+
+def test_ring_after_mute_confirmed():
+    phone = Phone()
+    pipeline = make_pipeline(phone)
+    trace = pipeline.start('tv_tech', detected_at=0.0)
+    assert phone.calls == ['mute']  # Рингтон ждет подтверждения
+    phone.on_done(True)
+    assert phone.calls == ['mute', 'ring']
+    assert trace.muted is True
+    assert list(trace.stages) == [STAGE_DETECT, STAGE_SLOT, STAGE_MUTE, STAGE_RING]
+    assert trace.stages[STAGE_DETECT] < trace.stages[STAGE_SLOT] < trace.stages[STAGE_MUTE] \
+        < trace.stages[STAGE_RING]
+    assert list(pipeline.traces) == [trace]
+    assert pipeline.time_to_ring_ms() == [trace.time_to_ring * 1000]
+
+
+def test_mute_confirmed_from_worker_thread():
+    phone = Phone()
+    pipeline = make_pipeline(phone)
+    trace = pipeline.start('tv_order')
+    worker = threading.Thread(target=phone.on_done, args=(True,))
+    worker.start()
+    worker.join(TIMEOUT)
+    assert phone.rung.is_set()
+    assert phone.calls == ['mute', 'ring']
+    assert trace.muted is True
+
+
+def test_ring_without_mute_after_timeout():
+    phone = Phone()
+    pipeline = make_pipeline(phone, mute_timeout=0.05)
+    trace = pipeline.start('tv_tech')
+    assert phone.rung.wait(TIMEOUT)
+    assert trace.muted is None
+    assert STAGE_MUTE not in trace.stages
+    # Опоздавшее подтверждение не запускает второй рингтон
+    phone.on_done(True)
+    assert phone.calls == ['mute', 'ring']
+
+
+def test_failed_mute_still_rings():
+    phone = Phone(confirm=False)
+    trace = make_pipeline(phone).start('tv_tech')
+    assert phone.calls == ['mute', 'ring']
+    assert trace.muted is False
+
+
+def test_mute_exception_still_rings():
+    phone = Phone()
+
+    def broken_mute(on_done):
+        raise OSError("нет сессии")
+
+    pipeline = IncomingCallPipeline(broken_mute, phone.ring, mute_timeout=TIMEOUT)
+    trace = pipeline.start('tv_tech')
+    assert phone.calls == ['ring']
+    assert trace.muted is False
+
+
+def test_cancel_before_mute_never_rings():
+    phone = Phone()
+    pipeline = make_pipeline(phone, mute_timeout=0.05)
+    trace = pipeline.start('tv_tech')
+    assert pipeline.cancel() is False
+    assert trace.cancelled
+    phone.on_done(True)
+    assert not phone.rung.wait(0.2)  # Ни подтверждение, ни таймаут
+    assert phone.calls == ['mute']
+
+
+def test_cancel_stops_ringing_channel():
+    phone = Phone(confirm=True)
+    pipeline = make_pipeline(phone)
+    trace = pipeline.start('tv_tech')
+    assert pipeline.cancel() is True
+    assert phone.channels[0].stopped
+    assert not trace.cancelled  # Рингтон успел зазвучать
+    assert pipeline.cancel() is False
+
+
+def test_new_call_replaces_previous():
+    phone = Phone()
+    pipeline = make_pipeline(phone)
+    first = pipeline.start('tv_tech')
+    first_done = phone.on_done
+    second = pipeline.start('tv_order')
+    first_done(True)  # Подтверждение прежнего вызова игнорируется
+    assert phone.calls == ['mute', 'mute']
+    phone.on_done(True)
+    assert phone.calls == ['mute', 'mute', 'ring']
+    assert first.cancelled and not second.cancelled
+    assert [trace.direction for trace in pipeline.traces] == ['tv_order']
@@ -0,0 +1,82 @@
+# test_call_routing.py
+"""RoutingTable и направления, которые профиль ищет в TMemo."""
+from call_routing import RoutingTable, LOWEST_PRIORITY
+from call_state import CallStateMachine, DEFAULT_DIRECTIONS, UNKNOWN_DIRECTION
+from monitor_profiles import MonitorProfile, load_profiles
+
+# Пример из описания call_routing
+RULES = [
+    {'direction': 'tv_tech', 'color': '#4CAF50'},
+    {'direction': 'tv_order', 'color': '#F44336', 'ringtone': 'sounds/order.mp3'},
+    {'direction': 'tv_pay_*', 'color': '#2196F3', 'headset': 'headset_2', 'priority': 5},
+]
+
+
+def test_exact_rule():
+    route = RoutingTable(RULES).route('tv_order')
+    assert (route.pattern, route.ringtone, route.color, route.priority) == \
+        ('tv_order', 'sounds/order.mp3', '#F44336', 1)
+
+
+def test_wildcard_rule_keeps_direction():
+    route = RoutingTable(RULES).route('tv_pay_tech')
+    assert (route.direction, route.pattern, route.headset, route.priority) == \
+        ('tv_pay_tech', 'tv_pay_*', 'headset_2', 5)
+
+
+def test_more_important_pattern_wins_over_exact():
+    table = RoutingTable([{'direction': 'tv_*', 'color': '#000000', 'priority': 0},
+                          {'direction': 'tv_tech', 'color': '#FFFFFF', 'priority': 3}])
+    assert table.route('tv_tech').pattern == 'tv_*'
+    assert table.rules[0].pattern == 'tv_*'
+
+
+def test_exact_wins_over_less_important_pattern():
+    table = RoutingTable([{'direction': 'tv_*', 'priority': 9}, {'direction': 'tv_tech', 'priority': 1}])
+    assert table.route('tv_tech').pattern == 'tv_tech'
+    assert table.route('tv_order').pattern == 'tv_*'
+
+
+def test_unmatched_and_unknown_fall_back():
+    table = RoutingTable(RULES)
+    for direction in ('sales', None, UNKNOWN_DIRECTION):
+        route = table.route(direction)
+        assert (route.direction, route.pattern, route.ringtone, route.color, route.headset) == \
+            (direction, None, None, None, None)
+        assert route.priority == LOWEST_PRIORITY
+
+
+def test_bad_rules_skipped_or_defaulted():
+    table = RoutingTable([{'color': '#000000'}, {'direction': 'tv_tech', 'priority': 'high'}])
+    assert [(route.pattern, route.priority) for route in table.rules] == [('tv_tech', 1)]
+
+
+def test_ringtones_without_repeats():
+    table = RoutingTable(RULES + [{'direction': 'tv_vip', 'ringtone': 'sounds/order.mp3'}])
+    assert table.ringtones() == ['sounds/order.mp3']
+
+
+def test_directions_keep_defaults_and_add_rules():
+    table = RoutingTable(RULES + [{'direction': 'sales', 'priority': -1}])
+    assert table.directions() == ['sales', 'tv_tech', 'tv_order', 'tv_pay_tech']
+    assert table.directions(['support']) == ['support', 'sales', 'tv_tech', 'tv_order']
+    assert RoutingTable([]).directions() == DEFAULT_DIRECTIONS
+
+
+def test_profile_finds_wildcard_direction_and_routes_it():
+    config = {'routing': RULES}
+    profile = MonitorProfile.from_config({'name': 'line1'}, config)
+    assert profile.matcher.directions == DEFAULT_DIRECTIONS
+    events = CallStateMachine(profile.matcher).feed("Входящий звонок tv_pay_tech 79001234567")
+    assert events == [('incoming_call', ('tv_pay_tech',))]
+    assert RoutingTable.from_config(config).route('tv_pay_tech').headset == 'headset_2'
+
+
+def test_profile_merges_configured_directions_with_rules():
+    config = {'directions': ['support'], 'routing': [{'direction': 'sales'}]}
+    line1, line2 = load_profiles(dict(config, profiles=[{'name': 'line1'},
+                                                        {'name': 'line2', 'directions': ['vip']}]))
+    assert line1.matcher.directions == ['support', 'sales']
+    assert line2.matcher.directions == ['vip', 'sales']
+    events = CallStateMachine(line1.matcher).feed("Входящий звонок sales")
+    assert events == [('incoming_call', ('sales',))]
@@ -0,0 +1,124 @@
+# test_call_state.py
+"""Таблица переходов CallStateMachine против прежнего analyze_call_state."""
+import pytest
+
+from call_state import (CallStateMachine, TRIGGER_INCOMING, TRIGGER_OUTGOING, TRIGGER_DURATION,
+                        TRIGGER_MIC_MUTED, DEFAULT_DIRECTIONS, UNKNOWN_DIRECTION)
+
+
+class LegacyAnalyzer:
+    """Прежний MonitorThread.analyze_call_state (до таблицы переходов), сигналы - в список"""
+
+    def __init__(self):
+        self.is_incoming_call = False
+        self.is_outgoing_call = False
+        self.is_call_active = False
+        self.current_direction = None
+        self.events = []
+
+    def analyze_call_state(self, memo_text):
+        has_incoming = TRIGGER_INCOMING in memo_text
+        has_outgoing = TRIGGER_OUTGOING in memo_text
+        has_duration = TRIGGER_DURATION in memo_text
+        has_mic_muted = TRIGGER_MIC_MUTED in memo_text
+
+        direction = None
+        if has_incoming or has_outgoing or has_duration or has_mic_muted:
+            for dir_name in DEFAULT_DIRECTIONS:
+                if dir_name in memo_text:
+                    direction = dir_name
+                    break
+
+        if has_incoming and not has_duration and not has_mic_muted:
+            if not self.is_incoming_call:
+                self.is_incoming_call = True
+                self.is_outgoing_call = False
+                self.current_direction = direction
+                self.events.append(('incoming_call', (direction if direction else UNKNOWN_DIRECTION,)))
+        elif has_outgoing and not has_duration and not has_mic_muted:
+            if not self.is_outgoing_call:
+                self.is_outgoing_call = True
+                self.is_incoming_call = False
+                self.current_direction = direction
+                self.events.append(('outgoing_call', ()))
+        elif has_duration or has_mic_muted:
+            if self.is_incoming_call and not self.is_call_active:
+                self.is_incoming_call = False
+                self.is_outgoing_call = False
+                self.is_call_active = True
+                self.events.append(('call_answered', ()))
+                self.events.append(('call_started', ()))
+            elif self.is_outgoing_call and not self.is_call_active:
+                self.is_outgoing_call = False
+                self.is_call_active = True
+                self.events.append(('call_started', ()))
+            elif not self.is_call_active:
+                self.is_call_active = True
+                self.is_incoming_call = False
+                self.is_outgoing_call = False
+                self.current_direction = direction
+                self.events.append(('call_started', ()))
+        else:
+            if self.is_incoming_call:
+                self.is_incoming_call = False
+                self.current_direction = None
+                self.events.append(('call_ended', ()))
+            elif self.is_outgoing_call:
+                self.is_outgoing_call = False
+                self.current_direction = None
+                self.events.append(('call_ended', ()))
+            elif self.is_call_active:
+                self.is_call_active = False
+                self.current_direction = None
+                self.events.append(('call_ended', ()))
+
+
+NOISE = "\r\n".join(["Регистрация на сервере успешна", "Соединение установлено 10.0.0.7",
+                     "Ожидание вызова", "Статус: готов, линия 1"])
+
+
+def memo(*lines):
+    """Текст TMemo как в записи смены: служебные строки и строки звонка"""
+    return "\r\n".join((NOISE,) + lines)
+
+
+# Последовательности текста TMemo из записанных смен
+RECORDED = {
+    'incoming_answered': [memo(), memo("Входящий звонок tv_order"),
+                          memo("Входящий звонок tv_order", "Длительность 00:01"),
+                          memo("Входящий звонок tv_order", "Длительность 00:42"), memo()],
+    'incoming_missed': [memo(), memo("Входящий звонок tv_tech"), memo("Входящий звонок tv_tech"), memo()],
+    'incoming_unknown_direction': [memo("Входящий звонок 79001234567"),
+                                   memo("Входящий звонок 79001234567", "Длительность 00:05"), memo()],
+    'two_directions_priority': [memo("Входящий звонок tv_pay_tech tv_tech"), memo()],
+    'outgoing_connected': [memo("Исходящий звонок"), memo("Исходящий звонок", "Длительность 00:00"), memo()],
+    'outgoing_cancelled': [memo("Исходящий звонок"), memo()],
+    'mic_muted_during_call': [memo("Входящий звонок tv_tech"),
+                              memo("Входящий звонок tv_tech", "МИКРОФОН ОТКЛЮЧЕН"),
+                              memo("Входящий звонок tv_tech", "Длительность 00:10"), memo()],
+    'call_already_active': [memo("Длительность 01:15"), memo("Длительность 01:16"), memo()],
+    'back_to_back_calls': [memo("Входящий звонок tv_tech"), memo(), memo("Входящий звонок tv_order"),
+                           memo("Входящий звонок tv_order", "Длительность 00:00"), memo(),
+                           memo("Исходящий звонок"), memo()],
+}
+
+
+@pytest.mark.parametrize('name', sorted(RECORDED))
+def test_transitions_match_legacy_analyzer(name):
+    legacy = LegacyAnalyzer()
+    machine = CallStateMachine()
+    events = []
+    for text in RECORDED[name]:
+        legacy.analyze_call_state(text)
+        events.extend(machine.feed(text))
+    assert events == legacy.events
+    assert events  # Каждая запись содержит хотя бы один переход
+
+
+def test_direction_kept_until_call_ends():
+    machine = CallStateMachine()
+    machine.feed(memo("Входящий звонок tv_order"))
+    machine.feed(memo("Входящий звонок tv_order", "Длительность 00:01"))
+    assert machine.direction == 'tv_order'
+    assert machine.feed(memo()) == [('call_ended', ())]
+    assert machine.direction is None
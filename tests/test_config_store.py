@@ -0,0 +1,114 @@
+# test_config_store.py
+"""ConfigStore: атомарная запись, перечитывание по mtime/размеру и поврежденный файл."""
+import json
+import os
+
+import pytest
+
+import config_store
+from config_store import ConfigStore
+
+
+def write_json(path, data, mtime_ns=None):
+    path.write_text(json.dumps(data), encoding='utf-8')
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_update_replaces_file_atomically(tmp_path, monkeypatch):
+    path = tmp_path / 'config.json'
+    write_json(path, {'volume': 50})
+    store = ConfigStore(str(path))
+    replaced = []
+    real_replace = os.replace
+
+    def spy_replace(src, dst):
+        replaced.append((os.path.basename(src), json.loads(open(src, encoding='utf-8').read())))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(config_store.os, 'replace', spy_replace)
+    assert store.update({'ringtone': 'ring.mp3'}) == {'volume': 50, 'ringtone': 'ring.mp3'}
+    name, written = replaced[0]
+    assert name.startswith('.config-') and name.endswith('.tmp')
+    assert written == {'volume': 50, 'ringtone': 'ring.mp3'}
+    assert json.loads(path.read_text(encoding='utf-8')) == written
+    assert [p.name for p in tmp_path.iterdir()] == ['config.json']  # Временный файл не остался
+
+
+def test_failed_write_keeps_old_file(tmp_path, monkeypatch):
+    path = tmp_path / 'config.json'
+    write_json(path, {'volume': 50})
+    store = ConfigStore(str(path))
+
+    def broken_replace(src, dst):
+        raise OSError("диск отключен")
+
+    monkeypatch.setattr(config_store.os, 'replace', broken_replace)
+    with pytest.raises(OSError):
+        store.update({'volume': 10})
+    assert json.loads(path.read_text(encoding='utf-8')) == {'volume': 50}
+    assert store.get() == {'volume': 50}
+    assert [p.name for p in tmp_path.iterdir()] == ['config.json']
+
+
+def test_reads_cached_until_signature_changes(tmp_path):
+    path = tmp_path / 'config.json'
+    write_json(path, {'volume': 50}, mtime_ns=1_000_000_000)
+    store = ConfigStore(str(path))
+    assert store.get_value('volume') == 50
+    assert store.get() == {'volume': 50}
+    assert store.reloads == 1
+
+    # Тот же размер, новый mtime
+    write_json(path, {'volume': 60}, mtime_ns=2_000_000_000)
+    assert store.get_value('volume') == 60
+    # Тот же mtime, другой размер
+    write_json(path, {'volume': 100}, mtime_ns=2_000_000_000)
+    assert store.get_value('volume') == 100
+    assert store.reloads == 3
+
+    # Подмена с тем же mtime и размером не замечается - так и задумано
+    write_json(path, {'volume': 200}, mtime_ns=2_000_000_000)
+    assert store.get_value('volume') == 100
+    assert store.reloads == 3
+
+
+def test_returned_config_is_a_copy(tmp_path):
+    path = tmp_path / 'config.json'
+    write_json(path, {'directions': ['tv_tech']})
+    store = ConfigStore(str(path))
+    store.get()['directions'].append('tv_order')
+    store.get_value('directions').append('tv_order')
+    assert store.get() == {'directions': ['tv_tech']}
+
+
+def test_corrupt_file_keeps_last_good_version(tmp_path):
+    path = tmp_path / 'config.json'
+    write_json(path, {'volume': 50}, mtime_ns=1_000_000_000)
+    store = ConfigStore(str(path))
+    assert store.get() == {'volume': 50}
+
+    path.write_text('{"volume": 7', encoding='utf-8')  # Оборванная запись стороннего редактора
+    assert store.get() == {'volume': 50}
+    assert store.reloads == 1
+
+    write_json(path, {'volume': 70}, mtime_ns=3_000_000_000)
+    assert store.get() == {'volume': 70}
+
+
+def test_corrupt_or_missing_file_on_start(tmp_path):
+    path = tmp_path / 'config.json'
+    store = ConfigStore(str(path))
+    assert not store.exists()
+    assert store.get() == {}
+    path.write_text('не json', encoding='utf-8')
+    assert store.get() == {}
+    assert store.update({'volume': 30}) == {'volume': 30}
+    assert json.loads(path.read_text(encoding='utf-8')) == {'volume': 30}
+
+
+def test_get_store_shares_instance_per_path(tmp_path):
+    path = tmp_path / 'config.json'
+    store = config_store.get_store(str(path))
+    assert config_store.get_store(os.path.join(str(tmp_path), '.', 'config.json')) is store
+    assert config_store.get_store(str(tmp_path / 'other.json')) is not store
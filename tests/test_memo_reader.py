@@ -0,0 +1,82 @@
+# test_memo_reader.py
+"""MemoReader на FakeEditApi и IncrementalMatch против полного поиска."""
+import random
+
+import pytest
+
+from call_state import TriggerMatcher, IncrementalMatch
+from memo_reader import MemoReader, FakeEditApi, READ_SKIPPED, READ_APPENDED, READ_FULL
+
+HWND = 1
+
+LINES = ["Регистрация на сервере успешна", "Ожидание вызова", "Входящий звонок tv_order",
+         "Входящий звонок tv_pay_tech tv_tech", "Длительность 00:07", "МИКРОФОН ОТКЛЮЧЕН",
+         "Исходящий звонок", "Статус: готов", ""]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def memo_edits(seed, steps=300):
+    """Текст TMemo смены: дописывание по кускам (триггер может разрезаться), очистка, замена"""
+    rng = random.Random(seed)
+    text = ""
+    for _ in range(steps):
+        roll = rng.random()
+        if roll < 0.05:
+            text = ""
+        elif roll < 0.1:
+            text = "\r\n".join(rng.sample(LINES, 3))
+        else:
+            line = rng.choice(LINES) + "\r\n"
+            cut = rng.randrange(len(line) + 1)
+            text += line[:cut]
+            yield text
+            text += line[cut:]
+        yield text
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_match_equals_full_rescan(seed):
+    matcher = TriggerMatcher()
+    incremental = IncrementalMatch(matcher)
+    previous = None
+    for text in memo_edits(seed):
+        appended_from = len(previous) if previous is not None and text.startswith(previous) else None
+        assert incremental.feed(text, appended_from) == matcher.match(text)
+        previous = text
+
+
+@pytest.mark.parametrize('wrap', [None, 12])
+def test_reader_follows_text_and_matches_like_full_read(wrap):
+    api = FakeEditApi(wrap=wrap)
+    reader = MemoReader(HWND, api, clock=FakeClock())
+    matcher = TriggerMatcher()
+    incremental = IncrementalMatch(matcher)
+    kinds = set()
+    for text in memo_edits(7):
+        api.texts[HWND] = text
+        assert reader.read() == text
+        assert incremental.feed(text, reader.appended_from) == matcher.match(text)
+        kinds.add(reader.last_read)
+    assert kinds == {READ_SKIPPED, READ_APPENDED, READ_FULL}
+
+
+def test_same_length_last_line_rewrite_is_read():
+    api = FakeEditApi()
+    reader = MemoReader(HWND, api, clock=FakeClock())
+    api.texts[HWND] = "Ожидание вызова\r\nДлительность 00:07"
+    reader.read()
+    assert reader.read() == api.texts[HWND]
+    assert reader.last_read == READ_SKIPPED
+
+    # Статус в последней строке заменен строкой той же длины
+    api.texts[HWND] = "Ожидание вызова\r\nДлительность 00:08"
+    assert reader.read() == api.texts[HWND]
+    assert reader.last_read == READ_FULL
+    assert reader.appended_from is None
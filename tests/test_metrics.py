@@ -0,0 +1,82 @@
+# test_metrics.py
+"""Histogram, текст Prometheus, снимок JSON и выключенный реестр."""
+import json
+import urllib.request
+
+import pytest
+
+from metrics import Histogram, MetricsRegistry, MetricsExporter, METRIC_NAME, _NULL_TIMER
+
+
+def test_bucket_counts_and_bounds():
+    histogram = Histogram(buckets=(0.001, 0.01, 0.1))
+    for value in (0.0005, 0.001, 0.002, 0.01, 0.05, 0.2, 3.0):
+        histogram.observe(value)
+    # Граница входит в свою корзину (le), последняя - больше верхней границы
+    assert histogram.counts == [2, 2, 1, 2]
+    assert histogram.count == 7
+    assert histogram.sum == pytest.approx(3.2635)
+    assert histogram.max == 3.0
+
+
+def test_percentiles_interpolate_within_bucket():
+    histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+    for value in (1.5, 1.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.percentile(50) == pytest.approx(1.625)
+    assert histogram.percentile(100) == 3.0  # Не выше наблюденного максимума
+    assert Histogram().percentile(95) == 0.0
+    snapshot = histogram.snapshot()
+    assert (snapshot['count'], snapshot['max']) == (5, 3.0)
+
+
+def test_prometheus_text_is_cumulative():
+    registry = MetricsRegistry()
+    registry.enabled = True
+    for value in (0.00002, 0.003, 0.003, 20.0):
+        registry.observe('memo_read', value)
+    registry.observe('check_process', 0.0001)
+    lines = registry.prometheus_text().splitlines()
+    assert lines[:2] == [f"# HELP {METRIC_NAME} Длительность этапов SIP Helper",
+                         f"# TYPE {METRIC_NAME} histogram"]
+    assert lines.index(f'{METRIC_NAME}_bucket{{stage="check_process",le="0.0001"}} 1') \
+        < lines.index(f'{METRIC_NAME}_bucket{{stage="memo_read",le="1e-05"}} 0')
+    assert f'{METRIC_NAME}_bucket{{stage="memo_read",le="2.5e-05"}} 1' in lines
+    assert f'{METRIC_NAME}_bucket{{stage="memo_read",le="0.005"}} 3' in lines
+    assert f'{METRIC_NAME}_bucket{{stage="memo_read",le="10.0"}} 3' in lines
+    assert f'{METRIC_NAME}_bucket{{stage="memo_read",le="+Inf"}} 4' in lines
+    assert f'{METRIC_NAME}_count{{stage="memo_read"}} 4' in lines
+    sums = [line for line in lines if line.startswith(f'{METRIC_NAME}_sum{{stage="memo_read"}}')]
+    assert float(sums[0].split()[-1]) == pytest.approx(20.00602)
+
+
+def test_disabled_registry_uses_null_timer():
+    registry = MetricsRegistry()
+    assert registry.timed('memo_read') is _NULL_TIMER
+    with registry.timed('memo_read'):
+        pass
+    registry.observe('memo_read', 1.0)
+    assert registry.snapshot() == {}
+
+    registry.enabled = True
+    with registry.timed('memo_read') as timer:
+        assert timer is not _NULL_TIMER
+    assert registry.snapshot()['memo_read']['count'] == 1
+
+
+def test_snapshot_file_and_http_endpoint(tmp_path):
+    registry = MetricsRegistry()
+    registry.enabled = True
+    registry.observe('window_connect', 0.2)
+    path = tmp_path / 'metrics.json'
+    exporter = MetricsExporter(registry, port=0, snapshot_path=str(path), interval=3600).start()
+    try:
+        port = exporter.server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode('utf-8')
+        assert f'{METRIC_NAME}_count{{stage="window_connect"}} 1' in body
+    finally:
+        exporter.stop()
+    data = json.loads(path.read_text(encoding='utf-8'))
+    assert data['stages']['window_connect']['count'] == 1
+    assert list(tmp_path.iterdir()) == [path]  # Временный файл не остался
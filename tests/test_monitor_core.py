@@ -0,0 +1,224 @@
+# test_monitor_core.py
+"""CallMonitor на фейковом источнике TMemo и фейковом процессе."""
+import time
+import threading
+
+import pytest
+
+from monitor_core import CallMonitor
+from memo_source import ScriptedMemoSource
+from process_watcher import FakeProcessWatcher
+
+TIMEOUT = 5.0
+
+
+class EventLog:
+    """Слушатель CallMonitor: имена и аргументы событий, ожидание нужного числа"""
+
+    def __init__(self):
+        self.events = []
+        self.changed = threading.Condition()
+
+    def __call__(self, event):
+        with self.changed:
+            self.events.append((event.name, event.args))
+            self.changed.notify_all()
+
+    def wait_for(self, count):
+        with self.changed:
+            self.changed.wait_for(lambda: len(self.events) >= count, TIMEOUT)
+            return list(self.events)
+
+
+def start_monitor(script, watcher=None):
+    if watcher is None:
+        watcher = FakeProcessWatcher()
+        watcher.start_process()
+    monitor = CallMonitor(memo_source=ScriptedMemoSource(script), process_watcher=watcher)
+    log = EventLog()
+    monitor.add_listener(log)
+    monitor.start()
+    return monitor, log
+
+
+def stop_monitor(monitor):
+    monitor.stop()
+    monitor.join(TIMEOUT)
+
+
+def test_scripted_memo_produces_call_events():
+    script = [
+        (0.01, 1, "Входящий звонок tv_order"),
+        (0.01, 1, "Входящий звонок tv_order\r\nДлительность 00:00"),
+        (0.01, 1, ""),
+        (0.01, 1, "Исходящий звонок"),
+        (0.01, 1, ""),
+    ]
+    monitor, log = start_monitor(script)
+    try:
+        events = log.wait_for(7)
+    finally:
+        stop_monitor(monitor)
+    assert events == [
+        ('process_running', ()),
+        ('incoming_call', ('tv_order',)),
+        ('call_answered', ()),
+        ('call_started', ()),
+        ('call_ended', ()),
+        ('outgoing_call', ()),
+        ('call_ended', ()),
+    ]
+
+
+def test_trigger_in_any_memo_of_window():
+    # Звонок пишется во второй TMemo, первый не меняется
+    script = [
+        (0.01, 1, "Регистрация на сервере успешна"),
+        (0.01, 2, "Входящий звонок tv_tech"),
+        (0.01, 2, ""),
+    ]
+    monitor, log = start_monitor(script)
+    try:
+        events = log.wait_for(3)
+    finally:
+        stop_monitor(monitor)
+    assert events == [('process_running', ()), ('incoming_call', ('tv_tech',)), ('call_ended', ())]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def scan_monitor(watcher, clock):
+    """CallMonitor без цикла: процессы проверяются вызовами check_processes()"""
+    monitor = CallMonitor(memo_source=ScriptedMemoSource([]), process_watcher=watcher, clock=clock)
+    log = EventLog()
+    monitor.add_listener(log)
+    return monitor, log
+
+
+def test_fake_process_start_and_stop():
+    clock = FakeClock()
+    watcher = FakeProcessWatcher(clock=clock)
+    monitor, log = scan_monitor(watcher, clock)
+
+    assert monitor.check_processes() == []
+    watcher.start_process(1000)
+    assert monitor.check_processes() == []  # Следующий снимок - через search секунд
+    clock.now += monitor.scheduler.search_interval
+    assert monitor.check_processes() == [monitor.primary]
+    assert monitor.primary.process_id == 1000
+
+    # Пока процесс жив, снимки не делаются
+    scans = watcher.snapshot_scans
+    clock.now += 60
+    monitor.check_processes()
+    assert watcher.snapshot_scans == scans
+
+    monitor.analyze_call_state("Входящий звонок tv_tech")
+    watcher.stop_process()
+    assert watcher.exit_notifications == 1
+    assert monitor.check_processes() == []
+    assert monitor.state_machine.state == 'idle'
+    assert log.events == [('process_running', ()), ('incoming_call', ('tv_tech',)), ('process_stopped', ())]
+
+
+def test_process_exit_wakes_monitor_loop():
+    watcher = FakeProcessWatcher()
+    watcher.start_process(1000)
+    monitor, log = start_monitor([], watcher)
+    try:
+        log.wait_for(1)
+        watcher.stop_process()
+        events = log.wait_for(2)
+    finally:
+        stop_monitor(monitor)
+    assert events == [('process_running', ()), ('process_stopped', ())]
+
+
+def test_pid_change_between_scans_restarts_profile():
+    # Телефон перезапустился между проверками: уведомления о выходе не было
+    clock = FakeClock()
+    watcher = FakeProcessWatcher(clock=clock)
+    watcher.start_process(1)
+    monitor, log = scan_monitor(watcher, clock)
+    monitor.check_processes()
+    monitor.analyze_call_state("Входящий звонок tv_tech")
+
+    watcher.pid = 2
+    monitor.check_processes()
+    assert monitor.primary.process_id == 2
+    assert monitor.state_machine.state == 'idle'
+    assert log.events == [('process_running', ()), ('incoming_call', ('tv_tech',)),
+                          ('process_stopped', ()), ('process_running', ())]
+
+
+def wait_until(predicate):
+    deadline = time.monotonic() + TIMEOUT
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.mark.parametrize('hooks_active, call_interval', [(True, 2.0), (False, 0.5)])
+def test_source_without_hooks_keeps_poll_intervals(hooks_active, call_interval):
+    # Источник есть, но хуки не установлены: разговор опрашивается как без событий
+    watcher = FakeProcessWatcher()
+    watcher.start_process()
+    source = ScriptedMemoSource([(0.01, 1, "Входящий звонок tv_tech"),
+                                 (0.01, 1, "Входящий звонок tv_tech\r\nДлительность 00:00")],
+                                hooks_active=hooks_active)
+    monitor = CallMonitor(memo_source=source, process_watcher=watcher)
+    monitor.start()
+    try:
+        assert wait_until(lambda: monitor.scheduler.mode == 'call')
+        assert monitor.scheduler.interval == call_interval
+    finally:
+        stop_monitor(monitor)
+
+
+def test_failed_watch_falls_back_to_rate_limited_scans():
+    # Нет прав на handle процесса: снимок не на каждом тике, а раз в search секунд
+    clock = FakeClock()
+    watcher = FakeProcessWatcher(clock=clock)
+    watcher.fail_watch = True
+    watcher.start_process(1000)
+    monitor, log = scan_monitor(watcher, clock)
+    search = monitor.scheduler.search_interval
+
+    assert monitor.check_processes() == [monitor.primary]
+    assert (watcher.snapshot_scans, watcher.watch_attempts) == (1, 1)
+    for _ in range(5):
+        clock.now += search / 10
+        assert monitor.check_processes() == [monitor.primary]
+    assert watcher.snapshot_scans == 1
+
+    # Процесс жив: подписка повторяется на следующем снимке и удается
+    watcher.fail_watch = False
+    clock.now += search
+    assert monitor.check_processes() == [monitor.primary]
+    assert (watcher.snapshot_scans, watcher.watch_attempts) == (2, 2)
+    clock.now += 60
+    monitor.check_processes()
+    assert watcher.snapshot_scans == 2
+    assert log.events == [('process_running', ())]
+
+
+def test_unwatched_process_exit_found_by_next_scan():
+    clock = FakeClock()
+    watcher = FakeProcessWatcher(clock=clock)
+    watcher.fail_watch = True
+    watcher.start_process(1000)
+    monitor, log = scan_monitor(watcher, clock)
+    monitor.check_processes()
+
+    watcher.stop_process()
+    assert watcher.exit_notifications == 0
+    assert monitor.check_processes() == [monitor.primary]  # Снимок еще не положен
+    clock.now += monitor.scheduler.search_interval
+    assert monitor.check_processes() == []
+    assert log.events == [('process_running', ()), ('process_stopped', ())]
@@ -0,0 +1,109 @@
+# test_poll_scheduler.py
+"""Интервалы PollScheduler по режимам на подставных часах."""
+import pytest
+
+from call_state import IDLE, INCOMING, OUTGOING, ACTIVE
+from poll_scheduler import PollScheduler
+
+
+class FakeClock:
+    """Часы, которые идут только вместе с тиками теста"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run(scheduler, clock, states, ticks, events=True):
+    """Интервалы подряд идущих тиков; часы сдвигаются на выданный интервал"""
+    intervals = []
+    for _ in range(ticks):
+        interval = scheduler.next_interval(states, events)
+        intervals.append(interval)
+        clock.now += interval
+    return intervals
+
+
+def make_scheduler(settings=None):
+    clock = FakeClock()
+    cpu = FakeClock()
+    return PollScheduler(settings, clock=clock, cpu_clock=cpu), clock, cpu
+
+
+def test_idle_backoff_without_memo_events():
+    scheduler, clock, _ = make_scheduler()
+    assert run(scheduler, clock, [IDLE], 4, events=False) == [0.5, 0.75, 0.75, 0.75]
+
+
+def test_idle_backoff_with_memo_events():
+    scheduler, clock, _ = make_scheduler({'fallback': 0.0})
+    assert run(scheduler, clock, [IDLE], 6) == pytest.approx([0.5, 0.75, 1.125, 1.6875, 2.53125, 3.0])
+
+
+def test_events_keep_fallback_floor():
+    scheduler, clock, _ = make_scheduler()
+    intervals = run(scheduler, clock, [IDLE], 6)
+    assert intervals == [2.0, 2.0, 2.0, 2.0, 2.53125, 3.0]
+    assert run(scheduler, clock, [ACTIVE], 1) == [2.0]
+
+
+def test_ringing_is_fast_even_with_events():
+    scheduler, clock, _ = make_scheduler()
+    assert run(scheduler, clock, [INCOMING], 2) == [0.1, 0.1]
+    assert run(scheduler, clock, [OUTGOING, IDLE], 1) == [0.1]
+
+
+@pytest.mark.parametrize('states, expected', [
+    ([INCOMING], 0.1),
+    ([OUTGOING], 0.1),
+    ([ACTIVE], 0.5),
+    ([ACTIVE, INCOMING], 0.1),  # Второй профиль звонит во время разговора
+    ([IDLE, ACTIVE], 0.5),
+    ([], 2.0),
+])
+def test_interval_per_mode_without_events(states, expected):
+    scheduler, clock, _ = make_scheduler()
+    assert run(scheduler, clock, states, 3, events=False) == [expected] * 3
+
+
+def test_absent_uses_search_interval_with_events():
+    scheduler, clock, _ = make_scheduler({'search': 5, 'fallback': 2.0})
+    assert run(scheduler, clock, [], 2) == [5.0, 5.0]
+
+
+def test_activity_and_calls_reset_idle_backoff():
+    scheduler, clock, _ = make_scheduler({'idle_max': 3.0})
+    run(scheduler, clock, [IDLE], 3, events=False)
+    scheduler.note_activity()
+    assert scheduler.interval == 0.5
+    assert run(scheduler, clock, [IDLE], 2, events=False) == [0.75, 0.75]
+
+    # После звонка откат начинается с idle_min
+    run(scheduler, clock, [INCOMING], 2, events=False)
+    assert run(scheduler, clock, [IDLE], 2, events=False) == [0.5, 0.75]
+
+
+def test_poll_idle_max_not_below_idle_min():
+    scheduler, clock, _ = make_scheduler({'idle_min': 1.0, 'poll_idle_max': 0.75})
+    assert run(scheduler, clock, [IDLE], 3, events=False) == [1.0, 1.0, 1.0]
+
+
+def test_stats_count_ticks_by_mode_and_cpu():
+    scheduler, clock, cpu = make_scheduler()
+    run(scheduler, clock, [], 2, events=False)
+    run(scheduler, clock, [INCOMING], 10, events=False)
+    run(scheduler, clock, [ACTIVE], 4, events=False)
+    cpu.now = 0.036
+    run(scheduler, clock, [IDLE], 4, events=False)
+    stats = scheduler.stats()
+    assert stats['ticks'] == 20
+    assert stats['ticks_by_mode'] == {'fast': 10, 'call': 4, 'idle': 4, 'absent': 2}
+    assert stats['mode'] == 'idle'
+    assert stats['interval'] == 0.75
+    # Последний тик учтен в момент его начала: 2*2.0 + 10*0.1 + 4*0.5 + 0.5 + 2*0.75
+    assert stats['elapsed'] == pytest.approx(9.0)
+    assert stats['rate'] == pytest.approx(20 / 9.0)
+    assert stats['cpu_seconds'] == pytest.approx(0.036)
+    assert stats['cpu_per_hour'] == pytest.approx(0.036 * 400)
@@ -0,0 +1,97 @@
+# test_ringtone_cache.py
+"""RingtoneCache на фейковом декодере: лимит памяти, PCM на диске, фоновая загрузка."""
+import threading
+
+from ringtone_cache import RingtoneCache
+
+FORMAT = (8000, -16, 1)  # 16000 байт PCM в секунде
+SECOND = 16000
+
+
+class FakeBackend:
+    """Декодер без pygame: длина PCM задается по имени файла"""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.decoded = []
+
+    def format(self):
+        return FORMAT
+
+    def decode(self, path):
+        self.decoded.append(path)
+        return b'\x10\x00' * (self.sizes[path] // 2)
+
+    def from_pcm(self, data):
+        return ('sound', data)
+
+
+def make_cache(tmp_path, sizes, budget, **kwargs):
+    paths = {}
+    for name, size in sizes.items():
+        path = tmp_path / name
+        path.write_bytes(name.encode())  # Разное содержимое - разные ключи PCM
+        paths[name] = str(path)
+    backend = FakeBackend({paths[name]: size for name, size in sizes.items()})
+    cache = RingtoneCache(cache_dir=str(tmp_path / 'pcm'), budget_bytes=budget, backend=backend, **kwargs)
+    return cache, backend, paths
+
+
+def test_least_recently_used_evicted_over_budget(tmp_path):
+    cache, backend, paths = make_cache(tmp_path, {'a.mp3': 4 * SECOND, 'b.mp3': 4 * SECOND,
+                                                  'c.mp3': 4 * SECOND}, budget=9 * SECOND)
+    cache.load(paths['a.mp3'])
+    cache.load(paths['b.mp3'])
+    assert cache.get(paths['a.mp3']) is not None  # a использован позже b
+    cache.load(paths['c.mp3'])
+    assert cache.get(paths['b.mp3']) is None
+    assert cache.get(paths['a.mp3']) is not None
+    stats = cache.stats()
+    assert (stats['ringtones'], stats['used_bytes'], stats['evictions']) == (2, 8 * SECOND, 1)
+
+
+def test_evicted_ringtone_reloads_from_disk_without_decoding(tmp_path):
+    cache, backend, paths = make_cache(tmp_path, {'a.mp3': 4 * SECOND, 'b.mp3': 4 * SECOND}, budget=5 * SECOND)
+    first = cache.load(paths['a.mp3'])
+    cache.load(paths['b.mp3'])
+    assert cache.get(paths['a.mp3']) is None
+    assert cache.load(paths['a.mp3']) == first
+    assert backend.decoded == [paths['a.mp3'], paths['b.mp3']]
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_single_ringtone_over_budget_is_trimmed_and_kept(tmp_path):
+    cache, backend, paths = make_cache(tmp_path, {'long.mp3': 60 * SECOND}, budget=10 * SECOND)
+    sound = cache.load(paths['long.mp3'])
+    assert len(sound[1]) == 10 * SECOND
+    assert sound[1][-2:] == b'\x00\x00'  # Затухание в конце фрагмента
+    assert cache.get(paths['long.mp3']) is sound
+
+
+def test_long_ringtone_trimmed_to_loop_length(tmp_path):
+    cache, _, paths = make_cache(tmp_path, {'long.mp3': 60 * SECOND}, budget=100 * SECOND, max_loop_seconds=5)
+    assert len(cache.load(paths['long.mp3'])[1]) == 5 * SECOND
+
+
+def test_request_loads_in_background(tmp_path):
+    cache, _, paths = make_cache(tmp_path, {'a.mp3': SECOND}, budget=10 * SECOND)
+    done = threading.Event()
+    results = []
+
+    def on_ready(path, sound, error):
+        results.append((path, sound is not None, error))
+        done.set()
+
+    assert cache.request(paths['a.mp3'], on_ready) is None
+    assert done.wait(5)
+    assert results == [(paths['a.mp3'], True, None)]
+    assert cache.request(paths['a.mp3']) is cache.get(paths['a.mp3'])
+
+
+def test_request_reports_load_error(tmp_path):
+    cache, _, _ = make_cache(tmp_path, {}, budget=SECOND)
+    done = threading.Event()
+    errors = []
+    cache.request(str(tmp_path / 'missing.mp3'), lambda path, sound, error: (errors.append(error), done.set()))
+    assert done.wait(5)
+    assert isinstance(errors[0], OSError)
@@ -0,0 +1,88 @@
+# test_trace_replay.py
+"""TraceReplayer: сверка проигранных событий с записанными."""
+import pytest
+
+from trace_replay import (TraceReplayer, TraceRecord, synthetic_trace, save_trace, load_trace,
+                          KIND_PROCESS, KIND_MEMO, KIND_EVENT)
+
+PROFILE = 'sipphone'
+
+
+def call_trace():
+    """Один отвеченный входящий; ожидаемые события - как записал бы монитор"""
+    return [
+        TraceRecord(0.0, KIND_PROCESS, PROFILE, 1000),
+        TraceRecord(0.0, KIND_EVENT, PROFILE, ('process_running', ())),
+        TraceRecord(10.0, KIND_MEMO, PROFILE, "Входящий звонок tv_order"),
+        TraceRecord(10.0, KIND_EVENT, PROFILE, ('incoming_call', ('tv_order',))),
+        TraceRecord(15.0, KIND_MEMO, PROFILE, "Входящий звонок tv_order\r\nДлительность 00:00"),
+        TraceRecord(15.0, KIND_EVENT, PROFILE, ('call_answered', ())),
+        TraceRecord(15.0, KIND_EVENT, PROFILE, ('call_started', ())),
+        TraceRecord(60.0, KIND_MEMO, PROFILE, ""),
+        TraceRecord(60.0, KIND_EVENT, PROFILE, ('call_ended', ())),
+    ]
+
+
+@pytest.mark.parametrize('events', [True, False])
+def test_synthetic_shift_replays_without_errors(events):
+    trace = synthetic_trace(hours=2, seed=3, restarts=2)
+    result = TraceReplayer(trace, events=events).run()
+    assert result.false_transitions == []
+    assert result.missed == []
+    assert len(result.detections) == len(result.expected)
+
+
+def test_glitches_are_false_transitions_not_missed():
+    # TMemo на 50 мс пустеет посреди каждого разговора: по событиям это видно
+    result = TraceReplayer(synthetic_trace(hours=2, seed=3, glitch_rate=1.0), events=True).run()
+    assert result.missed == []
+    assert result.false_transitions
+    assert {d.name for d in result.false_transitions} == {'call_ended', 'call_started'}
+    assert len(result.detections) == len(result.expected) + len(result.false_transitions)
+
+
+def test_unrecorded_event_is_false_transition():
+    trace = [record for record in call_trace() if record.value != ('call_answered', ())]
+    result = TraceReplayer(trace).run()
+    assert [(d.name, d.changed_at) for d in result.false_transitions] == [('call_answered', 15.0)]
+    assert result.missed == []
+
+
+def test_event_not_replayed_is_missed():
+    trace = call_trace() + [TraceRecord(30.0, KIND_EVENT, PROFILE, ('call_ended', ()))]
+    result = TraceReplayer(trace).run()
+    assert result.missed == [(PROFILE, 'call_ended', ())]
+    assert result.false_transitions == []
+
+
+def test_event_far_from_its_record_is_false_and_missed():
+    # Записанный входящий на минуту раньше изменения окна - это не тот же переход
+    trace = [record._replace(t=0.0) if record.kind == KIND_EVENT and record.value[0] == 'incoming_call'
+             else record for record in call_trace()]
+    result = TraceReplayer(trace).run()
+    assert [d.name for d in result.false_transitions] == ['incoming_call']
+    assert result.missed == [(PROFILE, 'incoming_call', ('tv_order',))]
+
+
+def test_missed_short_ring_when_only_polling():
+    # Входящий сброшен через 50 мс: опрос раз в 0.5 с его не видит, события видят
+    trace = call_trace() + [
+        TraceRecord(100.0, KIND_MEMO, PROFILE, "Входящий звонок tv_tech"),
+        TraceRecord(100.0, KIND_EVENT, PROFILE, ('incoming_call', ('tv_tech',))),
+        TraceRecord(100.05, KIND_MEMO, PROFILE, ""),
+        TraceRecord(100.05, KIND_EVENT, PROFILE, ('call_ended', ())),
+        TraceRecord(120.0, KIND_MEMO, PROFILE, "Статус: готов"),
+    ]
+    assert TraceReplayer(trace, events=True).run().missed == []
+    result = TraceReplayer(trace, events=False).run()
+    assert result.missed == [(PROFILE, 'incoming_call', ('tv_tech',)), (PROFILE, 'call_ended', ())]
+    assert result.false_transitions == []
+
+
+def test_saved_trace_replays_the_same(tmp_path):
+    trace = synthetic_trace(hours=1, seed=5, restarts=1)
+    path = tmp_path / 'trace.jsonl'
+    save_trace(trace, path)
+    result = TraceReplayer(load_trace(path)).run()
+    assert result.expected == TraceReplayer(trace).run().expected
+    assert result.false_transitions == [] and result.missed == []
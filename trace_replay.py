@@ -0,0 +1,387 @@
+# trace_replay.py
+"""
+Запись и проигрывание трасс мониторинга без Windows.
+
+TraceRecorder пишет в JSON Lines то, что видит CallMonitor: текст TMemo
+на входе машины состояний профиля, появление и пропажу процесса и
+события, отданные слушателям. Включается ключом 'monitor_trace' в
+config.json (путь к файлу); дописанный к прошлому текст пишется хвостом.
+
+TraceReplayer проигрывает трассу через модель цикла CallMonitor на
+виртуальных часах: PollScheduler выбирает интервалы, события TMemo
+(events=True) будят цикл сразу, процесс ищется снимком раз в search
+секунд, а его завершение замечается сразу. Результат - события с
+задержкой обнаружения и их сверка с записанными: событие совпадает с
+записанным с тем же именем и аргументами, если окно изменилось не дальше
+MATCH_WINDOW секунд от записанного момента; остальные - лишние переходы
+(false) и пропущенные (missed). Задержка считается от момента записи, то есть
+для живой трассы - от того, когда изменение увидел записавший монитор.
+synthetic_trace() строит смену оператора с известными событиями для
+бенчмарков (python benchmarks.py replay).
+
+    python trace_replay.py trace.jsonl [--polling]
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from collections import namedtuple, deque
+
+from app_log import get_logger
+from call_state import CallStateMachine, TriggerMatcher, DEFAULT_DIRECTIONS
+from poll_scheduler import PollScheduler
+
+log = get_logger(__name__)
+
+KIND_START = 'start'
+KIND_MEMO = 'memo'        # Текст TMemo целиком
+KIND_APPEND = 'append'    # Хвост, дописанный к прошлому тексту профиля
+KIND_PROCESS = 'process'  # PID процесса профиля (None - процесс пропал)
+KIND_EVENT = 'event'      # Событие монитора: (имя, аргументы)
+
+EVENT_PROCESS_RUNNING = 'process_running'
+EVENT_PROCESS_STOPPED = 'process_stopped'
+
+MATCH_WINDOW = 0.5  # Сек между изменением окна и записанным событием
+
+# Запись трассы: время от начала (сек), вид, профиль, значение
+TraceRecord = namedtuple('TraceRecord', ['t', 'kind', 'profile', 'value'])
+
+# Событие проигрывания: когда изменилось окно и когда это заметил цикл
+Detection = namedtuple('Detection', ['profile', 'name', 'args', 'changed_at', 'detected_at'])
+
+
+class TraceRecorder:
+    def __init__(self, path, clock=time.perf_counter):
+        self.path = path
+        self.clock = clock
+        self.started_at = clock()
+        self.texts = {}  # профиль -> последний записанный текст
+        self.file = open(path, 'a', encoding='utf-8')
+        self._write(KIND_START, None, {'wall': time.time()})
+        log.info("📼 Запись трассы мониторинга: %s", path)
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Запись в файл 'monitor_trace' из config.json или None"""
+        path = (config or {}).get('monitor_trace')
+        if not path:
+            return None
+        try:
+            return cls(path, **kwargs)
+        except OSError as e:
+            log.warning("⚠️ Не удалось открыть трассу %s: %s", path, e)
+            return None
+
+    def _write(self, kind, profile, value, at=None):
+        t = (at if at is not None else self.clock()) - self.started_at
+        self.file.write(json.dumps({'t': round(t, 6), 'kind': kind, 'profile': profile, 'value': value},
+                                   ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def memo(self, profile, text, at=None):
+        """Текст на входе машины состояний; пишется только изменение"""
+        previous = self.texts.get(profile)
+        if text == previous:
+            return
+        self.texts[profile] = text
+        if previous and text.startswith(previous):
+            self._write(KIND_APPEND, profile, text[len(previous):], at)
+        else:
+            self._write(KIND_MEMO, profile, text, at)
+
+    def process(self, profile, pid, at=None):
+        self._write(KIND_PROCESS, profile, pid, at)
+
+    def event(self, profile, name, args, at=None):
+        self._write(KIND_EVENT, profile, [name, list(args)], at)
+
+    def close(self):
+        self.file.close()
+
+
+def load_trace(path):
+    """Записи трассы по времени; хвосты KIND_APPEND склеиваются в полный текст"""
+    records = []
+    texts = {}
+    offset = 0.0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            kind, profile, value = data['kind'], data.get('profile'), data.get('value')
+            if kind == KIND_START:
+                # Новая запись в том же файле: время снова с нуля, продолжаем после прошлой
+                offset = records[-1].t if records else 0.0
+                texts = {}
+                continue
+            if kind == KIND_APPEND:
+                kind, value = KIND_MEMO, texts.get(profile, "") + value
+            if kind == KIND_MEMO:
+                texts[profile] = value
+            elif kind == KIND_EVENT:
+                value = (value[0], tuple(value[1]))
+            records.append(TraceRecord(offset + data['t'], kind, profile, value))
+    records.sort(key=lambda record: record.t)
+    return records
+
+
+def save_trace(records, path):
+    """Записывает записи (например, синтетические) в формате TraceRecorder"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'t': 0.0, 'kind': KIND_START, 'profile': None, 'value': {'wall': time.time()}}) + "\n")
+        for record in records:
+            value = [record.value[0], list(record.value[1])] if record.kind == KIND_EVENT else record.value
+            f.write(json.dumps({'t': record.t, 'kind': record.kind, 'profile': record.profile,
+                                'value': value}, ensure_ascii=False) + "\n")
+
+
+def synthetic_trace(hours=1.0, seed=1, profile='sipphone', mean_gap=240.0, glitch_rate=0.0,
+                    outgoing_rate=0.15, restarts=0):
+    """
+    Смена оператора: пауза между звонками экспоненциальная, звонит 3-15 с,
+    каждый пятый входящий пропущен, разговор 30-300 с. glitch_rate - доля
+    разговоров, где TMemo на 50 мс пустеет (событий быть не должно),
+    restarts - сколько раз телефон перезапускается между звонками.
+    Возвращает записи с ожидаемыми событиями (KIND_EVENT).
+    """
+    rng = random.Random(seed)
+    end = hours * 3600
+    records = [TraceRecord(0.0, KIND_PROCESS, profile, 1000),
+               TraceRecord(0.0, KIND_EVENT, profile, (EVENT_PROCESS_RUNNING, ())),
+               TraceRecord(0.0, KIND_MEMO, profile, "")]
+    restart_at = sorted(rng.uniform(0, end) for _ in range(restarts))
+    pid = 1000
+
+    def add(t, kind, value):
+        records.append(TraceRecord(round(t, 6), kind, profile, value))
+
+    t = 0.0
+    while True:
+        t += rng.expovariate(1 / mean_gap)
+        if restart_at and restart_at[0] < t:
+            restart_at.pop(0)
+            pid += 1
+            add(t, KIND_PROCESS, None)
+            add(t, KIND_EVENT, (EVENT_PROCESS_STOPPED, ()))
+            t += rng.uniform(2, 10)
+            add(t, KIND_PROCESS, pid)
+            add(t, KIND_EVENT, (EVENT_PROCESS_RUNNING, ()))
+            t += rng.uniform(1, 5)
+        if t >= end:
+            return records
+        direction = rng.choice(DEFAULT_DIRECTIONS)
+        if rng.random() < outgoing_rate:
+            add(t, KIND_MEMO, "Исходящий звонок")
+            add(t, KIND_EVENT, ('outgoing_call', ()))
+            t += rng.uniform(3, 20)
+            call_text = "Исходящий звонок\r\nДлительность 00:00"
+            add(t, KIND_MEMO, call_text)
+            add(t, KIND_EVENT, ('call_started', ()))
+        else:
+            add(t, KIND_MEMO, f"Входящий звонок {direction}")
+            add(t, KIND_EVENT, ('incoming_call', (direction,)))
+            t += rng.uniform(3, 15)
+            if rng.random() < 0.2:
+                add(t, KIND_MEMO, "")
+                add(t, KIND_EVENT, ('call_ended', ()))
+                continue
+            call_text = f"Входящий звонок {direction}\r\nДлительность 00:00"
+            add(t, KIND_MEMO, call_text)
+            add(t, KIND_EVENT, ('call_answered', ()))
+            add(t, KIND_EVENT, ('call_started', ()))
+        duration = rng.uniform(30, 300)
+        if rng.random() < glitch_rate:
+            glitch = t + rng.uniform(1, duration - 1)
+            add(glitch, KIND_MEMO, "")
+            add(glitch + 0.05, KIND_MEMO, call_text)
+        t += duration
+        add(t, KIND_MEMO, "")
+        add(t, KIND_EVENT, ('call_ended', ()))
+
+
+class ReplayResult:
+    def __init__(self, detections, expected, expected_at, poll_stats, duration, wall_seconds):
+        self.detections = detections
+        self.expected = expected  # [(профиль, имя, аргументы)] из записи
+        self.expected_at = expected_at  # Когда записаны эти события
+        self.poll_stats = poll_stats  # PollScheduler.stats() на виртуальных часах
+        self.ticks = poll_stats['ticks']
+        self.duration = duration  # Время трассы, сек
+        self.wall_seconds = wall_seconds
+        self.false_transitions, self.missed = self._compare()
+
+    def _compare(self):
+        """
+        Лишние и пропущенные события относительно записанных. Выравнивание
+        последовательностей (difflib) на повторяющихся звонках сдвигается и
+        записывает верные события в пропущенные, поэтому событие ищется
+        среди записанных с тем же ключом по времени: первое еще не
+        сопоставленное не дальше MATCH_WINDOW от изменения окна.
+        """
+        expected_at = self.expected_at
+        pending = {}  # (профиль, имя, аргументы) -> индексы записанных по времени
+        for index, key in enumerate(self.expected):
+            pending.setdefault(key, deque()).append(index)
+        false_transitions, missed = [], []
+        for detection in self.detections:
+            queue = pending.get((detection.profile, detection.name, detection.args))
+            while queue and expected_at[queue[0]] < detection.changed_at - MATCH_WINDOW:
+                missed.append(queue.popleft())
+            if queue and expected_at[queue[0]] <= detection.changed_at + MATCH_WINDOW:
+                queue.popleft()
+            else:
+                false_transitions.append(detection)
+        for queue in pending.values():
+            missed.extend(queue)
+        return false_transitions, [self.expected[index] for index in sorted(missed)]
+
+    def latencies(self, name=None):
+        """Задержки обнаружения, сек (все события или одно имя)"""
+        return [d.detected_at - d.changed_at for d in self.detections if name is None or d.name == name]
+
+    def summary(self):
+        return {
+            'events': len(self.detections),
+            'expected': len(self.expected),
+            'false_transitions': len(self.false_transitions),
+            'missed': len(self.missed),
+            'ticks': self.ticks,
+            'duration': self.duration,
+            'wall_seconds': self.wall_seconds,
+            'speedup': self.duration / self.wall_seconds if self.wall_seconds else 0.0,
+        }
+
+
+class _ReplayProfile:
+    def __init__(self, matcher):
+        self.state_machine = CallStateMachine(matcher)
+        self.active = False
+        self.pid = None
+        self.text = None
+
+
+class TraceReplayer:
+    """
+    records - записи трассы (load_trace); matchers - имя профиля ->
+    TriggerMatcher (остальным - по умолчанию); settings - 'polling' для
+    PollScheduler; events - изменения TMemo приходят событиями (WinEvent).
+    """
+
+    def __init__(self, records, matchers=None, settings=None, events=True):
+        self.records = sorted((record for record in records if record.kind != KIND_EVENT),
+                              key=lambda record: record.t)
+        recorded = sorted((record for record in records if record.kind == KIND_EVENT),
+                          key=lambda record: record.t)
+        self.expected = [(record.profile, record.value[0], tuple(record.value[1])) for record in recorded]
+        self.expected_at = [record.t for record in recorded]
+        self.matchers = matchers or {}
+        self.settings = settings
+        self.events = events
+
+    def run(self):
+        started = time.perf_counter()
+        records = self.records
+        # Первый снимок - с первой записью (в живой трассе это момент, когда процесс нашли)
+        clock = [records[0].t if records else 0.0]
+        scheduler = PollScheduler(self.settings, clock=lambda: clock[0], cpu_clock=lambda: 0.0)
+        search = scheduler.search_interval
+        # Завершения процессов будят цикл и без событий TMemo (наблюдатель процесса)
+        exits = [record.t for record in records if record.kind == KIND_PROCESS and record.value is None]
+        world = {}  # профиль -> [pid, когда изменился pid, текст, когда изменился текст]
+        profiles = {}
+        detections = []
+        index = exit_index = 0
+        last_scan = None
+
+        while True:
+            now = clock[0]
+            while index < len(records) and records[index].t <= now:
+                record = records[index]
+                index += 1
+                state = world.setdefault(record.profile, [None, 0.0, "", 0.0])
+                if record.kind == KIND_PROCESS:
+                    state[0], state[1] = record.value, record.t
+                elif record.kind == KIND_MEMO:
+                    state[2], state[3] = record.value, record.t
+                if record.profile not in profiles:
+                    profiles[record.profile] = _ReplayProfile(
+                        self.matchers.get(record.profile) or TriggerMatcher())
+
+            # Процессы: пропажа - сразу, появление - по снимку
+            lost = [name for name, monitor in profiles.items()
+                    if monitor.active and world[name][0] != monitor.pid]
+            for name in lost:
+                monitor = profiles[name]
+                monitor.active = False
+                monitor.pid = None
+                monitor.text = None
+                monitor.state_machine.reset()
+                detections.append(Detection(name, EVENT_PROCESS_STOPPED, (), world[name][1], now))
+            missing = [name for name, monitor in profiles.items() if not monitor.active]
+            if missing and (lost or last_scan is None or now - last_scan >= search):
+                last_scan = now
+                for name in missing:
+                    if world[name][0] is None:
+                        continue
+                    monitor = profiles[name]
+                    monitor.active = True
+                    monitor.pid = world[name][0]
+                    detections.append(Detection(name, EVENT_PROCESS_RUNNING, (), world[name][1], now))
+
+            # Чтение TMemo и машина состояний
+            active = [(name, monitor) for name, monitor in profiles.items() if monitor.active]
+            for name, monitor in active:
+                text, changed_at = world[name][2], world[name][3]
+                if text == monitor.text:
+                    continue
+                monitor.text = text
+                scheduler.note_activity()
+                for event_name, args in monitor.state_machine.feed(text):
+                    detections.append(Detection(name, event_name, tuple(args), changed_at, now))
+
+            if index >= len(records):
+                break
+            interval = scheduler.next_interval([monitor.state_machine.state for _, monitor in active],
+                                               self.events)
+            if not active and last_scan is not None:
+                interval = max(0.0, search - (now - last_scan))
+            wake = now + interval
+            while exit_index < len(exits) and exits[exit_index] <= now:
+                exit_index += 1
+            if exit_index < len(exits):
+                wake = min(wake, exits[exit_index])
+            if self.events and active:
+                wake = min(wake, records[index].t)
+            clock[0] = max(wake, now)
+
+        return ReplayResult(detections, self.expected, self.expected_at, scheduler.stats(),
+                            records[-1].t if records else 0.0, time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проигрывание трассы мониторинга")
+    parser.add_argument('trace', help="файл трассы (monitor_trace)")
+    parser.add_argument('--polling', action='store_true', help="без событий TMemo, только опрос")
+    args = parser.parse_args(argv)
+
+    result = TraceReplayer(load_trace(args.trace), events=not args.polling).run()
+    summary = result.summary()
+    print(f"Событий {summary['events']} (в записи {summary['expected']}), лишних {summary['false_transitions']}, "
+          f"пропущено {summary['missed']}, тиков {summary['ticks']}, "
+          f"{summary['duration']:.0f} с трассы за {summary['wall_seconds'] * 1000:.0f} мс")
+    for name in sorted({d.name for d in result.detections}):
+        values = sorted(result.latencies(name))
+        print(f"  {name:<16} n={len(values):<4} p50={values[len(values) // 2] * 1000:8.1f} мс  "
+              f"max={values[-1] * 1000:8.1f} мс")
+    for detection in result.false_transitions:
+        print(f"  лишнее: {detection.name} [{detection.profile}] на {detection.detected_at:.2f} с")
+    for profile, name, _ in result.missed:
+        print(f"  пропущено: {name} [{profile}]")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# window_cache.py
+"""
+Кэш подключения к окну sipphone.exe.
+
+Раньше каждый тик монитора заново делал Application.connect(),
+строил спецификацию окна и обходил children(). Кэш хранит найденное
+главное окно и его TMemo между тиками и ищет их заново только когда
+handle стал недействительным или сменился PID процесса.
+"""
+import sys
+import time
+import ctypes
+
+
+def is_window(handle):
+    """Проверяет, что handle окна еще существует."""
+    if sys.platform != 'win32':
+        return bool(handle)
+    return bool(ctypes.windll.user32.IsWindow(handle))
+
+
+def top_level_windows():
+    """
+    Видимые окна верхнего уровня: {PID: [(класс, заголовок), ...]}.
+    Один проход EnumWindows на все профили (вне Windows - пустой словарь).
+    """
+    if sys.platform != 'win32':
+        return {}
+    from ctypes import wintypes
+    user32 = ctypes.windll.user32
+    windows = {}
+    class_buf = ctypes.create_unicode_buffer(256)
+    title_buf = ctypes.create_unicode_buffer(512)
+    pid = wintypes.DWORD()
+
+    def callback(hwnd, lparam):
+        if user32.IsWindowVisible(hwnd):
+            user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            user32.GetClassNameW(hwnd, class_buf, len(class_buf))
+            user32.GetWindowTextW(hwnd, title_buf, len(title_buf))
+            windows.setdefault(pid.value, []).append((class_buf.value, title_buf.value))
+        return True
+
+    proc = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)(callback)
+    user32.EnumWindows(proc, 0)
+    return windows
+
+
+class ConnectionCache:
+    """
+    resolver(pid) должен вернуть (main_window, memos) - обертки pywinauto
+    с атрибутом handle. Считает попадания, промахи и стоимость переподключения.
+    """
+
+    def __init__(self, resolver, validator=is_window, clock=time.perf_counter):
+        self.resolver = resolver
+        self.validator = validator
+        self.clock = clock
+        self._pid = None
+        self._main_window = None
+        self._memos = []
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.reconnect_seconds = 0.0
+        self.last_reconnect_seconds = 0.0
+
+    def get(self, pid):
+        """Возвращает (main_window, memos) для процесса pid."""
+        if self._main_window is not None and pid == self._pid and self._is_valid():
+            self.hits += 1
+            return self._main_window, self._memos
+
+        self.misses += 1
+        started = self.clock()
+        try:
+            main_window, memos = self.resolver(pid)
+        finally:
+            self.last_reconnect_seconds = self.clock() - started
+            self.reconnect_seconds += self.last_reconnect_seconds
+        self._pid = pid
+        self._main_window = main_window
+        self._memos = list(memos)
+        return self._main_window, self._memos
+
+    def invalidate(self):
+        """Сбрасывает кэш: следующий get() найдет окно заново."""
+        if self._main_window is not None:
+            self.invalidations += 1
+        self._pid = None
+        self._main_window = None
+        self._memos = []
+
+    def _is_valid(self):
+        if not self.validator(self._main_window.handle):
+            return False
+        return all(self.validator(memo.handle) for memo in self._memos)
+
+    def stats(self):
+        """Счетчики кэша. saved_seconds - оценка сэкономленного времени переподключений."""
+        avg_reconnect = self.reconnect_seconds / self.misses if self.misses else 0.0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'reconnect_seconds': self.reconnect_seconds,
+            'last_reconnect_seconds': self.last_reconnect_seconds,
+            'avg_reconnect_seconds': avg_reconnect,
+            'saved_seconds': avg_reconnect * self.hits,
+        }